@@ -1,9 +1,7 @@
 import os
 import re
 import glob
-import xlrd
-import xlwt
-from xlutils.copy import copy
+from excel_legacy_utils import open_xls_workbook, load_xls_sheet
 
 def get_latest_file(folder, file_format):
     """
@@ -49,8 +47,9 @@ def update_xls_cell(file_path, sheet_name, cell_ref, update_value):
     
     try:
         # Open the workbook
-        rb = xlrd.open_workbook(file_path, formatting_info=True)
+        rb = open_xls_workbook(file_path, formatting_info=True)
         if sheet_name not in rb.sheet_names():
+            rb.release_resources()
             return f"Failed: Sheet '{sheet_name}' not found."
         
         # Find cell coordinates
@@ -61,9 +60,11 @@ def update_xls_cell(file_path, sheet_name, cell_ref, update_value):
         col_idx = sum([(ord(char.upper()) - 64) * (26 ** i) for i, char in enumerate(reversed(col_letters))]) - 1
         row_idx = int(row_num) - 1
         
-        # Copy workbook for writing
+        # Copy workbook for writing (xlutils is only imported when a cell is written)
+        from xlutils.copy import copy
         wb = copy(rb)
         ws = wb.get_sheet(rb.sheet_names().index(sheet_name))
+        rb.release_resources()
         ws.write(row_idx, col_idx, update_value)
         wb.save(file_path)
         return "Success"
@@ -82,10 +83,9 @@ def get_last_row_and_first_col_value(file_path, sheet_name):
         tuple: (last_row_number, first_column_value) or (None, None) if not found or error.
     """
     try:
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
+        ws = load_xls_sheet(file_path, sheet_name)
+        if ws is None:
             return None, "Sheet not found"
-        ws = wb.sheet_by_name(sheet_name)
         last_row = None
         # Iterate from the bottom up to find the last row with any data
         for row_idx in range(ws.nrows - 1, -1, -1):
@@ -115,11 +115,10 @@ def get_xls_cell_value(file_path, sheet_name, cell_ref):
         The value of the cell, or an error message if not found.
     """
     try:
-        # Open the workbook and worksheet
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
+        # Parse only the requested sheet (on demand, memory-mapped)
+        ws = load_xls_sheet(file_path, sheet_name)
+        if ws is None:
             return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb.sheet_by_name(sheet_name)
         
         # Parse the cell reference (e.g., 'C6')
         match = re.match(r"([A-Za-z]+)([0-9]+)", cell_ref)
@@ -160,10 +159,9 @@ def get_cell_reference_by_value(file_path, sheet_name, cell_value):
         str: Cell reference (e.g., 'B5') or an error message.
     """
     try:
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
+        ws = load_xls_sheet(file_path, sheet_name)
+        if ws is None:
             return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb.sheet_by_name(sheet_name)
         for row_idx in range(ws.nrows):
             for col_idx in range(ws.ncols):
                 if ws.cell_value(row_idx, col_idx) == cell_value:
@@ -1,14 +1,13 @@
-import json
 from file_utils import get_latest_file
-from excel_legacy_utils import update_xls_cell
-from func_utils import  find_row_and_get_values, clean_number,get_column_values_with_row_numbers
+from excel_legacy_utils import update_xls_cells
+from func_utils import  find_rows, get_sheet_headers, clean_number,get_column_values_with_row_numbers
+from mapping_utils import load_column_mapping, compile_mapping_plan
 
 
 if __name__ == "__main__":
-    with open('column_mappings.json', 'r') as column_mapping_file:
-        column_mapping = json.load(column_mapping_file)
+    column_mapping = load_column_mapping('column_mappings.json')
 
-    print(list(column_mapping.values()))
+    print([entry["source"] for entry in column_mapping.values()])
 
     # Example usage
     Mass_Update_folder_path = "docs/Mass_Update"
@@ -38,40 +37,32 @@ if __name__ == "__main__":
         print("\nCould not extract any shipping order numbers.")
 
     SEARCH_COLUMN = "SO#"
-    COLUMNS_TO_GET = list(column_mapping.values())
 
-    # Call the function with the parameters
-    for order in shipping_orders:
-        found_row, data = find_row_and_get_values(Load_Plan_latest_file, Load_Plan_Sheet_name, SEARCH_COLUMN, clean_number(order[1]), COLUMNS_TO_GET)
-        update_xls_cell(
-            file_path=Mass_Update_latest_file,
-            sheet_name=Mass_Update_Sheet_name,
-            cell_ref="J" + str(order[0]),
-            update_value=data['LSP Requested HOD']
-        )
-        update_xls_cell(
-            file_path=Mass_Update_latest_file,
-            sheet_name=Mass_Update_Sheet_name,
-            cell_ref="Q" + str(order[0]),
-            update_value=data['ETD Port Of Load Date']
-        )
-        update_xls_cell(
-            file_path=Mass_Update_latest_file,
-            sheet_name=Mass_Update_Sheet_name,
-            cell_ref="R" + str(order[0]),
-            update_value=data['ETA Port Of Discharge Date']
-        )
-        update_xls_cell(
-            file_path=Mass_Update_latest_file,
-            sheet_name=Mass_Update_Sheet_name,
-            cell_ref="S" + str(order[0]),
-            update_value=data['ETA IN DC Date']
-        )
-        update_xls_cell(
-            file_path=Mass_Update_latest_file,
-            sheet_name=Mass_Update_Sheet_name,
-            cell_ref="U" + str(order[0]),
-            update_value=data['ETA IN DC Date']
-        )
+    # Compile the mapping against the Load Plan headers (fails fast on a bad header)
+    _, load_plan_headers = get_sheet_headers(Load_Plan_latest_file, Load_Plan_Sheet_name, SEARCH_COLUMN)
+    if "error" in load_plan_headers:
+        raise SystemExit(f"Could not read the Load Plan header row: {load_plan_headers['error']}")
+    mapping_plan = compile_mapping_plan(column_mapping, load_plan_headers)
+
+    # Look up every order in one pass, then build all cell updates column by column
+    text_formats = {}
+    found_rows, missing_orders = find_rows(Load_Plan_latest_file, Load_Plan_Sheet_name, SEARCH_COLUMN, [clean_number(order[1]) for order in shipping_orders],
+                                           date_columns=mapping_plan.date_sources, text_formats=text_formats)
+    if "error" in found_rows:
+        raise SystemExit(f"Load Plan lookup failed: {found_rows['error']}")
+    # Text dates are read with the format of the whole Load Plan column
+    mapping_plan.use_text_formats(text_formats)
+    matched = [order for order in shipping_orders if clean_number(order[1]) in found_rows]
+    cell_updates = mapping_plan.build_cell_updates(
+        [order[0] for order in matched],
+        [found_rows[clean_number(order[1])][1] for order in matched]
+    )
+    print(update_xls_cells(
+        file_path=Mass_Update_latest_file,
+        sheet_name=Mass_Update_Sheet_name,
+        cell_updates=cell_updates
+    ))
+    for order in matched:
         print(order)
-        print(found_row, data)
+        print(found_rows[clean_number(order[1])][0], mapping_plan.transform_row(found_rows[clean_number(order[1])][1]))
+    print(f"Orders not found: {missing_orders}")
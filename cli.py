@@ -0,0 +1,168 @@
+"""
+cli.py - Command-line entry point for the Excel sync tools
+
+Usage:
+    python cli.py sync [--config sync_config.json] [--mass-update-file PATH] [--load-plan-file PATH] ...
+    python cli.py serve [--config sync_config.json] [--socket PATH] [--workers N] [--cache-size N]
+    python cli.py fanout [--config sync_config.json] [--targets targets.json] [--load-plan-file PATH] ...
+
+Settings come from the config file (sync_config.json by default) and can be
+overridden with flags. Excel libraries (openpyxl, xlrd, xlwt, xlutils) are only
+imported when the files being processed need them, and the CLI reports how long
+its own start-up imports took and which Excel backends were loaded, including
+those loaded by worker processes (see metrics_utils.loaded_backends).
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import json
+import sys
+from sync_utils import load_sync_config, run_sync, run_fanout_sync, DEFAULT_CONFIG_FILE
+from logger_utils import setup_logger
+from metrics_utils import loaded_backends
+
+STARTUP_IMPORT_SECONDS = time.perf_counter() - _START
+
+# Config key -> help text. Each key can be overridden with --key-name on the command line.
+CONFIG_FLAGS = {
+    "mass_update_file": "Mass Update .xls file (default: latest file in the Mass Update folder).",
+    "mass_update_folder": "Folder searched for the latest Mass Update file.",
+    "mass_update_sheet": "Mass Update worksheet name.",
+    "mass_update_order_column": "Header of the shipping order column in the Mass Update sheet.",
+    "load_plan_file": "Load Plan file (default: latest file in the Load Plan folder).",
+    "load_plan_folder": "Folder searched for the latest Load Plan file.",
+    "load_plan_sheet": "Load Plan worksheet name.",
+    "load_plan_search_column": "Header of the order number column in the Load Plan sheet.",
+    "load_plan_merge_count": "Number of latest Load Plans to merge (newest wins for duplicate orders).",
+    "column_mappings_file": "Column mappings JSON file.",
+    "report_folder": "Folder the run report is written to.",
+    "load_executor": "Executor for --concurrent-load: 'process' (default) or 'thread'.",
+    "ledger_file": "Processed-file ledger used to skip inputs that were already synced.",
+    "validation": "Input validation before writing: 'warn' (default), 'strict' (stop on issues) or 'off'.",
+    "metrics_file": "Run history the metrics of every sync are appended to.",
+    "metrics_prometheus_file": "Prometheus textfile replaced with the metrics of the last sync.",
+    "journal_folder": "Folder of the resume journals used to finish interrupted syncs without re-reading the workbooks.",
+    "empty_row_run": "Consecutive empty rows after which a sheet scan stops (default: 1000).",
+}
+
+# On/off settings, exposed as flags that switch the setting on
+CONFIG_SWITCHES = {
+    "report_xlsx": "Also write the run report as an .xlsx file.",
+    "concurrent_load": "Read the Mass Update and Load Plan workbooks at the same time.",
+    "reprocess": "Sync even if the ledger shows these inputs were already synced.",
+}
+
+def build_parser():
+    """Builds the argument parser for all sub-commands."""
+    parser = argparse.ArgumentParser(description="Excel file handling tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Update the Mass Update sheet from the Load Plan.")
+    sync_parser.add_argument("--config", default=DEFAULT_CONFIG_FILE,
+                             help=f"Sync configuration file (default: {DEFAULT_CONFIG_FILE}).")
+    add_config_arguments(sync_parser)
+
+    fanout_parser = subparsers.add_parser("fanout", help="Update several Mass Update layouts from one Load Plan pass.")
+    fanout_parser.add_argument("--config", default=DEFAULT_CONFIG_FILE,
+                               help=f"Sync configuration file (default: {DEFAULT_CONFIG_FILE}).")
+    fanout_parser.add_argument("--targets", help="JSON file with the list of fan-out targets (default: config 'fanout_targets').")
+    add_config_arguments(fanout_parser)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the sync server (see sync_server.py and sync_client.py).")
+    serve_parser.add_argument("--config", default=DEFAULT_CONFIG_FILE,
+                              help=f"Sync configuration file (default: {DEFAULT_CONFIG_FILE}).")
+    serve_parser.add_argument("--socket", help="Unix socket to listen on (default: config 'server_socket' or the temp folder).")
+    serve_parser.add_argument("--workers", type=int, help="Worker threads serving requests.")
+    serve_parser.add_argument("--cache-size", type=int, help="Parsed Load Plan sheets kept in memory.")
+    return parser
+
+def add_config_arguments(parser):
+    """Adds the --key-name flags of CONFIG_FLAGS and CONFIG_SWITCHES to a sub-command."""
+    for key, help_text in CONFIG_FLAGS.items():
+        parser.add_argument("--" + key.replace("_", "-"), dest=key, help=help_text)
+    for key, help_text in CONFIG_SWITCHES.items():
+        parser.add_argument("--" + key.replace("_", "-"), dest=key, action="store_true", default=None, help=help_text)
+
+def config_overrides(args):
+    """Returns the config values given on the command line."""
+    keys = list(CONFIG_FLAGS) + list(CONFIG_SWITCHES)
+    return {key: getattr(args, key) for key in keys if getattr(args, key, None) is not None}
+
+def cmd_sync(args):
+    """Runs the Load Plan -> Mass Update sync. Returns the process exit code."""
+    try:
+        config = load_sync_config(args.config, config_overrides(args))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: Could not load configuration: {e}")
+        return 1
+
+    logger = setup_logger(config)
+    logger.info(f"Start-up imports took {STARTUP_IMPORT_SECONDS * 1000:.1f} ms "
+                f"(Excel backends loaded: {', '.join(loaded_backends()) or 'none'}).")
+
+    run_start = time.perf_counter()
+    summary = run_sync(config, logger)
+    logger.info(f"Sync finished in {time.perf_counter() - run_start:.2f} s "
+                f"(Excel backends used: {', '.join(loaded_backends()) or 'none'}).")
+    return 0 if summary["status"] == "Success" else 1
+
+def cmd_fanout(args):
+    """Runs the fan-out sync over the configured targets. Returns the process exit code."""
+    try:
+        config = load_sync_config(args.config, config_overrides(args))
+        targets = None
+        if args.targets:
+            with open(args.targets, 'r') as f:
+                targets = json.load(f)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: Could not load configuration: {e}")
+        return 1
+
+    logger = setup_logger(config)
+    run_start = time.perf_counter()
+    summary = run_fanout_sync(config, logger, targets)
+    logger.info(f"Fan-out sync of {len(summary['targets'])} target(s) finished in "
+                f"{time.perf_counter() - run_start:.2f} s (Excel backends used: {', '.join(loaded_backends()) or 'none'}).")
+    return 0 if summary["status"] == "Success" else 1
+
+def cmd_serve(args):
+    """Runs the sync server until it is shut down. Returns the process exit code."""
+    import sync_server
+
+    try:
+        config = load_sync_config(args.config)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: Could not load configuration: {e}")
+        return 1
+
+    logger = setup_logger(config)
+    try:
+        sync_server.serve(
+            config_file=args.config,
+            socket_path=args.socket or config.get("server_socket") or sync_server.DEFAULT_SOCKET_PATH,
+            logger=logger,
+            workers=args.workers or config.get("server_workers") or sync_server.DEFAULT_WORKERS,
+            cache_size=args.cache_size or config.get("server_cache_size") or sync_server.DEFAULT_CACHE_SIZE,
+        )
+    except OSError as e:
+        logger.error(f"Could not start the sync server: {e}")
+        return 1
+    return 0
+
+COMMANDS = {
+    "sync": cmd_sync,
+    "fanout": cmd_fanout,
+    "serve": cmd_serve,
+}
+
+def main(argv=None):
+    """Parses the command line and dispatches to the selected sub-command."""
+    args = build_parser().parse_args(argv)
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
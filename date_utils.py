@@ -0,0 +1,267 @@
+"""
+date_utils.py - Column-level date normalization, including dates stored as text
+
+Load Plan date columns hold real dates, Excel serial numbers, or text such as
+"16-Jun-25" or "06/09/2027". Trying formats value by value is slow, and it
+is inconsistent: "05/06/2025" can parse as May 6 in one row and as June 5 in
+the next. Instead, the text format of a column is inferred once from a sample
+of its values:
+
+- every format in DATE_TEXT_FORMATS is tried on up to DATE_SAMPLE_SIZE
+  distinct texts;
+- the format that parses the most wins; ties go to the earlier format, so
+  month-first beats day-first unless a value like "16/06/2025" rules it out.
+
+Lookups collect the sample with a DateTextSample while they scan the source
+sheet, so a column's format comes from the column itself and not from the
+rows a particular batch of keys happened to match.
+
+The winning format is compiled into a DateParser (a regular expression plus
+fixed English month names, independent of the locale). Parsers are cached.
+normalize_date_column() converts the whole column, formatting each distinct
+value only once, and counts the values it could not parse.
+
+Like index_utils, this module does not import any Excel library.
+"""
+
+import re
+import numbers
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+
+# Output format the Mass Update expects
+DEFAULT_OUTPUT_FORMAT = "%m/%d/%Y"
+
+# Text formats tried when inferring a column's format, in order of preference.
+# %b matches abbreviated and full English month names ("Jun", "June", "Sept").
+DATE_TEXT_FORMATS = (
+    "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%y", "%d/%m/%y",
+    "%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%m-%d-%Y", "%d.%m.%Y",
+    "%d-%b-%y", "%d-%b-%Y", "%d %b %Y", "%d %b %y", "%b %d, %Y", "%b %d %Y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S",
+)
+
+# Distinct text values a column's format is inferred from
+DATE_SAMPLE_SIZE = 200
+
+# Unparsed positions kept per column (for log examples)
+MAX_UNPARSED_KEPT = 50
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",),
+        ("jun", "june"), ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"),
+        ("oct", "october"), ("nov", "november"), ("dec", "december"),
+    ], start=1)
+    for name in names
+}
+
+_DIRECTIVES = {
+    "d": r"(?P<d>\d{1,2})",
+    "m": r"(?P<m>\d{1,2})",
+    "Y": r"(?P<Y>\d{4})",
+    "y": r"(?P<y>\d{2})",
+    "b": r"(?P<b>[A-Za-z]{3,9})",
+    "H": r"(?P<H>\d{1,2})",
+    "M": r"(?P<M>\d{2})",
+    "S": r"(?P<S>\d{2})",
+}
+
+# --------------------------
+# Parsers
+# --------------------------
+
+class DateParser:
+    """A date text format compiled to a regular expression."""
+
+    def __init__(self, text_format):
+        self.text_format = text_format
+        pattern = ""
+        for literal, directive in re.findall(r"([^%]*)(?:%(.))?", text_format):
+            pattern += r"\s+".join(re.escape(part) for part in literal.split(" "))
+            if directive:
+                if directive not in _DIRECTIVES:
+                    raise ValueError(f"Unsupported directive '%{directive}' in date format '{text_format}'.")
+                pattern += _DIRECTIVES[directive]
+        self._regex = re.compile(pattern, re.IGNORECASE)
+
+    def parse(self, text):
+        """Returns the datetime a text holds, or None if it does not match the format."""
+        match = self._regex.fullmatch(text.strip())
+        if match is None:
+            return None
+        parts = match.groupdict()
+        if parts.get("b") is not None:
+            month = _MONTHS.get(parts["b"].lower())
+            if month is None:
+                return None
+        else:
+            month = int(parts["m"])
+        if parts.get("Y") is not None:
+            year = int(parts["Y"])
+        else:
+            # Same pivot as time.strptime: 69-99 -> 1900s, 00-68 -> 2000s
+            year = int(parts["y"]) + (1900 if int(parts["y"]) >= 69 else 2000)
+        try:
+            return datetime(year, month, int(parts["d"]), int(parts.get("H") or 0),
+                            int(parts.get("M") or 0), int(parts.get("S") or 0))
+        except ValueError:
+            return None
+
+@lru_cache(maxsize=None)
+def get_date_parser(text_format):
+    """Returns the compiled, cached DateParser for a text format."""
+    return DateParser(text_format)
+
+def infer_date_format(texts, candidates=DATE_TEXT_FORMATS):
+    """
+    Infers the date format of a column's text values.
+
+    Args:
+        texts (iterable): The column's text values (other values are ignored).
+        candidates (tuple): Formats to try, in order of preference.
+
+    Returns:
+        str: The format that parses the most of the sampled values, or None if
+             none parses any.
+    """
+    sample = []
+    seen = set()
+    for text in texts:
+        if not isinstance(text, str):
+            continue
+        text = text.strip()
+        if text and text not in seen:
+            seen.add(text)
+            sample.append(text)
+            if len(sample) >= DATE_SAMPLE_SIZE:
+                break
+    return _infer_from_sample(tuple(sample), tuple(candidates))
+
+class DateTextSample:
+    """
+    The first DATE_SAMPLE_SIZE distinct texts of a column, collected while the
+    column is scanned; `text_format` is the format inferred from them.
+    """
+
+    def __init__(self):
+        self.texts = {}
+
+    @property
+    def full(self):
+        return len(self.texts) >= DATE_SAMPLE_SIZE
+
+    def add(self, value):
+        """Adds a cell value to the sample (non-text and blank values are ignored)."""
+        if isinstance(value, str) and not self.full:
+            text = value.strip()
+            if text:
+                self.texts[text] = None
+
+    @property
+    def text_format(self):
+        return infer_date_format(self.texts)
+
+@lru_cache(maxsize=1024)
+def _infer_from_sample(sample, candidates):
+    best_format, best_count = None, 0
+    for text_format in candidates:
+        parser = get_date_parser(text_format)
+        count = sum(1 for text in sample if parser.parse(text) is not None)
+        if count > best_count:
+            best_format, best_count = text_format, count
+            if count == len(sample):
+                break
+    return best_format
+
+# --------------------------
+# Conversion
+# --------------------------
+
+@dataclass
+class DateColumn:
+    """
+    Result of normalizing a column of dates.
+
+    `values` holds the formatted dates in the input order. Values that could not
+    be read as dates are kept unchanged, counted in `unparsed` and (the first
+    MAX_UNPARSED_KEPT) listed by position in `unparsed_positions`.
+    """
+    values: list
+    text_format: str = None
+    converted: int = 0
+    unparsed: int = 0
+    unparsed_positions: list = field(default_factory=list)
+
+def _to_datetime(value, parser):
+    """Returns a cell value as a datetime, or None if it cannot be read as one."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        try:
+            return _EXCEL_EPOCH + timedelta(days=value)
+        except (OverflowError, ValueError):
+            return None
+    if isinstance(value, str) and parser is not None:
+        return parser.parse(value)
+    return None
+
+def normalize_date_column(values, output_format=DEFAULT_OUTPUT_FORMAT, text_format=None):
+    """
+    Converts a column of dates (datetimes, Excel serials or text) to strings in
+    `output_format`.
+
+    Args:
+        values (list): The column's raw cell values.
+        output_format (str): strftime format of the results.
+        text_format (str): Format of the text dates; inferred from the column
+                           when None.
+
+    Returns:
+        DateColumn: The converted values and the counts. Empty cells (None or
+                    blank text) are left as they are and not counted.
+    """
+    if text_format is None:
+        text_format = infer_date_format(values)
+    parser = get_date_parser(text_format) if text_format else None
+
+    result = DateColumn(values=[], text_format=text_format)
+    # Columns repeat the same dates, so each distinct value is converted once
+    converted = {}
+    for position, value in enumerate(values):
+        if value is None or (isinstance(value, str) and not value.strip()):
+            result.values.append(value)
+            continue
+        # Keyed by type too, so True is not taken for the serial 1
+        key = (value.__class__, value)
+        try:
+            formatted = converted[key]
+        except KeyError:
+            as_date = _to_datetime(value, parser)
+            formatted = converted[key] = as_date.strftime(output_format) if as_date is not None else None
+        except TypeError:
+            # Unhashable value: not a date
+            formatted = None
+        if formatted is None:
+            result.values.append(value)
+            result.unparsed += 1
+            if len(result.unparsed_positions) < MAX_UNPARSED_KEPT:
+                result.unparsed_positions.append(position)
+            continue
+        result.values.append(formatted)
+        result.converted += 1
+    return result
+
+def format_date_value(value, output_format=DEFAULT_OUTPUT_FORMAT, text_format=None):
+    """
+    Converts a single date value the way normalize_date_column would; text is
+    read with `text_format` or the format inferred from the value itself.
+    Values that are not dates are returned unchanged.
+    """
+    return normalize_date_column([value], output_format, text_format).values[0]
@@ -1,13 +1,21 @@
 """
-excel_utils.py - Python library for working with legacy Excel (.xls) files
+excel_legacy_utils.py - Python library for working with legacy Excel (.xls) files
 Requires: xlrd, xlwt, xlutils
 """
 
 import os
 import re
-import xlrd
-import xlwt
-from xlutils.copy import copy
+from index_utils import SheetIndex, get_cached_index
+from extent_utils import iter_bounded_rows, scan_extent, get_cached_extent
+
+# xlrd, xlwt and xlutils are imported inside the functions that need them, so
+# importing this module (e.g. only for the column helpers) stays cheap.
+
+# How update_xls_cell(s) save: "patch" rewrites only the changed cell records
+# (xls_biff_utils.patch_xls_cells) and keeps every cell's formatting, falling
+# back to "xlutils" for workbooks it cannot patch; "xlutils" always rebuilds the
+# whole workbook through xlutils.copy / xlwt.
+XLS_SAVE_ENGINE = "patch"
 
 # --------------------------
 # Helper Functions
@@ -28,6 +36,108 @@ def letters_to_col_idx(letters):
         for i, char in enumerate(reversed(letters))
     ) - 1
 
+def _iter_xls_rows(ws):
+    """Yields (row_number, row_values) for every row of an xlrd sheet, 1-based."""
+    for row_idx in range(ws.nrows):
+        yield row_idx + 1, ws.row_values(row_idx)
+
+def _save_xls_updates(file_path, sheet_name, cell_updates, file_contents=None):
+    """
+    Writes {cell_ref: value} updates to one sheet with the XLS_SAVE_ENGINE.
+
+    Returns:
+        str: 'Success' or error reason.
+    """
+    if XLS_SAVE_ENGINE == "patch":
+        from xls_biff_utils import patch_xls_cells, XlsPatchUnsupported
+        try:
+            patch_xls_cells(file_path, sheet_name, cell_updates, file_contents=file_contents)
+            return "Success"
+        except KeyError:
+            return f"Failed: Sheet '{sheet_name}' not found."
+        except XlsPatchUnsupported:
+            pass  # Rebuild the workbook with xlutils instead
+
+    rb = open_xls_workbook(file_path if file_contents is None else file_contents, formatting_info=True)
+    if sheet_name not in rb.sheet_names():
+        rb.release_resources()
+        return f"Failed: Sheet '{sheet_name}' not found."
+
+    # Copy workbook for writing and apply all updates before saving once
+    from xlutils.copy import copy
+    wb = copy(rb)
+    ws = wb.get_sheet(rb.sheet_names().index(sheet_name))
+    # Drop the reader (and its file mapping) before the file is overwritten
+    rb.release_resources()
+    for cell_ref, update_value in cell_updates.items():
+        match = re.match(r"([A-Za-z]+)([0-9]+)$", cell_ref)
+        ws.write(int(match.group(2)) - 1, letters_to_col_idx(match.group(1)), update_value)
+    wb.save(file_path)
+    return "Success"
+
+def open_xls_workbook(source, formatting_info=False):
+    """
+    Opens an .xls workbook with sheets loaded on demand.
+
+    Only the workbook globals are parsed up front; each sheet is parsed the first
+    time it is requested. Files are memory-mapped rather than read into memory.
+    
+    Args:
+        source: Path to the .xls file, or its contents as bytes / bytearray / mmap
+                (so the same bytes can be shared by several readers and writers).
+        formatting_info (bool): Also read formatting records (needed for xlutils.copy).
+    
+    Returns:
+        xlrd.Book: The open workbook. Call release_resources() when done with it.
+    """
+    import xlrd
+    if isinstance(source, (str, os.PathLike)):
+        return xlrd.open_workbook(source, formatting_info=formatting_info, on_demand=True, use_mmap=True)
+    return xlrd.open_workbook(file_contents=source, formatting_info=formatting_info, on_demand=True)
+
+def load_xls_sheet(source, sheet_name):
+    """
+    Parses a single sheet of an .xls workbook and releases everything else.
+
+    The returned sheet keeps its cell data after the workbook's file mapping and
+    unrequested sheets have been released, so peak memory and parse time depend
+    only on the requested sheet.
+    
+    Args:
+        source: Path to the .xls file, or its contents (bytes / bytearray / mmap).
+        sheet_name (str): Name of the worksheet.
+    
+    Returns:
+        xlrd.sheet.Sheet: The parsed sheet, or None if the sheet does not exist.
+    """
+    wb = open_xls_workbook(source)
+    try:
+        if sheet_name not in wb.sheet_names():
+            return None
+        return wb.sheet_by_name(sheet_name)
+    finally:
+        wb.release_resources()
+
+def iter_xls_sheet_rows(source, sheet_name):
+    """
+    Yields (row_number, row_values) for every row of an .xls sheet, 1-based.
+
+    xlrd has no streaming reader, so the sheet itself is parsed up front (and
+    nothing else in the workbook is), but the Python row lists are only built
+    as the caller asks for them.
+
+    Args:
+        source: Path to the .xls file, or its contents (bytes / bytearray / mmap).
+        sheet_name (str): Name of the worksheet.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    sheet = load_xls_sheet(source, sheet_name)
+    if sheet is None:
+        raise KeyError(f"Sheet '{sheet_name}' not found.")
+    yield from _iter_xls_rows(sheet)
+
 # --------------------------
 # Core Functions
 # --------------------------
@@ -37,7 +147,7 @@ def get_xls_cell_value(file_path, sheet_name, cell_ref):
     Returns the value of a cell in an .xls Excel file.
     
     Args:
-        file_path (str): Path to the .xls file.
+        file_path: Path to the .xls file, or its contents (bytes / mmap).
         sheet_name (str): Name of the worksheet.
         cell_ref (str): Cell reference (e.g., 'C6').
     
@@ -45,11 +155,10 @@ def get_xls_cell_value(file_path, sheet_name, cell_ref):
         The value of the cell, or an error message if not found.
     """
     try:
-        # Open the workbook and worksheet
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
+        # Parse only the requested sheet
+        ws = load_xls_sheet(file_path, sheet_name)
+        if ws is None:
             return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb.sheet_by_name(sheet_name)
         
         # Parse the cell reference (e.g., 'C6')
         match = re.match(r"([A-Za-z]+)([0-9]+)", cell_ref)
@@ -69,7 +178,7 @@ def get_xls_cell_value(file_path, sheet_name, cell_ref):
     except Exception as e:
         return f"Error: {str(e)}"
 
-def update_xls_cell(file_path, sheet_name, cell_ref, update_value):
+def update_xls_cell(file_path, sheet_name, cell_ref, update_value, file_contents=None):
     """
     Updates a cell value in an .xls file.
     
@@ -78,78 +187,125 @@ def update_xls_cell(file_path, sheet_name, cell_ref, update_value):
         sheet_name (str): Name of the worksheet.
         cell_ref (str): Cell reference (e.g., 'C5').
         update_value: Value to set in the cell.
+        file_contents: Optional bytes / mmap of the file already read by the caller.
+                       When given, the workbook is parsed from it instead of from disk.
     
     Returns:
         str: 'Success' or error reason.
     """
     # Validate file existence
-    if not os.path.isfile(file_path):
+    if file_contents is None and not os.path.isfile(file_path):
         return f"Failed: File not found - {file_path}"
     
     # Validate file extension
     if not file_path.lower().endswith('.xls'):
         return "Failed: Only .xls files are supported."
     
+    # Find cell coordinates
+    match = re.match(r"([A-Za-z]+)([0-9]+)", cell_ref)
+    if not match:
+        return "Failed: Invalid cell reference format."
+    col_letters, row_num = match.groups()
+    
     try:
-        # Open the workbook
-        rb = xlrd.open_workbook(file_path, formatting_info=True)
-        if sheet_name not in rb.sheet_names():
-            return f"Failed: Sheet '{sheet_name}' not found."
-        
-        # Find cell coordinates
-        match = re.match(r"([A-Za-z]+)([0-9]+)", cell_ref)
-        if not match:
-            return "Failed: Invalid cell reference format."
-        col_letters, row_num = match.groups()
-        col_idx = sum([(ord(char.upper()) - 64) * (26 ** i) for i, char in enumerate(reversed(col_letters))]) - 1
-        row_idx = int(row_num) - 1
-        
-        # Copy workbook for writing
-        wb = copy(rb)
-        ws = wb.get_sheet(rb.sheet_names().index(sheet_name))
-        ws.write(row_idx, col_idx, update_value)
-        wb.save(file_path)
+        return _save_xls_updates(file_path, sheet_name, {f"{col_letters}{row_num}": update_value}, file_contents)
+    except Exception as e:
+        return f"Failed: {str(e)}"
+
+def update_xls_cells(file_path, sheet_name, cell_updates, file_contents=None):
+    """
+    Updates many cells in an .xls file with a single open and a single save.
+    
+    Args:
+        file_path (str): Path to the .xls file.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+        file_contents: Optional bytes / mmap of the file already read by the caller.
+                       When given, the workbook is parsed from it instead of from disk.
+    
+    Returns:
+        str: 'Success' or error reason.
+    """
+    # Validate file existence
+    if file_contents is None and not os.path.isfile(file_path):
+        return f"Failed: File not found - {file_path}"
+    
+    # Validate file extension
+    if not file_path.lower().endswith('.xls'):
+        return "Failed: Only .xls files are supported."
+    
+    # Resolve every cell reference before touching the file
+    for cell_ref in cell_updates:
+        if not re.match(r"([A-Za-z]+)([0-9]+)$", cell_ref):
+            return f"Failed: Invalid cell reference format - {cell_ref}"
+    
+    if not cell_updates:
         return "Success"
+    
+    try:
+        return _save_xls_updates(file_path, sheet_name, cell_updates, file_contents)
     except Exception as e:
         return f"Failed: {str(e)}"
 
 def get_xls_last_row(file_path, sheet_name):
     """
     Finds the last row with data and returns its row number and the value in column A.
+
+    Trailing runs of empty (e.g. formatted-only) rows are skipped without being
+    walked one by one, and the result is cached until the file changes (see
+    extent_utils).
     
     Args:
-        file_path (str): Path to the .xls file.
+        file_path: Path to the .xls file, or its contents (bytes / mmap).
         sheet_name (str): Name of the worksheet.
     
     Returns:
         tuple: (last_row_number, first_column_value) or (None, None) if not found or error.
     """
     try:
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
-            return None, "Sheet not found"
-        ws = wb.sheet_by_name(sheet_name)
-        last_row = None
-        # Iterate from the bottom up to find the last row with any data
-        for row_idx in range(ws.nrows - 1, -1, -1):
-            if any(ws.cell_value(row_idx, col_idx) != "" for col_idx in range(ws.ncols)):
-                last_row = row_idx
-                break
-        if last_row is not None:
-            first_col_value = ws.cell_value(last_row, 0)
-            # Convert to Excel's 1-based row number
-            return last_row + 1, first_col_value
-        else:
+        extent = get_cached_extent(file_path, sheet_name)
+        if extent is None:
+            ws = load_xls_sheet(file_path, sheet_name)
+            if ws is None:
+                return None, "Sheet not found"
+            extent = scan_extent(_iter_xls_rows(ws), file_path, sheet_name, max_row=ws.nrows)
+        if not extent.last_row:
             return None, None
+        # Row numbers in the extent are already Excel's 1-based numbers
+        return extent.last_row, extent.last_row_values[0]
     except Exception as e:
         return None, str(e)
 
+def get_xls_sheet_index(file_path, sheet_name):
+    """
+    Returns an inverted value -> cells index (index_utils.SheetIndex) for a sheet.
+    
+    The index is built in one pass and cached until the file changes, so repeated
+    find-by-value queries do not rescan the sheet.
+    
+    Args:
+        file_path: Path to the .xls file, or its contents (bytes / mmap; not cached).
+        sheet_name (str): Name of the worksheet.
+    
+    Returns:
+        SheetIndex: The index, or None if the sheet does not exist.
+    """
+    def build_index():
+        ws = load_xls_sheet(file_path, sheet_name)
+        if ws is None:
+            return None
+        return SheetIndex.from_rows(iter_bounded_rows(_iter_xls_rows(ws), file_path, sheet_name, max_row=ws.nrows))
+
+    if not isinstance(file_path, (str, os.PathLike)):
+        return build_index()
+    return get_cached_index(file_path, sheet_name, build_index)
+
 def get_xls_cell_reference_by_value(file_path, sheet_name, cell_value):
     """
     Returns the cell reference (e.g., 'A2', 'C8') for the first cell matching the given value.
     
     Args:
-        file_path (str): Path to the .xls file.
+        file_path: Path to the .xls file, or its contents (bytes / mmap).
         sheet_name (str): Name of the worksheet.
         cell_value: Value to search for (case and type sensitive).
     
@@ -157,16 +313,13 @@ def get_xls_cell_reference_by_value(file_path, sheet_name, cell_value):
         str: Cell reference (e.g., 'B5') or an error message.
     """
     try:
-        wb = xlrd.open_workbook(file_path)
-        if sheet_name not in wb.sheet_names():
+        index = get_xls_sheet_index(file_path, sheet_name)
+        if index is None:
             return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb.sheet_by_name(sheet_name)
-        for row_idx in range(ws.nrows):
-            for col_idx in range(ws.ncols):
-                if ws.cell_value(row_idx, col_idx) == cell_value:
-                    col_letters = col_idx_to_letters(col_idx)
-                    cell_ref = f"{col_letters}{row_idx + 1}"
-                    return cell_ref
-        return "Error: Value not found in sheet."
+        cell = index.find_first(cell_value)
+        if cell is None:
+            return "Error: Value not found in sheet."
+        row_num, col_num = cell
+        return f"{col_idx_to_letters(col_num - 1)}{row_num}"
     except Exception as e:
         return f"Error: {str(e)}"
\ No newline at end of file
@@ -1,15 +1,17 @@
 """
-xlsx_utils.py - Python library for working with modern Excel (.xlsx) files
+excel_new_utils.py - Python library for working with modern Excel (.xlsx) files
 Requires: openpyxl
 """
 
 import os
-import openpyxl
-from openpyxl.utils import get_column_letter, column_index_from_string
+from xlsx_package_utils import patch_xlsx_cells, col_idx_to_letters, read_xlsx_dimension
+from index_utils import SheetIndex, get_cached_index
+from extent_utils import iter_bounded_rows, scan_extent, get_cached_extent
+from xlsx_parallel_utils import iter_xlsx_sheet_rows
+from xlsx_row_index_utils import read_xlsx_cells
 
-# Note: The helper functions col_idx_to_letters and letters_to_col_idx
-# from your original script are available in openpyxl.utils, so we
-# import and use them directly for consistency and reliability.
+# openpyxl is imported inside the functions that need it, so importing this
+# module does not pay for it until a workbook is actually loaded.
 
 # --------------------------
 # Core Functions
@@ -18,6 +20,10 @@ from openpyxl.utils import get_column_letter, column_index_from_string
 def get_xlsx_cell_value(file_path, sheet_name, cell_ref):
     """
     Returns the value of a cell in an .xlsx Excel file.
+
+    Only the cell's row is parsed: the sheet's <row> offsets are indexed once
+    and kept in memory, so later reads seek straight to the row. The index is
+    only saved to disk when xlsx_row_index_utils.ROW_INDEX_FOLDER is set.
     
     Args:
         file_path (str): Path to the .xlsx file.
@@ -27,17 +33,28 @@ def get_xlsx_cell_value(file_path, sheet_name, cell_ref):
     Returns:
         The value of the cell, or an error message if not found.
     """
+    values = get_xlsx_cell_values(file_path, sheet_name, [cell_ref])
+    return values[cell_ref] if isinstance(values, dict) else values
+
+def get_xlsx_cell_values(file_path, sheet_name, cell_refs):
+    """
+    Returns the values of several cells of an .xlsx Excel file, parsing only
+    the rows they are in (see get_xlsx_cell_value).
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        cell_refs (list): Cell references (e.g., ['C6', 'J12']).
+
+    Returns:
+        dict: Cell reference -> value, or an error message if a cell or the
+              sheet is not found.
+    """
     try:
-        # Open the workbook and worksheet
-        wb = openpyxl.load_workbook(file_path, data_only=True) # data_only=True to get values instead of formulas
-        if sheet_name not in wb.sheetnames:
-            return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb[sheet_name]
-        
-        # openpyxl can directly access cells by reference
-        cell = ws[cell_ref]
-        return cell.value
+        return read_xlsx_cells(file_path, sheet_name, cell_refs)
     except KeyError:
+        return f"Error: Sheet '{sheet_name}' not found."
+    except ValueError:
         return "Error: Invalid cell reference format or cell does not exist."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -65,6 +82,7 @@ def update_xlsx_cell(file_path, sheet_name, cell_ref, update_value):
     
     try:
         # Open the workbook
+        import openpyxl
         wb = openpyxl.load_workbook(file_path)
         if sheet_name not in wb.sheetnames:
             return f"Failed: Sheet '{sheet_name}' not found."
@@ -82,9 +100,49 @@ def update_xlsx_cell(file_path, sheet_name, cell_ref, update_value):
     except Exception as e:
         return f"Failed: {str(e)}"
 
+def update_xlsx_cells(file_path, sheet_name, cell_updates):
+    """
+    Updates many cells in an .xlsx file in one save.
+    
+    Unlike update_xlsx_cell, the workbook is not loaded through openpyxl: only the
+    edited sheet's XML part is rewritten and every other part of the file is
+    copied through unchanged, so features openpyxl does not round-trip are kept.
+    
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+    
+    Returns:
+        str: 'Success' or error reason.
+    """
+    # Validate file existence
+    if not os.path.isfile(file_path):
+        return f"Failed: File not found - {file_path}"
+    
+    # Validate file extension
+    if not file_path.lower().endswith('.xlsx'):
+        return "Failed: Only .xlsx files are supported."
+    
+    if not cell_updates:
+        return "Success"
+    
+    try:
+        patch_xlsx_cells(file_path, sheet_name, cell_updates)
+        return "Success"
+    except KeyError:
+        return f"Failed: Sheet '{sheet_name}' not found."
+    except Exception as e:
+        return f"Failed: {str(e)}"
+
 def get_xlsx_last_row(file_path, sheet_name):
     """
     Finds the last row with data and returns its row number and the value in column A.
+
+    The sheet is streamed from the top and the scan stops at the real end of the
+    data, so empty formatted rows below it (and a <dimension> tag declaring a
+    million rows) cost nothing. The result is cached until the file changes
+    (see extent_utils).
     
     Args:
         file_path (str): Path to the .xlsx file.
@@ -94,29 +152,56 @@ def get_xlsx_last_row(file_path, sheet_name):
         tuple: (last_row_number, first_column_value) or (None, None) if not found or error.
     """
     try:
-        wb = openpyxl.load_workbook(file_path)
-        if sheet_name not in wb.sheetnames:
-            return None, "Sheet not found"
-        ws = wb[sheet_name]
-        
-        last_row_with_data = None
-        # Iterate from the bottom up to find the last row with any data
-        # ws.max_row can sometimes be misleading if there are empty formatted rows
-        for row_idx in range(ws.max_row, 0, -1):
-            row_values = [cell.value for cell in ws[row_idx]]
-            if any(v is not None for v in row_values):
-                last_row_with_data = row_idx
-                break
-        
-        if last_row_with_data is not None:
-            first_col_value = ws.cell(row=last_row_with_data, column=1).value
-            return last_row_with_data, first_col_value
-        else:
-            # Sheet is empty
-            return None, None
+        extent = get_cached_extent(file_path, sheet_name)
+        if extent is None:
+            extent = scan_extent(iter_xlsx_sheet_rows(file_path, sheet_name), file_path, sheet_name,
+                                 max_row=get_xlsx_declared_last_row(file_path, sheet_name))
+    except KeyError:
+        return None, "Sheet not found"
     except Exception as e:
         return None, str(e)
 
+    if not extent.last_row:
+        # Sheet is empty
+        return None, None
+    return extent.last_row, extent.last_row_values[0] if extent.last_row_values else None
+
+def get_xlsx_declared_last_row(file_path, sheet_name):
+    """
+    Returns the last row declared by the sheet's <dimension> tag, or None if the
+    sheet does not declare a full range.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    dimension = read_xlsx_dimension(file_path, sheet_name)
+    return dimension[0] if dimension else None
+
+def get_xlsx_sheet_index(file_path, sheet_name):
+    """
+    Returns an inverted value -> cells index (index_utils.SheetIndex) for a sheet.
+    
+    The sheet is read once to build the index (in parallel for very large sheets,
+    see xlsx_parallel_utils), which is then cached until the file changes, so
+    repeated find-by-value queries do not rescan the sheet.
+    
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+    
+    Returns:
+        SheetIndex: The index, or None if the sheet does not exist.
+    """
+    def build_index():
+        try:
+            return SheetIndex.from_rows(iter_bounded_rows(
+                iter_xlsx_sheet_rows(file_path, sheet_name), file_path, sheet_name,
+                max_row=get_xlsx_declared_last_row(file_path, sheet_name)))
+        except KeyError:
+            return None
+
+    return get_cached_index(file_path, sheet_name, build_index)
+
 def get_xlsx_cell_reference_by_value(file_path, sheet_name, cell_value):
     """
     Returns the cell reference (e.g., 'A2', 'C8') for the first cell matching the given value.
@@ -130,16 +215,13 @@ def get_xlsx_cell_reference_by_value(file_path, sheet_name, cell_value):
         str: Cell reference (e.g., 'B5') or an error message.
     """
     try:
-        wb = openpyxl.load_workbook(file_path, data_only=True)
-        if sheet_name not in wb.sheetnames:
+        index = get_xlsx_sheet_index(file_path, sheet_name)
+        if index is None:
             return f"Error: Sheet '{sheet_name}' not found."
-        ws = wb[sheet_name]
-        
-        for row in ws.iter_rows():
-            for cell in row:
-                if cell.value == cell_value:
-                    return cell.coordinate # e.g., 'B5'
-                    
-        return "Error: Value not found in sheet."
+        cell = index.find_first(cell_value)
+        if cell is None:
+            return "Error: Value not found in sheet."
+        row_num, col_num = cell
+        return f"{col_idx_to_letters(col_num)}{row_num}"
     except Exception as e:
         return f"Error: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+extent_utils.py - Real data extent of worksheets, ignoring phantom rows
+
+Sheets exported from other systems often declare, or even contain, hundreds of
+thousands of empty but formatted rows below the data. Row scans wrap their
+rows with iter_bounded_rows so they stop at the real end of the data:
+
+- A declared extent (the .xlsx <dimension> tag) is an upper bound.
+- A scan stops once EMPTY_ROW_RUN consecutive rows have been empty (the
+  sync's "empty_row_run" setting, see set_empty_row_run). Stopping before
+  the declared extent, or just before a row that holds data, is logged as a
+  warning, since rows below the gap are then never read.
+- When a scan reaches the end of the data, the extent is cached per
+  (file, sheet), and later scans stop exactly at the last data row. The entry is
+  dropped when the file's size or modification time changes.
+
+Like index_utils, this module does not import any Excel library; the backends
+supply the rows.
+"""
+
+import os
+import logging
+from dataclasses import dataclass
+from collections import OrderedDict
+from logger_utils import LOGGER_NAME
+
+# A scan stops after this many consecutive empty rows. Raise it for sheets with
+# long intentional gaps between blocks of data.
+EMPTY_ROW_RUN = 1000
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# Number of sheet extents kept in memory at once
+MAX_CACHED_EXTENTS = 32
+
+_extent_cache = OrderedDict()
+
+@dataclass(frozen=True)
+class SheetExtent:
+    """
+    The real data boundary of a sheet: its last non-empty row and column
+    (1-based, 0 for an empty sheet) and the values of that last row.
+    """
+    last_row: int
+    last_col: int
+    last_row_values: tuple = ()
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def _last_filled_col(row_values):
+    """Returns the 1-based index of the last non-empty value in a row, or 0."""
+    for col_idx in range(len(row_values), 0, -1):
+        value = row_values[col_idx - 1]
+        if value is not None and value != "":
+            return col_idx
+    return 0
+
+def _fingerprint(file_path):
+    """Cheap change detection for a file: (size, modification time in ns)."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _cache_key(file_path, sheet_name):
+    """Returns the cache key for a sheet, or None for workbooks that are not files on disk."""
+    if not isinstance(file_path, (str, os.PathLike)):
+        return None
+    return os.path.abspath(file_path), sheet_name
+
+# --------------------------
+# Cache
+# --------------------------
+
+def get_cached_extent(file_path, sheet_name, empty_row_run=None):
+    """
+    Returns the cached SheetExtent of a sheet, or None if it is unknown, the file
+    has changed, or it was found with a shorter empty-row run than requested.
+    """
+    key = _cache_key(file_path, sheet_name)
+    cached = _extent_cache.get(key) if key else None
+    if cached is None:
+        return None
+    fingerprint, extent, cutoff_run = cached
+    try:
+        if fingerprint != _fingerprint(file_path):
+            return None
+    except OSError:
+        return None
+    # An extent found by reading to the end of the rows is exact; one found by
+    # the empty-row cut-off only holds for runs up to the one that found it
+    if cutoff_run is not None and cutoff_run < (empty_row_run or EMPTY_ROW_RUN):
+        return None
+    _extent_cache.move_to_end(key)
+    return extent
+
+def store_extent(file_path, sheet_name, extent, cutoff_run=None):
+    """
+    Caches a sheet's extent.
+
+    Args:
+        file_path (str): Path to the workbook. Anything else (bytes, mmap) is ignored.
+        sheet_name (str): Name of the worksheet.
+        extent (SheetExtent): The extent to cache.
+        cutoff_run (int): The empty-row run that ended the scan, or None if the
+                          scan read every row.
+    """
+    key = _cache_key(file_path, sheet_name)
+    if key is None:
+        return
+    try:
+        _extent_cache[key] = (_fingerprint(file_path), extent, cutoff_run)
+    except OSError:
+        return
+    _extent_cache.move_to_end(key)
+    while len(_extent_cache) > MAX_CACHED_EXTENTS:
+        _extent_cache.popitem(last=False)
+
+def clear_extent_cache():
+    """Drops every cached sheet extent."""
+    _extent_cache.clear()
+
+def set_empty_row_run(empty_row_run):
+    """
+    Sets EMPTY_ROW_RUN (e.g. from the sync's "empty_row_run" setting); None
+    keeps the current value. Also usable as a process-pool initializer, so
+    the workers scan with the same setting.
+    """
+    global EMPTY_ROW_RUN
+    if empty_row_run:
+        EMPTY_ROW_RUN = int(empty_row_run)
+
+# --------------------------
+# Bounded Scans
+# --------------------------
+
+def _warn_cutoff(file_path, sheet_name, row_num, row_values, max_row, last_row, empty_row_run):
+    """Logs a scan that the empty-row run ended before rows that may hold data."""
+    has_data = bool(_last_filled_col(row_values))
+    if not has_data and (max_row is None or row_num >= max_row):
+        return
+    where = f"sheet '{sheet_name}' of '{file_path}'" if file_path is not None else "a sheet"
+    found = f"row {row_num} holds data" if has_data else f"the sheet declares rows up to {max_row}"
+    logger.warning(f"Stopped reading {where} after {empty_row_run} empty rows below row {last_row}, but {found}; "
+                   f"rows from {row_num} on were not read. Raise 'empty_row_run' if the sheet has longer gaps.")
+
+def _bounded(rows, max_row, empty_row_run, scan, file_path=None, sheet_name=None):
+    """
+    Yields rows until the end of the data (see iter_bounded_rows), recording the
+    extent seen so far in the `scan` dict. Sets scan["done"] when the scan ended
+    on its own rather than because the caller stopped early.
+    """
+    try:
+        for row_num, row_values in rows:
+            if max_row is not None and row_num > max_row:
+                break
+            if row_num - scan["last_row"] > empty_row_run:
+                scan["cutoff_run"] = empty_row_run
+                _warn_cutoff(file_path, sheet_name, row_num, row_values, max_row, scan["last_row"], empty_row_run)
+                break
+            filled = _last_filled_col(row_values)
+            if filled:
+                scan["last_row"], scan["last_row_values"] = row_num, row_values
+                scan["last_col"] = max(scan["last_col"], filled)
+            yield row_num, row_values
+        scan["done"] = True
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+
+def _start_scan(rows, file_path, sheet_name, max_row, empty_row_run):
+    """Sets up a bounded scan. Returns (cached_extent, row_generator, scan_state)."""
+    empty_row_run = empty_row_run or EMPTY_ROW_RUN
+    cached = get_cached_extent(file_path, sheet_name, empty_row_run) if file_path is not None else None
+    if cached is not None:
+        max_row = cached.last_row if max_row is None else min(max_row, cached.last_row)
+    scan = {"last_row": 0, "last_col": 0, "last_row_values": (), "cutoff_run": None, "done": False}
+    return cached, _bounded(rows, max_row, empty_row_run, scan, file_path, sheet_name), scan
+
+def _finish_scan(file_path, sheet_name, cached, scan):
+    """Returns the extent of a finished scan, caching it when it is new."""
+    if cached is not None:
+        return cached
+    extent = SheetExtent(scan["last_row"], scan["last_col"], tuple(scan["last_row_values"]))
+    if file_path is not None:
+        store_extent(file_path, sheet_name, extent, scan["cutoff_run"])
+    return extent
+
+def iter_bounded_rows(rows, file_path=None, sheet_name=None, max_row=None, empty_row_run=None):
+    """
+    Yields (row_number, row_values) pairs from `rows` up to the real end of the
+    data, and caches the extent when the scan gets there.
+
+    The scan stops at the first of:
+    - the last data row of a cached extent for (file_path, sheet_name),
+    - `max_row`, the declared extent (e.g. the .xlsx dimension tag),
+    - a row more than `empty_row_run` rows below the last non-empty row, whether
+      the rows in between were empty or missing altogether.
+
+    `rows` is closed when the scan stops, so the workbook behind it is released.
+
+    Args:
+        rows (iterable): (row_number, row_values) pairs in row order, 1-based.
+        file_path (str): Workbook the rows come from, used for the extent cache.
+        sheet_name (str): Worksheet the rows come from.
+        max_row (int): Declared last row, or None if unknown.
+        empty_row_run (int): Consecutive empty rows that end the scan
+                             (default: EMPTY_ROW_RUN).
+    """
+    cached, bounded, scan = _start_scan(rows, file_path, sheet_name, max_row, empty_row_run)
+    yield from bounded
+    if scan["done"]:
+        _finish_scan(file_path, sheet_name, cached, scan)
+
+def scan_extent(rows, file_path=None, sheet_name=None, max_row=None, empty_row_run=None):
+    """
+    Returns the SheetExtent of a sheet: the cached one if it is still valid,
+    otherwise the result of a bounded scan of `rows` (see iter_bounded_rows).
+    """
+    cached, bounded, scan = _start_scan(rows, file_path, sheet_name, max_row, empty_row_run)
+    if cached is not None:
+        bounded.close()
+        return cached
+    for _ in bounded:
+        pass
+    return _finish_scan(file_path, sheet_name, cached, scan)
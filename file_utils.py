@@ -1,5 +1,13 @@
 import os
 import glob
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 def get_latest_file(folder, file_format):
     """
@@ -20,4 +28,75 @@ def get_latest_file(folder, file_format):
         return None
     # Find the latest file by creation time (or use os.path.getmtime for modification time)
     latest_file = max(files, key=os.path.getctime)
-    return latest_file
\ No newline at end of file
+    return latest_file
+
+def get_latest_files(folder, file_format, count):
+    """
+    Returns the full paths of the `count` latest files in the folder matching the
+    given file format, newest first (by creation time, like get_latest_file).
+
+    Args:
+        folder (str): Path to the directory.
+        file_format (str): File extension, e.g., '.xlsx', '.csv', '.txt'.
+        count (int): Maximum number of files to return.
+
+    Returns:
+        list: Paths of up to `count` files, or an empty list if none match.
+    """
+    files = glob.glob(os.path.join(folder, f"*{file_format}"))
+    return sorted(files, key=os.path.getctime, reverse=True)[:count]
+
+@contextmanager
+def file_lock(lock_path, timeout=60, poll_interval=0.1):
+    """
+    Context manager that holds an exclusive, cross-process lock on a lock file.
+
+    The lock is an OS advisory lock on `lock_path` (fcntl.flock on POSIX,
+    msvcrt.locking on Windows). The OS releases it when the holder exits or
+    crashes, so a lock is never stale, however long the holder keeps it. The
+    lock file itself is left in place: deleting it would let a waiter lock the
+    old file while another process creates a new one.
+
+    Args:
+        lock_path (str): Path of the lock file (e.g., 'report.xls.lock').
+        timeout (float): Seconds to wait for the lock before giving up.
+        poll_interval (float): Seconds to sleep between attempts.
+
+    Raises:
+        TimeoutError: If the lock could not be acquired within `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+    try:
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock: {lock_path}")
+            time.sleep(poll_interval)
+        try:
+            os.ftruncate(fd, 0)
+            os.write(fd, f"{os.getpid()}\n".encode())
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+def _try_lock(fd):
+    """Takes the advisory lock on an open file without blocking. Returns False if another process holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(fd):
+    """Releases the advisory lock taken by _try_lock."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
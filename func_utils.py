@@ -1,8 +1,5 @@
-import re
-import openpyxl
 from datetime import datetime, timedelta
 import numbers
-from excel_legacy_utils import get_xls_cell_value,update_xls_cell,get_xls_last_row,get_xls_cell_reference_by_value
 
 
 def clean_number(value: any) -> any:
@@ -30,6 +27,20 @@ def clean_number(value: any) -> any:
     # If it's not a number or has a non-zero decimal, return it as is
     return value
 
+def lookup_key(value: any) -> str:
+    """
+    Returns the form the lookup helpers compare keys in: whole-number floats
+    lose their '.0' (see clean_number) and surrounding whitespace is ignored,
+    so an order read by xlrd as 12345.0 matches 12345 and '12345 '.
+
+    Args:
+        value: A key or a cell value of the search column.
+
+    Returns:
+        str: The normalized key.
+    """
+    return str(clean_number(value)).strip()
+
 def convert_excel_serial_to_date(serial_number: int) -> str:
     """
     Converts an Excel serial date number to a formatted string ('%m/%d/%Y').
@@ -52,14 +63,13 @@ def convert_excel_serial_to_date(serial_number: int) -> str:
 
 def get_column_values(file_path: str, sheet_name: str, column_name: str) -> list:
     """
-    Extracts all values from a specified column in a legacy .xls file.
+    Extracts all values from a specified column of a .xls or .xlsx sheet.
 
-    This function reads an Excel sheet to find a specific column by its header name,
-    then collects all the data in that column from the row after the header to the last
-    row containing data in the sheet.
+    The sheet is read once (see iter_column_values); empty cells below the
+    header are skipped.
 
     Args:
-        file_path (str): The full path to the .xls file.
+        file_path (str): The full path to the .xls or .xlsx file.
         sheet_name (str): The name of the sheet to read from (e.g., "Mass Update").
         column_name (str): The exact name of the column header to find 
                            (e.g., "Shipping Order Number *").
@@ -68,63 +78,15 @@ def get_column_values(file_path: str, sheet_name: str, column_name: str) -> list
         list: A list of values from the specified column. Returns an empty list
               if the column or sheet is not found or if an error occurs.
     """
-    print(f"Starting extraction from '{file_path}'...")
-    
-    # Find the cell reference of the column header (e.g., 'A15')
-    header_cell_ref = get_xls_cell_reference_by_value(file_path, sheet_name, column_name)
-    
-    if "Error:" in header_cell_ref:
-        print(f"Error finding column header: {header_cell_ref}")
-        return []
-        
-    print(f"Found column header '{column_name}' at cell {header_cell_ref}.")
-
-    # Extract the column letter(s) and header row number from the reference
-    match = re.match(r"([A-Za-z]+)([0-9]+)", header_cell_ref)
-    if not match:
-        print("Error: Could not parse the header cell reference.")
-        return []
-    
-    col_letters, header_row_num_str = match.groups()
-    start_row = int(header_row_num_str) + 1
-    
-    # Find the last row with any data in the sheet
-    last_row, _ = get_xls_last_row(file_path, sheet_name)
-    
-    if last_row is None:
-        print("Error: Could not determine the last row of the sheet.")
-        return []
-        
-    print(f"Data extraction will run from row {start_row} to {last_row}.")
-
-    # Loop from the row after the header to the last row and collect cell values
-    column_values = []
-    for current_row in range(start_row, last_row + 1):
-        cell_to_read = f"{col_letters}{current_row}"
-        value = get_xls_cell_value(file_path, sheet_name, cell_to_read)
-        
-        # Stop if we hit an error or an empty cell, assuming data is contiguous
-        if isinstance(value, str) and "Error:" in value:
-            print(f"Encountered an error reading {cell_to_read}: {value}")
-            break
-        if value == "":
-            continue # Skip empty cells
-
-        column_values.append(value)
-        
-    print("Extraction complete.")
-    return column_values
+    return [value for _, value in get_column_values_with_row_numbers(file_path, sheet_name, column_name)]
 
 def get_column_values_with_row_numbers(file_path: str, sheet_name: str, column_name: str) -> list:
     """
-    Extracts all values and their row numbers from a specified column in a legacy .xls file.
-
-    This function reads an Excel sheet to find a specific column by its header name,
-    then collects all the data in that column from the row after the header to the last
-    row containing data in the sheet.
+    Extracts all values and their row numbers from a specified column of a .xls
+    or .xlsx sheet, reading the sheet once (see iter_column_values).
 
     Args:
-        file_path (str): The full path to the .xls file.
+        file_path (str): The full path to the .xls or .xlsx file.
         sheet_name (str): The name of the sheet to read from (e.g., "Mass Update").
         column_name (str): The exact name of the column header to find 
                            (e.g., "Shipping Order Number *").
@@ -135,64 +97,25 @@ def get_column_values_with_row_numbers(file_path: str, sheet_name: str, column_n
                                Returns an empty list if the column or sheet is not found 
                                or if an error occurs.
     """
-    print(f"Starting extraction from '{file_path}'...")
-    
-    # Find the cell reference of the column header (e.g., 'A15')
-    header_cell_ref = get_xls_cell_reference_by_value(file_path, sheet_name, column_name)
-    
-    if "Error:" in header_cell_ref:
-        print(f"Error finding column header: {header_cell_ref}")
-        return []
-        
-    print(f"Found column header '{column_name}' at cell {header_cell_ref}.")
-
-    # Extract the column letter(s) and header row number from the reference
-    match = re.match(r"([A-Za-z]+)([0-9]+)", header_cell_ref)
-    if not match:
-        print("Error: Could not parse the header cell reference.")
-        return []
-    
-    col_letters, header_row_num_str = match.groups()
-    start_row = int(header_row_num_str) + 1
-    
-    # Find the last row with any data in the sheet
-    last_row, _ = get_xls_last_row(file_path, sheet_name)
-    
-    if last_row is None:
-        print("Error: Could not determine the last row of the sheet.")
-        return []
-        
-    print(f"Data extraction will run from row {start_row} to {last_row}.")
-
-    # Loop from the row after the header to the last row and collect cell values with their row numbers
-    column_data = []
-    for current_row in range(start_row, last_row + 1):
-        cell_to_read = f"{col_letters}{current_row}"
-        value = get_xls_cell_value(file_path, sheet_name, cell_to_read)
-        
-        # Skip empty cells
-        if value == "":
-            continue
-
-        # Stop if we hit an error reading a cell
-        if isinstance(value, str) and "Error:" in value:
-            print(f"Encountered an error reading {cell_to_read}: {value}")
-            break
-
-        column_data.append((current_row, value))
-        
-    print("Extraction complete.")
-    return column_data
+    try:
+        return list(iter_column_values(file_path, sheet_name, column_name))
+    except ValueError as e:
+        print(f"Error finding column header: {e}")
+    except Exception as e:
+        print(f"Error reading '{file_path}': {e}")
+    return []
 
 
 def find_row_and_get_values(file_path: str, sheet_name: str, search_column_name: str, matching_value: any, columns_to_return: list) -> tuple:
     """
     Finds a row by a specific value in a column and returns the row number
     and a dictionary of values from other specified columns in that row.
-    This version dynamically finds the header row and formats dates.
+    This version dynamically finds the header row and formats dates; text
+    dates are read with the format inferred from their whole column (see
+    find_rows_and_get_values).
 
     Args:
-        file_path (str): The path to the .xlsx Excel file.
+        file_path (str): The path to the .xlsx or .xls Excel file.
         sheet_name (str): The name of the worksheet to search within.
         search_column_name (str): The header of the column to search for the matching value.
         matching_value: The value to find within the search column.
@@ -206,61 +129,607 @@ def find_row_and_get_values(file_path: str, sheet_name: str, search_column_name:
                  corresponding values from the found row. Returns an empty dict if
                  no match is found, or a dict with an 'error' key if an issue occurs.
     """
-    try:
-        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, rich_text=True)
-        if sheet_name not in workbook.sheetnames:
-            return None, {"error": f"Sheet '{sheet_name}' not found."}
-        sheet = workbook[sheet_name]
-    except FileNotFoundError:
-        return None, {"error": f"File not found at path: {file_path}"}
-    except Exception as e:
-        return None, {"error": f"Failed to open workbook: {e}"}
+    # A single-key batch, so the key's dates are read exactly as in a larger batch
+    found, _ = find_rows_and_get_values(file_path, sheet_name, search_column_name, [matching_value], columns_to_return)
+    if "error" in found:
+        return None, {"error": found["error"]}
+    if matching_value in found:
+        return found[matching_value]
+    return None, {}
 
+
+def format_lookup_value(value: any) -> any:
+    """
+    Formats a value read from a lookup row the same way for .xls and .xlsx sources.
+
+    - datetime objects are formatted as '%m/%d/%Y'.
+    - Numbers are treated as Excel serial dates and converted to '%m/%d/%Y'.
+    - Text dates (e.g. '16-Jun-25') are converted to '%m/%d/%Y' (see date_utils).
+    - Anything else (other text, None, numbers too large to be dates) is
+      returned unchanged.
+
+    Args:
+        value: The raw cell value.
+
+    Returns:
+        The formatted value.
+    """
+    from date_utils import format_date_value
+    return format_date_value(value)
+
+def iter_sheet_rows(file_path: str, sheet_name: str):
+    """
+    Opens a .xls or .xlsx workbook once and yields (row_number, row_values) tuples.
+
+    Row numbers are 1-based and row values are plain Python lists, so callers can
+    treat both formats the same way. Rows are produced one at a time (the
+    .xlsx readers stream the sheet XML) and stop at the real end of the data
+    (see extent_utils). The workbook is released when the generator is
+    exhausted or closed.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist in the workbook.
+    """
+    from extent_utils import iter_bounded_rows
+    if file_path.lower().endswith('.xls'):
+        from excel_legacy_utils import load_xls_sheet
+        # Only the requested sheet is parsed; the file mapping is released right
+        # away. Its row count is the declared extent.
+        sheet = load_xls_sheet(file_path, sheet_name)
+        if sheet is None:
+            raise KeyError(f"Sheet '{sheet_name}' not found.")
+        rows = ((row_idx + 1, sheet.row_values(row_idx)) for row_idx in range(sheet.nrows))
+        declared_last_row = sheet.nrows
+    else:
+        from excel_new_utils import get_xlsx_declared_last_row
+        from xlsx_parallel_utils import iter_xlsx_sheet_rows
+        # Very large sheets are parsed across several processes (see xlsx_parallel_utils)
+        declared_last_row = get_xlsx_declared_last_row(file_path, sheet_name)
+        rows = iter_xlsx_sheet_rows(file_path, sheet_name)
+    # Stop at the real end of the data rather than after every formatted empty row
+    yield from iter_bounded_rows(rows, file_path, sheet_name, max_row=declared_last_row)
+
+def _iter_keyed_rows(file_path: str, sheet_name: str, search_column_name: str, matching_values, required_columns=(),
+                     profile=None, scan=None, date_columns=()):
+    """
+    Single-pass scan shared by the lookup helpers, as a generator.
+
+    Finds the header row (within the first 20 rows), checks that every required
+    column exists, then walks the data rows once and yields a
+    (key, row_number, raw_row_values) tuple for each match as soon as its row is
+    read, stopping early when every key has been matched. With
+    matching_values=None every key in the search column is yielded once (first
+    occurrence wins) and the whole sheet is read. A validation_utils.SheetProfile
+    passed as `profile` sees every data row, so the scan then also reads the
+    whole sheet.
+
+    The text date format of each of `date_columns` is inferred from the column
+    itself (a date_utils.DateTextSample of the keyed rows), never from the
+    matched rows alone, so a key's dates do not depend on the other keys in
+    the batch. Once every key is matched the scan goes on only while a
+    matched row holds text in a date column whose sample is not full yet.
+
+    Args:
+        scan (dict): Optional dict that receives 'header_row_num' and 'headers'
+                     (header name -> 0-based column index) once the header row
+                     is found, and 'missing' (the keys never matched) and
+                     'text_formats' (date column -> inferred text format or
+                     None) at the end.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the header row or a required column cannot be found.
+    """
+    from date_utils import DateTextSample
+    scan = {} if scan is None else scan
+    # Several caller keys may normalize to the same lookup key (e.g. 45, 45.0 and '45 ')
+    collect_all = matching_values is None
+    pending = {}
+    for key in matching_values or ():
+        pending.setdefault(lookup_key(key), []).append(key)
+
+    seen = set()
     header_row_num = None
-    headers = {}
-    
-    for row_num in range(1, min(21, sheet.max_row + 1)):
-        row_values = [cell.value for cell in sheet[row_num] if cell.value is not None]
-        if search_column_name in row_values:
-            header_row_num = row_num
-            break
+    samples = {}
+    sampled = []
+    # Samples a matched row's text dates will be read with, so the scan fills them first
+    needed = []
+    rows = iter_sheet_rows(file_path, sheet_name)
+
+    try:
+        for row_num, row_values in rows:
+            if header_row_num is None:
+                if row_num > 20:
+                    break
+                if search_column_name not in row_values:
+                    continue
+
+                header_row_num = row_num
+                headers = {value: idx for idx, value in enumerate(row_values) if value not in (None, "")}
+                for col in required_columns:
+                    if col not in headers:
+                        raise ValueError(f"Column to return '{col}' not found in the header row.")
+                search_col_idx = headers[search_column_name]
+                scan["header_row_num"], scan["headers"] = header_row_num, headers
+                samples = {col: DateTextSample() for col in dict.fromkeys(date_columns) if col in headers}
+                sampled = [(sample, headers[col]) for col, sample in samples.items()]
+                if profile is not None:
+                    profile.start(file_path, headers)
+                continue
+
+            if not pending and not collect_all and profile is None and all(sample.full for sample in needed):
+                break
+            cell_value = row_values[search_col_idx] if search_col_idx < len(row_values) else None
+            empty = cell_value is None or cell_value == ""
+            key = None if empty else lookup_key(cell_value)
+            if profile is not None:
+                profile.add_row(row_num, row_values, key)
+            if empty:
+                continue
+            for sample, idx in sampled:
+                if not sample.full and idx < len(row_values):
+                    sample.add(row_values[idx])
+
+            if collect_all:
+                if key not in seen:
+                    seen.add(key)
+                    yield key, row_num, row_values
+                continue
+            keys = pending.pop(key, None)
+            if keys is None:
+                continue
+            needed.extend(sample for sample, idx in sampled
+                          if idx < len(row_values) and isinstance(row_values[idx], str) and row_values[idx].strip())
+            for key in keys:
+                yield key, row_num, row_values
+    finally:
+        rows.close()
 
     if header_row_num is None:
-        workbook.close()
-        return None, {"error": f"Could not find header '{search_column_name}' in the first 20 rows."}
+        raise ValueError(f"Could not find header '{search_column_name}' in the first 20 rows.")
+    if profile is not None:
+        profile.finish()
+    scan["missing"] = {key for keys in pending.values() for key in keys}
+    scan["text_formats"] = {col: sample.text_format for col, sample in samples.items()}
+
+def _scan_rows_by_key(file_path: str, sheet_name: str, search_column_name: str, matching_values, required_columns=(),
+                      profile=None, date_columns=(), text_formats=None) -> tuple:
+    """
+    Runs _iter_keyed_rows to the end and collects its matches.
 
-    headers = {cell.value: cell.column for cell in sheet[header_row_num] if cell.value is not None}
+    Returns:
+        tuple: (header_row_num, headers, found, missing) where headers maps header
+               name to 0-based column index, found maps each key to a
+               (row_number, raw_row_values) tuple and missing is a set of keys.
+               The inferred text format of each of `date_columns` is stored in
+               the optional `text_formats` dict.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the header row or a required column cannot be found.
+    """
+    scan = {}
+    found = {}
+    for key, row_num, row_values in _iter_keyed_rows(file_path, sheet_name, search_column_name, matching_values,
+                                                     required_columns, profile, scan, date_columns):
+        found[key] = (row_num, row_values)
+    if text_formats is not None:
+        text_formats.update(scan["text_formats"])
+    return scan["header_row_num"], scan["headers"], found, scan["missing"]
+
+def _select_columns(row_values: list, headers: dict, columns: list) -> dict:
+    """Returns {column: formatted value} for the requested columns of a raw row."""
+    row_data = {}
+    for col_name in columns:
+        col_idx = headers[col_name]
+        row_data[col_name] = format_lookup_value(row_values[col_idx] if col_idx < len(row_values) else None)
+    return row_data
+
+def _lookup_error_message(error: Exception, file_path: str) -> str:
+    """Turns an exception from _scan_rows_by_key into the error text used by the public helpers."""
+    if isinstance(error, FileNotFoundError):
+        return f"File not found at path: {file_path}"
+    if isinstance(error, KeyError):
+        return str(error).strip("\"'")
+    if isinstance(error, ValueError):
+        return str(error)
+    return f"Failed to read workbook: {error}"
+
+def get_sheet_headers(file_path: str, sheet_name: str, search_column_name: str) -> tuple:
+    """
+    Finds the header row of a .xlsx or .xls sheet (the first row within the first
+    20 that contains `search_column_name`) without scanning the data rows.
+
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet.
+        search_column_name (str): A header known to be in the header row (e.g. "SO#").
+
+    Returns:
+        tuple: A tuple containing:
+               - The header row number (int), or None on error.
+               - A dictionary mapping each header to its 0-based column index, or a
+                 dict with an 'error' key if an issue occurs.
+    """
+    try:
+        header_row_num, headers, _, _ = _scan_rows_by_key(file_path, sheet_name, search_column_name, [])
+        return header_row_num, headers
+    except Exception as e:
+        return None, {"error": _lookup_error_message(e, file_path)}
 
-    if search_column_name not in headers:
-        return None, {"error": f"Search column '{search_column_name}' was found, but failed to map to a column index."}
-    for col in columns_to_return:
-        if col not in headers:
-            workbook.close()
-            return None, {"error": f"Column to return '{col}' not found in the header row."}
+def find_rows(file_path: str, sheet_name: str, search_column_name: str, matching_values, profile=None,
+              date_columns=(), text_formats=None) -> tuple:
+    """
+    Looks up many keys with a single workbook open and a single scan, returning the
+    complete raw row for each match. Use this when the caller wants to pick and
+    transform columns itself (e.g. with a compiled mapping plan).
 
-    search_col_idx = headers[search_column_name]
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet to search within.
+        search_column_name (str): The header of the column to search for the keys.
+        matching_values (iterable): The keys to find within the search column.
+        profile (SheetProfile): Optional validation_utils.SheetProfile to fill
+                                while scanning (the whole sheet is then read).
+        date_columns (iterable): Headers of the columns holding dates.
+        text_formats (dict): Optional dict that receives the text date format
+                             inferred from each of `date_columns` (or None).
 
-    for row_index in range(header_row_num + 1, sheet.max_row + 1):
-        cell_value = sheet.cell(row=row_index, column=search_col_idx).value
-        
-        if cell_value is not None and str(cell_value).strip() == str(matching_value).strip():
-            row_data = {}
-            for col_name in columns_to_return:
-                col_idx = headers[col_name]
-                value = sheet.cell(row=row_index, column=col_idx).value
-                
-                # --- CORRECTED FORMATTING LOGIC ---
-                # If the value is a datetime object, format it to a readable string.
-                if isinstance(value, datetime):
-                    # This format produces 'YYYY-MM-DD'. You can change it to whatever you need,
-                    # for example: '%d-%b-%y' would produce '16-Jun-25'.
-                    value = value.strftime('%Y-%m-%d')
-                # --- END OF FORMATTING LOGIC ---
-
-                row_data[col_name] = convert_excel_serial_to_date(value)
-
-            workbook.close()
-            return row_index, row_data
-
-    workbook.close()
-    return None, {}
\ No newline at end of file
+    Returns:
+        tuple: A tuple containing:
+               - A dictionary mapping each found key to a (row_number, row_values)
+                 tuple, where row_values is the list of raw cell values indexed by
+                 0-based column. Contains a single 'error' key if an issue occurs.
+               - A set of the keys that could not be found.
+    """
+    matching_values = list(matching_values)
+    try:
+        _, _, found, missing = _scan_rows_by_key(file_path, sheet_name, search_column_name, matching_values,
+                                                 profile=profile, date_columns=date_columns,
+                                                 text_formats=text_formats)
+        return found, missing
+    except Exception as e:
+        return {"error": _lookup_error_message(e, file_path)}, set(matching_values)
+
+def find_rows_projected(file_path: str, sheet_name: str, search_column_name: str, matching_values, columns: list,
+                        profile=None, date_columns=(), text_formats=None) -> tuple:
+    """
+    Like find_rows, but keeps only `columns` of each matched row, so the rows
+    kept for many keys and several consumers (see sync_utils.run_fanout_sync)
+    hold just the columns someone reads. Requested columns missing from the
+    header row are left out instead of failing the lookup.
+
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet to search within.
+        search_column_name (str): The header of the column to search for the keys.
+        matching_values (iterable): The keys to find within the search column.
+        columns (list): Headers of the columns to keep.
+        profile (SheetProfile): Optional validation_utils.SheetProfile to fill
+                                while scanning (the whole sheet is then read).
+        date_columns (iterable): Headers of the columns holding dates.
+        text_formats (dict): Optional dict that receives the text date format
+                             inferred from each of `date_columns` (or None).
+
+    Returns:
+        tuple: A tuple containing:
+               - A dictionary mapping each kept header to its 0-based index in the
+                 projected rows, or a dict with an 'error' key if an issue occurs.
+               - A dictionary mapping each found key to a (row_number, row_values)
+                 tuple, where row_values holds the raw values of the kept columns.
+               - A set of the keys that could not be found.
+    """
+    matching_values = list(matching_values)
+    scan = {}
+    found = {}
+    source_indexes = None
+    try:
+        for key, row_num, row_values in _iter_keyed_rows(file_path, sheet_name, search_column_name, matching_values,
+                                                         profile=profile, scan=scan, date_columns=date_columns):
+            if source_indexes is None:
+                source_indexes = [scan["headers"][col] for col in dict.fromkeys(columns) if col in scan["headers"]]
+            found[key] = (row_num, [row_values[idx] if idx < len(row_values) else None for idx in source_indexes])
+    except Exception as e:
+        return {"error": _lookup_error_message(e, file_path)}, {}, set(matching_values)
+    if text_formats is not None:
+        text_formats.update(scan["text_formats"])
+    kept = [col for col in dict.fromkeys(columns) if col in scan["headers"]]
+    return {col: idx for idx, col in enumerate(kept)}, found, scan["missing"]
+
+def index_rows_by_key(file_path: str, sheet_name: str, search_column_name: str, profile=None) -> tuple:
+    """
+    Reads a whole sheet once and indexes its rows by the value in the search
+    column, so lookups can start before the keys to look up are known (e.g. while
+    another workbook is still being read).
+
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet.
+        search_column_name (str): The header of the key column (e.g. "SO#").
+        profile (SheetProfile): Optional validation_utils.SheetProfile to fill
+                                in the same pass.
+
+    Returns:
+        tuple: A tuple containing:
+               - A dictionary mapping each header to its 0-based column index, or a
+                 dict with an 'error' key if an issue occurs.
+               - A dictionary mapping each key (normalized by lookup_key) to the
+                 (row_number, row_values) tuple of its first row.
+    """
+    try:
+        _, headers, rows_by_key, _ = _scan_rows_by_key(file_path, sheet_name, search_column_name, None, profile=profile)
+        return headers, rows_by_key
+    except Exception as e:
+        return {"error": _lookup_error_message(e, file_path)}, {}
+
+def build_merged_key_index(file_paths: list, sheet_name: str, search_column_name: str, workers: int = None,
+                           profiles: list = None) -> "MergedKeyIndex":
+    """
+    Indexes several workbooks (e.g. the last few Load Plans) by key at the same
+    time and merges them, newest first: a key found in more than one file
+    resolves to the first file in `file_paths`.
+
+    Args:
+        file_paths (list): Workbook paths, highest precedence (newest) first.
+        sheet_name (str): The name of the worksheet in every file.
+        search_column_name (str): The header of the key column (e.g. "SO#").
+        workers (int): Worker processes (default: one per file). With a single
+                       file or worker the files are read in this process.
+        profiles (list): Optional validation_utils.SheetProfile per file, filled
+                         while indexing. Profiles filled in worker processes
+                         replace the originals in the list.
+
+    Returns:
+        MergedKeyIndex: The merged index. Files that could not be read are listed
+                        in its `errors` dict.
+    """
+    workers = workers or len(file_paths)
+    if profiles is None:
+        profiles = [None] * len(file_paths)
+    arguments = ([sheet_name] * len(file_paths), [search_column_name] * len(file_paths))
+    if workers <= 1 or len(file_paths) <= 1:
+        results = list(map(index_rows_by_key, file_paths, *arguments, profiles))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        import extent_utils
+        from metrics_utils import call_in_worker, record_worker_reports
+        from validation_utils import call_with_profile
+        with ProcessPoolExecutor(max_workers=workers, initializer=extent_utils.set_empty_row_run,
+                                 initargs=(extent_utils.EMPTY_ROW_RUN,)) as pool:
+            outcomes = list(pool.map(call_in_worker, [call_with_profile] * len(file_paths),
+                                     [index_rows_by_key] * len(file_paths), profiles, file_paths, *arguments))
+        # The workers report their memory and Excel backends (see metrics_utils)
+        record_worker_reports([report for _, report in outcomes])
+        # Each worker returns (index, filled profile) from call_with_profile
+        results = []
+        for position, ((index, profile), _) in enumerate(outcomes):
+            results.append(index)
+            profiles[position] = profile
+    from index_utils import MergedKeyIndex
+    return MergedKeyIndex.from_indexes(
+        [(file_path, headers, rows_by_key) for file_path, (headers, rows_by_key) in zip(file_paths, results)]
+    )
+
+def find_rows_and_get_values(file_path: str, sheet_name: str, search_column_name: str, matching_values, columns_to_return: list) -> tuple:
+    """
+    Batch version of find_row_and_get_values: looks up many keys with a single
+    workbook open and a single scan of the sheet.
+
+    Works with both .xlsx (openpyxl) and .xls (xlrd) files. Keys are compared the
+    same way on both sides (see lookup_key: 12345.0, 12345 and '12345 ' match),
+    and the first matching row wins for each key.
+
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet to search within.
+        search_column_name (str): The header of the column to search for the keys.
+        matching_values (iterable): The keys to find within the search column.
+        columns_to_return (list): A list of column headers whose values should be
+                                  returned from each matched row.
+
+    Returns:
+        tuple: A tuple containing:
+               - A dictionary mapping each found key to a (row_number, values) tuple,
+                 where values is a dict of the requested column headers and their
+                 formatted values. Contains a single 'error' key if an issue occurs.
+               - A set of the keys that could not be found.
+    """
+    matching_values = list(matching_values)
+    text_formats = {}
+    try:
+        _, headers, found_rows, missing = _scan_rows_by_key(
+            file_path, sheet_name, search_column_name, matching_values, columns_to_return,
+            date_columns=columns_to_return, text_formats=text_formats
+        )
+    except Exception as e:
+        return {"error": _lookup_error_message(e, file_path)}, set(matching_values)
+
+    # Text dates are read with the format inferred from the whole column during the scan
+    from date_utils import normalize_date_column
+    matches = list(found_rows.values())
+    columns = {}
+    for col_name in columns_to_return:
+        col_idx = headers[col_name]
+        columns[col_name] = normalize_date_column(
+            [row_values[col_idx] if col_idx < len(row_values) else None for _, row_values in matches],
+            text_format=text_formats[col_name]).values
+    found = {key: (row_num, {col_name: columns[col_name][i] for col_name in columns_to_return})
+             for i, (key, (row_num, _)) in enumerate(found_rows.items())}
+    return found, missing
+
+def get_column_values_with_rows(file_path: str, sheet_name: str, column_name: str, profile=None) -> list:
+    """
+    Single-pass version of get_column_values_with_row_numbers that also returns
+    each row's full list of values, so callers can read other cells of the same
+    rows (e.g. current values before an update) without opening the file again.
+
+    Works with both .xls and .xlsx files. The header may be anywhere in the sheet;
+    empty cells below it are skipped.
+
+    Args:
+        file_path (str): The full path to the .xls or .xlsx file.
+        sheet_name (str): The name of the sheet to read from (e.g., "Mass Update").
+        column_name (str): The exact name of the column header to find
+                           (e.g., "Shipping Order Number *").
+        profile (SheetProfile): Optional validation_utils.SheetProfile to fill
+                                in the same pass, keyed by the column's values.
+
+    Returns:
+        List[Tuple[int, Any, list]]: (row_number, value, row_values) tuples, where
+                                     row_values is indexed by 0-based column.
+                                     Returns an empty list if the column or sheet
+                                     is not found or if an error occurs.
+    """
+    try:
+        return list(_iter_column_rows(file_path, sheet_name, column_name, profile))
+    except ValueError as e:
+        print(f"Error finding column header: {e}")
+    except Exception as e:
+        print(f"Error reading '{file_path}': {e}")
+    return []
+
+def _iter_column_rows(file_path: str, sheet_name: str, column_name: str, profile=None):
+    """
+    Generator behind get_column_values_with_rows: yields (row_number, value,
+    row_values) for every non-empty cell below the column's header, as the rows
+    are read.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the column header is not found in the sheet.
+    """
+    col_idx = None
+    rows = iter_sheet_rows(file_path, sheet_name)
+    try:
+        for row_num, row_values in rows:
+            if col_idx is None:
+                if column_name in row_values:
+                    col_idx = row_values.index(column_name)
+                    if profile is not None:
+                        profile.start(file_path, {value: idx for idx, value in enumerate(row_values)
+                                                  if value not in (None, "")})
+                continue
+            value = row_values[col_idx] if col_idx < len(row_values) else None
+            empty = value is None or value == ""
+            if profile is not None:
+                profile.add_row(row_num, row_values, None if empty else lookup_key(value))
+            if empty:
+                continue
+            yield row_num, value, row_values
+    finally:
+        rows.close()
+
+    if col_idx is None:
+        raise ValueError(f"'{column_name}' not found in sheet '{sheet_name}'.")
+    if profile is not None:
+        profile.finish()
+
+def iter_column_values(file_path: str, sheet_name: str, column_name: str):
+    """
+    Streaming version of get_column_values_with_row_numbers for .xls and .xlsx
+    files: yields (row_number, value) for every non-empty cell below the
+    column's header while the sheet is being read, so a caller can stop early
+    or process a large sheet without holding all of it.
+
+    Args:
+        file_path (str): The full path to the .xls or .xlsx file.
+        sheet_name (str): The name of the sheet to read from (e.g., "Mass Update").
+        column_name (str): The exact name of the column header to find.
+
+    Yields:
+        Tuple[int, Any]: (row_number, value) pairs in sheet order.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the column header is not found in the sheet.
+    """
+    for row_num, value, _ in _iter_column_rows(file_path, sheet_name, column_name):
+        yield row_num, value
+
+def iter_rows_as_dicts(file_path: str, sheet_name: str, columns: list, header_column: str = None):
+    """
+    Yields the data rows of a .xls or .xlsx sheet as {column: value} dicts, one
+    row at a time.
+
+    The header row is the first row within the first 20 that contains
+    `header_column` (the first requested column by default). Rows where every
+    requested column is empty are skipped. Values are the raw cell values, as
+    read by iter_sheet_rows.
+
+    Args:
+        file_path (str): The full path to the .xls or .xlsx file.
+        sheet_name (str): The name of the sheet to read from.
+        columns (list): Header names of the columns to return.
+        header_column (str): A header known to be in the header row.
+
+    Yields:
+        Tuple[int, dict]: (row_number, {column: value}) for each data row.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the header row or a requested column cannot be found.
+    """
+    header_column = header_column or columns[0]
+    headers = None
+    rows = iter_sheet_rows(file_path, sheet_name)
+    try:
+        for row_num, row_values in rows:
+            if headers is None:
+                if row_num > 20:
+                    break
+                if header_column not in row_values:
+                    continue
+                headers = {value: idx for idx, value in enumerate(row_values) if value not in (None, "")}
+                for col in columns:
+                    if col not in headers:
+                        raise ValueError(f"Column to return '{col}' not found in the header row.")
+                continue
+            width = len(row_values)
+            row_data = {col: row_values[headers[col]] if headers[col] < width else None for col in columns}
+            if all(value is None or value == "" for value in row_data.values()):
+                continue
+            yield row_num, row_data
+    finally:
+        rows.close()
+
+    if headers is None:
+        raise ValueError(f"Could not find header '{header_column}' in the first 20 rows.")
+
+def iter_matches(file_path: str, sheet_name: str, search_column_name: str, matching_values, columns_to_return: list = None):
+    """
+    Streaming version of find_rows / find_rows_and_get_values: yields each match
+    as soon as its row is read, in sheet order, and stops reading once every key
+    has been found. Closing the generator early releases the workbook.
+
+    Args:
+        file_path (str): The path to the .xlsx or .xls Excel file.
+        sheet_name (str): The name of the worksheet to search in.
+        search_column_name (str): The header name of the column to search (e.g. "SO#").
+        matching_values (iterable): The keys to look for, or None for every key
+                                    in the column (first occurrence wins).
+        columns_to_return (list): Header names to return for each match. When
+                                  None, the complete raw row is returned.
+
+    Yields:
+        Tuple[Any, int, Any]: (key, row_number, values) where values is the raw
+                              row list, or a {column: value} dict when
+                              `columns_to_return` is given.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        KeyError: If the sheet does not exist.
+        ValueError: If the header row or a requested column cannot be found.
+    """
+    scan = {}
+    for key, row_num, row_values in _iter_keyed_rows(file_path, sheet_name, search_column_name, matching_values,
+                                                     columns_to_return or (), scan=scan):
+        if columns_to_return is None:
+            yield key, row_num, row_values
+        else:
+            yield key, row_num, _select_columns(row_values, scan["headers"], columns_to_return)
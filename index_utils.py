@@ -0,0 +1,234 @@
+"""
+index_utils.py - Inverted value -> cell index for worksheets
+
+A SheetIndex maps every non-empty cell value in a sheet to the list of cells that
+hold it, built in a single pass over the rows. Find-by-value queries then cost a
+dictionary lookup instead of a scan of the whole grid:
+
+- find_first(value)          -> first cell in row-major order (O(1))
+- find_all(value)            -> every cell holding the value (O(k))
+- find_many(values)          -> find_all for several values at once
+- find_in_range(value, ...)  -> matches inside a row/column window (O(k))
+
+A MergedKeyIndex combines the key -> row indexes of several workbooks with
+newest-wins precedence and records which file and row each entry came from.
+
+Indexes are cached per (file, sheet) and rebuilt automatically when the file's
+size or modification time changes. The backends (excel_legacy_utils for .xls,
+excel_new_utils for .xlsx) supply the rows; this module does not import any
+Excel library.
+"""
+
+import os
+from collections import OrderedDict
+from func_utils import lookup_key
+
+# Number of sheet indexes kept in memory at once
+MAX_CACHED_INDEXES = 8
+
+_index_cache = OrderedDict()
+
+# --------------------------
+# Index
+# --------------------------
+
+class SheetIndex:
+    """
+    Inverted index of a sheet's cell values. Coordinates are 1-based (row, column)
+    tuples, stored in row-major order so the first entry matches what a nested
+    row/column scan would find first.
+    """
+
+    def __init__(self):
+        self._cells = {}
+        self.max_row = 0
+        self.max_col = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds an index from (row_number, row_values) pairs, where row_number is
+        1-based and row_values is a sequence of cell values starting at column A.
+        Empty cells (None or "") are not indexed.
+        """
+        index = cls()
+        cells = index._cells
+        for row_num, row_values in rows:
+            for col_idx, value in enumerate(row_values, start=1):
+                if value is None or value == "":
+                    continue
+                cells.setdefault(value, []).append((row_num, col_idx))
+                if col_idx > index.max_col:
+                    index.max_col = col_idx
+            if row_num > index.max_row:
+                index.max_row = row_num
+        return index
+
+    def __contains__(self, value):
+        return value in self._cells
+
+    def __len__(self):
+        return len(self._cells)
+
+    def find_first(self, value):
+        """Returns the first (row, column) holding value, or None."""
+        cells = self._cells.get(value)
+        return cells[0] if cells else None
+
+    def find_all(self, value):
+        """Returns every (row, column) holding value, in row-major order."""
+        return list(self._cells.get(value, ()))
+
+    def find_many(self, values):
+        """Returns {value: [(row, column), ...]} for each of the given values."""
+        return {value: self.find_all(value) for value in values}
+
+    def find_in_range(self, value, min_row=None, max_row=None, min_col=None, max_col=None):
+        """
+        Returns the cells holding value that fall inside the given (inclusive,
+        1-based) row and column bounds. Omitted bounds are unlimited.
+        """
+        min_row = min_row or 1
+        min_col = min_col or 1
+        max_row = max_row or self.max_row
+        max_col = max_col or self.max_col
+        return [
+            (row, col) for row, col in self._cells.get(value, ())
+            if min_row <= row <= max_row and min_col <= col <= max_col
+        ]
+
+class MergedKeyIndex:
+    """
+    Key -> row index over several workbooks (e.g. the last few Load Plans), with
+    the first (newest) workbook winning when a key appears in more than one.
+
+    Headers are merged too, so a row from any workbook is returned aligned to
+    the merged header order, and a mapping compiled against `headers` works
+    whichever file the row came from. Each entry remembers its source file and
+    row number.
+    """
+
+    def __init__(self):
+        self.sources = []
+        self.headers = {}
+        self.errors = {}
+        self._rows = {}
+
+    @classmethod
+    def from_indexes(cls, indexed_files):
+        """
+        Merges per-file key indexes.
+
+        Args:
+            indexed_files (list): (file_path, headers, rows_by_key) tuples, highest
+                precedence first, where headers maps header name -> 0-based column
+                and rows_by_key maps a normalized key (see func_utils.lookup_key) -> (row_number, row_values)
+                (as returned by func_utils.index_rows_by_key). A file whose headers
+                hold an 'error' key is skipped and recorded in `errors`.
+
+        Returns:
+            MergedKeyIndex: The merged index.
+        """
+        index = cls()
+        readable = []
+        for file_path, headers, rows_by_key in indexed_files:
+            if "error" in headers:
+                index.errors[file_path] = headers["error"]
+                continue
+            readable.append((file_path, headers, rows_by_key))
+            for name in headers:
+                index.headers.setdefault(name, len(index.headers))
+
+        width = len(index.headers)
+        for source_idx, (file_path, headers, rows_by_key) in enumerate(readable):
+            index.sources.append(file_path)
+            columns = [(index.headers[name], col_idx) for name, col_idx in headers.items()]
+            # Rows of a file laid out like the merged headers (always true for the
+            # first file) are kept as they are
+            same_layout = all(merged_idx == col_idx for merged_idx, col_idx in columns)
+            for key, (row_num, row_values) in rows_by_key.items():
+                if key in index._rows:
+                    continue
+                if same_layout:
+                    index._rows[key] = (source_idx, row_num, row_values)
+                    continue
+                # Only rows that win are re-aligned to the merged header order
+                aligned = [None] * width
+                for merged_idx, col_idx in columns:
+                    if col_idx < len(row_values):
+                        aligned[merged_idx] = row_values[col_idx]
+                index._rows[key] = (source_idx, row_num, aligned)
+        return index
+
+    def __contains__(self, key):
+        return lookup_key(key) in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def lookup(self, key):
+        """
+        Returns (file_path, row_number, row_values) for a key, or None. row_values
+        is aligned to `headers`.
+        """
+        entry = self._rows.get(lookup_key(key))
+        if entry is None:
+            return None
+        source_idx, row_num, row_values = entry
+        return self.sources[source_idx], row_num, row_values
+
+    def iter_column(self, name):
+        """Yields the value of header `name` in every indexed row, newest file first."""
+        col_idx = self.headers.get(name)
+        if col_idx is None:
+            return
+        for _, _, row_values in self._rows.values():
+            yield row_values[col_idx] if col_idx < len(row_values) else None
+
+    def counts_by_source(self):
+        """Returns {file_path: number of keys resolved from that file}."""
+        counts = dict.fromkeys(self.sources, 0)
+        for source_idx, _, _ in self._rows.values():
+            counts[self.sources[source_idx]] += 1
+        return counts
+
+# --------------------------
+# Cache
+# --------------------------
+
+def _fingerprint(file_path):
+    """Cheap change detection for a file: (size, modification time in ns)."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def get_cached_index(file_path, sheet_name, build_index):
+    """
+    Returns the cached SheetIndex for a sheet, building it with build_index() when
+    it is missing or the file has changed since it was built.
+
+    Args:
+        file_path (str): Path to the workbook.
+        sheet_name (str): Name of the worksheet.
+        build_index (callable): Zero-argument function that returns a SheetIndex.
+
+    Returns:
+        SheetIndex: The index for the sheet.
+    """
+    key = (os.path.abspath(file_path), sheet_name)
+    fingerprint = _fingerprint(file_path)
+
+    cached = _index_cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        _index_cache.move_to_end(key)
+        return cached[1]
+
+    index = build_index()
+    _index_cache[key] = (fingerprint, index)
+    _index_cache.move_to_end(key)
+    while len(_index_cache) > MAX_CACHED_INDEXES:
+        _index_cache.popitem(last=False)
+    return index
+
+def clear_index_cache():
+    """Drops every cached sheet index."""
+    _index_cache.clear()
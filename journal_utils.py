@@ -0,0 +1,205 @@
+"""
+journal_utils.py - Crash-safe resume journal for long syncs
+
+A sync reads the workbooks, processes every order and saves all cell updates
+at the end. Reading is by far the slowest part, and re-reading is wasted work
+when a later step is what failed (a crash while processing the orders, a
+locked file, a full disk, a killed process). With a journal folder configured
+the sync therefore checkpoints its progress in a journal per Mass Update file
+('<journal_folder>/<hash>.journal.json'). Each checkpoint replaces the last:
+
+- STAGE_LOADED, once the workbooks are read: every order with its Mass Update
+  row, current cell values and mapped Load Plan values, and the run counts.
+- STAGE_COMPUTED, right before the save: the cell updates to save, the run
+  counts and the run report rows.
+
+Both also hold the fingerprints of the inputs (see ledger_utils) and the
+settings digest, taken when the run started. The journal is written to a
+temporary file, synced to disk and renamed into place, so the last checkpoint
+is either complete or absent. It is deleted once the updates are saved.
+
+On the next start, if the Mass Update, the Load Plan(s) and the settings are
+unchanged, the run continues from the last checkpoint without reading either
+workbook again: the orders are processed from the journaled values, or the
+journaled updates are saved right away. Either way the run report lists every
+order. A run that dies while reading the workbooks leaves no checkpoint and
+starts over. A journal written for other inputs is discarded.
+
+Values keep their type across a resume: datetimes, dates, times and
+timedeltas are stored as tagged ISO strings and read back as such.
+"""
+
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from ledger_utils import file_fingerprint, fingerprint_matches, settings_digest
+
+JOURNAL_SUFFIX = ".journal.json"
+JOURNAL_VERSION = 3
+
+# Checkpoints, in the order a run writes them
+STAGE_LOADED = "loaded"
+STAGE_COMPUTED = "computed"
+
+# Key marking a value that JSON has no type for (see _encode_value)
+TYPE_TAG = "__type__"
+
+@dataclass
+class ResumePoint:
+    """The last checkpoint of an interrupted sync (orders and steps for STAGE_LOADED, updates for STAGE_COMPUTED)."""
+    stage: str
+    counts: dict = field(default_factory=dict)
+    orders: list = field(default_factory=list)
+    steps: list = field(default_factory=list)
+    pending_updates: dict = field(default_factory=dict)
+    report_rows: list = field(default_factory=list)
+    started_at: str = None
+
+# --------------------------
+# Value encoding
+# --------------------------
+
+def _encode_value(value):
+    """json.dumps default: tags the date and time types so they are read back unchanged."""
+    if isinstance(value, datetime):
+        return {TYPE_TAG: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {TYPE_TAG: "date", "value": value.isoformat()}
+    if isinstance(value, time):
+        return {TYPE_TAG: "time", "value": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {TYPE_TAG: "timedelta", "value": value.total_seconds()}
+    raise TypeError(f"Cannot journal a value of type {type(value).__name__}: {value!r}")
+
+def _decode_value(obj):
+    """json.loads object_hook: reverses _encode_value."""
+    kind = obj.get(TYPE_TAG)
+    if kind == "datetime":
+        return datetime.fromisoformat(obj["value"])
+    if kind == "date":
+        return date.fromisoformat(obj["value"])
+    if kind == "time":
+        return time.fromisoformat(obj["value"])
+    if kind == "timedelta":
+        return timedelta(seconds=obj["value"])
+    return obj
+
+# --------------------------
+# Journal
+# --------------------------
+
+class SyncJournal:
+    """
+    Resume journal of one Mass Update file.
+
+    Args:
+        journal_folder (str): Folder the journals are kept in.
+        mass_update_file (str): The Mass Update being synced.
+        load_plan_files (list): The Load Plans used, newest first.
+        settings (dict): Settings that affect the result (see ledger_utils.settings_digest).
+    """
+
+    def __init__(self, journal_folder, mass_update_file, load_plan_files, settings):
+        digest = hashlib.sha1(os.path.abspath(mass_update_file).encode("utf-8")).hexdigest()[:24]
+        self.path = os.path.join(journal_folder, digest + JOURNAL_SUFFIX)
+        self.mass_update_file = mass_update_file
+        self.load_plan_files = list(load_plan_files)
+        self.settings = settings_digest(settings)
+        self._header = None
+
+    def find_resume_point(self):
+        """
+        Returns the last checkpoint of an interrupted sync of the same inputs,
+        or None if there is nothing to resume. A journal written for other
+        inputs or settings, or one that cannot be read, is discarded.
+
+        Returns:
+            tuple: (resume_point, reason) where reason says why an existing
+                   journal was discarded (None otherwise).
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                journal = json.load(f, object_hook=_decode_value)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError) as e:
+            self.discard()
+            return None, f"the journal could not be read ({e})"
+
+        reason = None
+        if journal.get("version") != JOURNAL_VERSION or journal.get("stage") not in (STAGE_LOADED, STAGE_COMPUTED):
+            reason = "it was written by another version"
+        elif journal.get("settings") != self.settings:
+            reason = "the settings or column mappings changed"
+        elif [plan["path"] for plan in journal["load_plans"]] != [os.path.abspath(path) for path in self.load_plan_files]:
+            reason = "other Load Plan files are used"
+        elif not fingerprint_matches(self.mass_update_file, journal["mass_update"])[0]:
+            reason = "the Mass Update changed"
+        elif not all(fingerprint_matches(plan["path"], plan["fingerprint"])[0] for plan in journal["load_plans"]):
+            reason = "a Load Plan changed"
+        if reason:
+            self.discard()
+            return None, reason
+        return ResumePoint(journal["stage"], journal["counts"], journal.get("orders", []), journal.get("steps", []),
+                           journal.get("updates", {}), journal.get("report_rows", []), journal["started_at"]), None
+
+    def start(self, resume=None):
+        """
+        Records the input fingerprints before the workbooks are read, so a file
+        changed during the run does not match the journal later. A run that
+        continues from `resume` keeps the start time of the interrupted run.
+        """
+        self._header = {
+            "version": JOURNAL_VERSION,
+            "started_at": resume.started_at if resume else datetime.now().isoformat(timespec="seconds"),
+            "settings": self.settings,
+            "mass_update": file_fingerprint(self.mass_update_file),
+            "load_plans": [{"path": os.path.abspath(path), "fingerprint": file_fingerprint(path)}
+                           for path in self.load_plan_files],
+        }
+
+    def checkpoint_loaded(self, orders, steps, counts):
+        """
+        Writes the STAGE_LOADED checkpoint: the orders with their mapped values
+        (dicts, see sync_utils), the mapping steps as (target, source) pairs
+        and the run counts.
+
+        Raises:
+            TypeError: If a value has no JSON form (see _encode_value).
+            OSError: If the journal cannot be written.
+        """
+        self._write(dict(self._header, stage=STAGE_LOADED, orders=orders, steps=[list(step) for step in steps],
+                         counts=counts))
+
+    def complete(self, updates, counts, report_rows=()):
+        """
+        Writes the STAGE_COMPUTED checkpoint: the cell updates about to be
+        saved, the run counts and the run report rows (dicts of
+        SyncReport.add_order arguments).
+
+        Raises:
+            TypeError: If a value has no JSON form (see _encode_value).
+            OSError: If the journal cannot be written.
+        """
+        self._write(dict(self._header, stage=STAGE_COMPUTED, updates=updates, counts=counts,
+                         report_rows=list(report_rows)))
+
+    def _write(self, journal):
+        """Replaces the journal atomically (temporary file, fsync, rename)."""
+        text = json.dumps(journal, default=_encode_value)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def discard(self):
+        """Deletes the journal (after a successful save, or when it is stale)."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,177 @@
+"""
+ledger_utils.py - Ledger of processed Mass Update / Load Plan combinations
+
+Reruns over the same files redo the whole sync even when nothing has changed.
+The ledger (a JSON file, 'state/sync_ledger.json' by default) records, for
+each Mass Update file, the fingerprints of the Mass Update as the sync left it
+and of the Load Plan(s) it used, a digest of the settings, and the outcome.
+A later run with the same inputs can then be skipped.
+
+A fingerprint is (size, modification time, SHA-256). Checking one is cheap:
+- a different size means the file changed,
+- the same size and modification time means it did not,
+- only the same size with a different modification time (e.g. a copy or a
+  touch) needs the content hash.
+
+Writes to the ledger are made under a file lock and by atomic replacement, so
+concurrent runs (or sync server workers) cannot corrupt it.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from file_utils import file_lock
+
+DEFAULT_LEDGER_FILE = os.path.join("state", "sync_ledger.json")
+LOCK_SUFFIX = ".lock"
+
+# Entries kept at most; the oldest are dropped first
+MAX_LEDGER_ENTRIES = 1000
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# --------------------------
+# Fingerprints
+# --------------------------
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_fingerprint(file_path):
+    """
+    Returns the fingerprint of a file.
+
+    Returns:
+        dict: {'size', 'mtime_ns', 'sha256'}.
+    """
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hash_file(file_path)}
+
+def fingerprint_matches(file_path, recorded):
+    """
+    Checks whether a file still matches a recorded fingerprint, hashing it only
+    when the size and modification time cannot decide.
+
+    Returns:
+        tuple: (matches, hashed) where `hashed` is True when the content hash
+               was needed (and matched), so the recorded mtime can be refreshed.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False, False
+    if stat.st_size != recorded["size"]:
+        return False, False
+    if stat.st_mtime_ns == recorded["mtime_ns"]:
+        return True, False
+    if hash_file(file_path) != recorded["sha256"]:
+        return False, False
+    recorded["mtime_ns"] = stat.st_mtime_ns
+    return True, True
+
+def settings_digest(settings):
+    """Returns a short digest of a JSON-serializable settings dict."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+# --------------------------
+# Ledger
+# --------------------------
+
+class SyncLedger:
+    """
+    Processed-file ledger, keyed by the absolute path of the Mass Update file.
+
+    Each entry holds the Mass Update fingerprint after the sync, the Load Plan
+    files used with their fingerprints, the settings digest, the outcome
+    ('Success' or the failure reason), the run counts and the time it was
+    processed.
+    """
+
+    def __init__(self, ledger_file=DEFAULT_LEDGER_FILE):
+        self.ledger_file = ledger_file
+
+    def _read(self):
+        """Returns the ledger entries ({} for a missing or unreadable ledger)."""
+        try:
+            with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("entries", {})
+        except (FileNotFoundError, ValueError, AttributeError):
+            return {}
+
+    def _write(self, entries):
+        """Replaces the ledger file atomically."""
+        if len(entries) > MAX_LEDGER_ENTRIES:
+            newest = sorted(entries.items(), key=lambda item: item[1]["processed_at"], reverse=True)
+            entries = dict(newest[:MAX_LEDGER_ENTRIES])
+        temp_path = self.ledger_file + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": entries}, f, indent=2)
+        os.replace(temp_path, self.ledger_file)
+
+    def find_completed(self, mass_update_file, load_plan_files, settings):
+        """
+        Returns the ledger entry of a successful earlier sync with the same inputs,
+        or None if the combination has to be (re)processed.
+
+        Args:
+            mass_update_file (str): Path to the Mass Update file.
+            load_plan_files (list): Load Plan files, newest first.
+            settings (dict): Settings that affect the result (see settings_digest).
+        """
+        entry = self._read().get(os.path.abspath(mass_update_file))
+        if entry is None or entry["outcome"] != "Success" or entry["settings"] != settings_digest(settings):
+            return None
+        if [plan["path"] for plan in entry["load_plans"]] != [os.path.abspath(path) for path in load_plan_files]:
+            return None
+
+        refreshed = False
+        for file_path, recorded in [(mass_update_file, entry["mass_update"])] + \
+                                   [(plan["path"], plan["fingerprint"]) for plan in entry["load_plans"]]:
+            matches, hashed = fingerprint_matches(file_path, recorded)
+            if not matches:
+                return None
+            refreshed = refreshed or hashed
+
+        if refreshed:
+            # Same contents under a new mtime: remember it so the next check is cheap
+            self._update(os.path.abspath(mass_update_file), entry)
+        return entry
+
+    def record(self, mass_update_file, load_plan_files, settings, summary):
+        """
+        Records the outcome of a sync. Fingerprints are taken now, so the Mass
+        Update is recorded as the sync left it.
+
+        Args:
+            mass_update_file (str): Path to the Mass Update file.
+            load_plan_files (list): Load Plan files used, newest first.
+            settings (dict): Settings that affect the result (see settings_digest).
+            summary (dict): Run summary as returned by sync_utils.run_sync.
+        """
+        entry = {
+            "mass_update_file": os.path.abspath(mass_update_file),
+            "mass_update": file_fingerprint(mass_update_file),
+            "load_plans": [{"path": os.path.abspath(path), "fingerprint": file_fingerprint(path)}
+                           for path in load_plan_files],
+            "settings": settings_digest(settings),
+            "outcome": summary["status"],
+            "counts": {key: summary.get(key, 0) for key in ("orders", "matched", "missing", "cells_written")},
+            "processed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._update(entry["mass_update_file"], entry)
+
+    def _update(self, key, entry):
+        """Stores one entry under the ledger lock."""
+        folder = os.path.dirname(self.ledger_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with file_lock(self.ledger_file + LOCK_SUFFIX):
+            entries = self._read()
+            entries[key] = entry
+            self._write(entries)
@@ -7,6 +7,7 @@ import textwrap
 
 LOG_FOLDER = "logs"
 DAYS_TO_KEEP = 30
+LOGGER_NAME = "DataUpdater"
 
 def cleanup_old_logs():
     """Deletes log files in the log folder older than DAYS_TO_KEEP."""
@@ -47,7 +48,7 @@ def setup_logger(config_settings: dict):
 
     # 3. Basic logger configuration
     log_filename = os.path.join(LOG_FOLDER, f"{datetime.now().strftime('%Y-%m-%d')}.log")
-    logger = logging.getLogger("DataUpdater")
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(logging.INFO)
 
     # Prevent handlers from being added multiple times
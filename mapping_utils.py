@@ -0,0 +1,297 @@
+"""
+mapping_utils.py - Compiled column-mapping plans for Load Plan -> Mass Update syncs
+
+A column mapping (column_mappings.json) maps target column letters in the Mass
+Update sheet to source headers in the Load Plan. Each entry is either a header
+name or an object that also names a transform:
+
+    {
+        "J": "LSP Requested HOD",
+        "Q": {"source": "ETD Port Of Load Date", "transform": "date", "format": "%m/%d/%Y"},
+        "K": {"source": "Total Cartons", "transform": "number"}
+    }
+
+The mapping is compiled once against the Load Plan header row into a MappingPlan
+of source column indices, target column indices and transform functions. Any
+problem (bad column letter, unknown transform, missing header) raises a
+ValueError before a workbook is opened for writing.
+
+Date columns may also hold text dates ("16-Jun-25"). The sync infers each date
+column's text format from the whole Load Plan column and hands it to the plan
+with use_text_formats, so an order's dates do not depend on which other orders
+are in the run; otherwise transform_columns infers it once from the rows it is
+given (see date_utils.py). A "text_format" option pins the format instead.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from func_utils import clean_number
+from date_utils import normalize_date_column, format_date_value, get_date_parser, DEFAULT_OUTPUT_FORMAT
+
+# Transform applied to entries that are given as a plain header name. Matches the
+# formatting the sync has always applied to Load Plan values.
+DEFAULT_TRANSFORM = "date"
+
+# --------------------------
+# Transforms
+# --------------------------
+
+def _date_transform(format=DEFAULT_OUTPUT_FORMAT, text_format=None):
+    """
+    Excel serials, datetimes and text dates -> formatted date string. Text that
+    is not a date is left as is. A single value's text format is inferred from
+    the value itself; MappingPlan.transform_columns infers it per column.
+    """
+    if text_format is not None:
+        # Fails at compile time on an unsupported format
+        get_date_parser(text_format)
+    def transform(value):
+        return format_date_value(value, format, text_format)
+    return transform
+
+def _number_transform():
+    """Whole-number floats -> int (45.0 -> 45); numeric text is parsed first."""
+    def transform(value):
+        if isinstance(value, str):
+            text = value.strip().replace(",", "")
+            try:
+                value = float(text)
+            except ValueError:
+                return value
+        return clean_number(value)
+    return transform
+
+def _text_transform():
+    """Any value -> stripped string; whole-number floats lose their '.0'."""
+    def transform(value):
+        if value is None:
+            return None
+        return str(clean_number(value)).strip()
+    return transform
+
+def _raw_transform():
+    """Value is written exactly as read."""
+    return lambda value: value
+
+TRANSFORMS = {
+    "date": _date_transform,
+    "number": _number_transform,
+    "text": _text_transform,
+    "raw": _raw_transform,
+}
+
+# --------------------------
+# Plan
+# --------------------------
+
+@dataclass
+class ColumnStep:
+    """One compiled mapping entry: read source_idx, transform, write target_idx."""
+    target: str
+    target_idx: int
+    source: str
+    source_idx: int
+    transform_name: str
+    transform: callable = field(repr=False)
+    options: dict = field(default_factory=dict)
+
+@dataclass
+class MappingPlan:
+    """A validated, compiled column mapping. Column indices are 0-based."""
+    steps: list
+
+    @property
+    def source_headers(self):
+        """Unique source headers in mapping order."""
+        return list(dict.fromkeys(step.source for step in self.steps))
+
+    @property
+    def date_sources(self):
+        """Unique source headers of the date steps, in mapping order."""
+        return list(dict.fromkeys(step.source for step in self.steps if step.transform_name == "date"))
+
+    def use_text_formats(self, text_formats):
+        """
+        Reads the text dates of each date step with the format inferred for its
+        source column (e.g. from the whole Load Plan column), unless the
+        mapping pins a "text_format".
+
+        Args:
+            text_formats (dict): Source header -> text format (or None).
+        """
+        for step in self.steps:
+            if step.transform_name != "date" or step.options.get("text_format") is not None:
+                continue
+            if text_formats.get(step.source):
+                step.options["text_format"] = text_formats[step.source]
+                step.transform = TRANSFORMS["date"](**step.options)
+
+    def transform_row(self, row_values):
+        """
+        Applies the plan to one raw row (a list indexed by source column).
+
+        Returns:
+            dict: Target column letter -> transformed value (None for empty sources).
+        """
+        return {step.target: _apply(step, _cell(row_values, step.source_idx)) for step in self.steps}
+
+    def transform_columns(self, rows, date_results=None):
+        """
+        Applies the plan column by column to many raw rows at once. Date columns
+        are converted in bulk, with their text format inferred once per column.
+
+        Args:
+            rows (list): Raw rows (lists indexed by source column).
+            date_results (dict): Optional dict that receives, per date target
+                                 column, the date_utils.DateColumn with the
+                                 inferred text format and the unparsed values.
+
+        Returns:
+            dict: Target column letter -> list of transformed values, one per row.
+        """
+        columns = {}
+        for step in self.steps:
+            values = [_cell(row, step.source_idx) for row in rows]
+            if step.transform_name == "date":
+                result = normalize_date_column([None if value == "" else value for value in values],
+                                               step.options.get("format", DEFAULT_OUTPUT_FORMAT),
+                                               step.options.get("text_format"))
+                columns[step.target] = result.values
+                if date_results is not None:
+                    date_results[step.target] = result
+                continue
+            columns[step.target] = [_apply(step, value) for value in values]
+        return columns
+
+    def build_cell_updates(self, target_rows, rows):
+        """
+        Builds {cell_ref: value} updates for the target sheet from raw source rows.
+
+        Args:
+            target_rows (list): 1-based target row numbers, one per source row.
+            rows (list): Raw source rows, in the same order as target_rows.
+
+        Returns:
+            dict: Cell reference (e.g. 'J5') -> value. Empty source values are skipped.
+        """
+        columns = self.transform_columns(rows)
+        updates = {}
+        for step in self.steps:
+            for target_row, value in zip(target_rows, columns[step.target]):
+                if value is not None:
+                    updates[f"{step.target}{target_row}"] = value
+        return updates
+
+def _cell(row_values, idx):
+    """Returns row_values[idx], or None when the row is shorter than idx."""
+    return row_values[idx] if idx < len(row_values) else None
+
+def _apply(step, value):
+    """Runs a step's transform; empty cells always map to None."""
+    if value is None or value == "":
+        return None
+    return step.transform(value)
+
+def _letters_to_col_idx(letters):
+    """Convert Excel-style letters to zero-based column index ('A' -> 0)"""
+    idx = 0
+    for char in letters:
+        idx = idx * 26 + (ord(char) - 64)
+    return idx - 1
+
+# --------------------------
+# Loading and Compiling
+# --------------------------
+
+def normalize_column_mapping(mapping):
+    """
+    Validates a raw mapping (as loaded from JSON) and returns it in its explicit form:
+    {target_letter: {"source": header, "transform": name, **options}}.
+
+    Raises:
+        ValueError: Listing every problem found in the mapping.
+    """
+    if not isinstance(mapping, dict) or not mapping:
+        raise ValueError("Column mapping must be a non-empty JSON object.")
+
+    normalized = {}
+    errors = []
+    for target, entry in mapping.items():
+        target_letters = str(target).strip().upper()
+        if not re.fullmatch(r"[A-Z]{1,3}", target_letters):
+            errors.append(f"'{target}' is not a valid target column letter.")
+            continue
+
+        if isinstance(entry, str):
+            entry = {"source": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("source"), str) or not entry["source"]:
+            errors.append(f"Mapping for column '{target}' must be a header name or an object with a 'source' header.")
+            continue
+
+        entry = dict(entry)
+        entry.setdefault("transform", DEFAULT_TRANSFORM)
+        if entry["transform"] not in TRANSFORMS:
+            errors.append(f"Unknown transform '{entry['transform']}' for column '{target}'. "
+                          f"Expected one of: {', '.join(TRANSFORMS)}.")
+            continue
+        normalized[target_letters] = entry
+
+    if errors:
+        raise ValueError("Invalid column mapping:\n  " + "\n  ".join(errors))
+    return normalized
+
+def load_column_mapping(file_path):
+    """
+    Loads and validates a column mapping file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file is not valid JSON or the mapping is invalid.
+    """
+    with open(file_path, 'r') as f:
+        try:
+            mapping = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The mapping file '{file_path}' is not a valid JSON file: {e}") from e
+    return normalize_column_mapping(mapping)
+
+def compile_mapping_plan(mapping, source_headers):
+    """
+    Compiles a column mapping against the source sheet's header row.
+
+    Args:
+        mapping (dict): A raw or normalized column mapping.
+        source_headers (dict): Header name -> 0-based column index in the source
+                               sheet (as returned by func_utils.get_sheet_headers).
+
+    Returns:
+        MappingPlan: The compiled plan.
+
+    Raises:
+        ValueError: If the mapping is invalid or any source header is missing.
+    """
+    mapping = normalize_column_mapping(mapping)
+
+    missing = [entry["source"] for entry in mapping.values() if entry["source"] not in source_headers]
+    if missing:
+        raise ValueError("Source headers not found in the Load Plan header row: "
+                         + ", ".join(f"'{header}'" for header in dict.fromkeys(missing)))
+
+    steps = []
+    for target, entry in mapping.items():
+        options = {key: value for key, value in entry.items() if key not in ("source", "transform")}
+        try:
+            transform = TRANSFORMS[entry["transform"]](**options)
+        except TypeError as e:
+            raise ValueError(f"Invalid options for transform '{entry['transform']}' on column '{target}': {e}") from e
+        steps.append(ColumnStep(
+            target=target,
+            target_idx=_letters_to_col_idx(target),
+            source=entry["source"],
+            source_idx=source_headers[entry["source"]],
+            transform_name=entry["transform"],
+            transform=transform,
+            options=options,
+        ))
+    return MappingPlan(steps)
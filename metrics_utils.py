@@ -0,0 +1,312 @@
+"""
+metrics_utils.py - Run-history metrics, a Prometheus textfile and regression warnings
+
+The daily logs only hold free-form text, so they cannot show whether syncs get
+slower as the Load Plans grow. After every sync run_sync hands its summary to
+record_run_metrics(), which:
+
+- appends one JSON line to the run history ("metrics_file", e.g.
+  'state/run_metrics.jsonl') with the throughput (orders/s, cells written/s), the parse time per
+  MB of input, the peak RSS of the sync and of its worker processes, the
+  workbook opens and saves and the input sizes;
+- replaces a Prometheus textfile ("metrics_prometheus_file", e.g.
+  'state/sync_metrics.prom') with the same figures as gauges, for node_exporter's textfile collector;
+- compares the run with the median of recent successful runs of a similar
+  input size and logs a warning when it is REGRESSION_FACTOR times slower.
+
+Like ledger_utils, the history is appended under a file lock, so concurrent
+runs cannot interleave their lines.
+
+Work done in process pools (the concurrent loaders, merged Load Plan indexes)
+is invisible to this process's own RSS and sys.modules. Calls submitted
+through call_in_worker report the peak RSS and the Excel backends of the
+worker that ran them; record_worker_reports collects them, so the metrics
+and loaded_backends() (the CLI's "Excel backends used") cover the workers.
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+from datetime import datetime
+from file_utils import file_lock
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+LOCK_SUFFIX = ".lock"
+
+# Regression check: a run is compared with the median of the last BASELINE_RUNS
+# successful runs whose input size is within SIMILAR_SIZE_RATIO of its own
+BASELINE_RUNS = 20
+MIN_BASELINE_RUNS = 5
+SIMILAR_SIZE_RATIO = 0.5
+REGRESSION_FACTOR = 1.5
+
+# Runs shorter than this are too noisy to be called a regression
+MIN_REGRESSION_SECONDS = 1.0
+
+# History lines read back for the baseline; older lines are ignored
+HISTORY_LINES_READ = 500
+
+# Timing metrics checked against the baseline (all "higher is slower")
+REGRESSION_METRICS = ("elapsed_seconds", "parse_seconds_per_mb")
+
+# Excel libraries reported by loaded_backends
+EXCEL_BACKENDS = ("openpyxl", "xlrd", "xlwt", "xlutils")
+
+# Reported by worker processes: the backends they imported, and their peak RSS
+# by pid until the next run's metrics take it (see worker_peak_rss_bytes)
+_worker_backends = set()
+_worker_peaks = {}
+
+PROMETHEUS_PREFIX = "excel_sync"
+
+_MB = 1024 * 1024
+
+# --------------------------
+# Collection
+# --------------------------
+
+def peak_rss_bytes(children=False):
+    """
+    Returns the peak resident set size of this process, or with children=True
+    that of its largest finished child process (RUSAGE_CHILDREN, e.g. a
+    parallel-parse worker), or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+def worker_peak_rss_bytes():
+    """
+    Returns the memory held by the worker processes since the last call: the
+    sum of the peaks reported through call_in_worker (the loaders run side by
+    side) or the largest finished child process, whichever is larger. None
+    when no worker process ran.
+    """
+    reported = sum(_worker_peaks.values())
+    _worker_peaks.clear()
+    peak = max(reported, peak_rss_bytes(children=True) or 0)
+    return peak or None
+
+# --------------------------
+# Worker processes
+# --------------------------
+
+def loaded_backends():
+    """Returns the Excel libraries imported so far, here or in a worker that reported back."""
+    return [name for name in EXCEL_BACKENDS if name in sys.modules or name in _worker_backends]
+
+def call_in_worker(func, *args):
+    """
+    Calls func(*args) and returns (result, report), where the report holds the
+    pid, peak RSS and Excel backends of the process that ran it. Submit this
+    to a process pool and pass the reports to record_worker_reports.
+    """
+    result = func(*args)
+    report = {
+        "pid": os.getpid(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "backends": [name for name in EXCEL_BACKENDS if name in sys.modules],
+    }
+    return result, report
+
+def record_worker_reports(reports):
+    """Collects call_in_worker reports; calls that ran in this process (thread pools) add no RSS."""
+    for report in reports:
+        _worker_backends.update(report["backends"])
+        if report["pid"] != os.getpid() and report["peak_rss_bytes"] is not None:
+            _worker_peaks[report["pid"]] = max(_worker_peaks.get(report["pid"], 0), report["peak_rss_bytes"])
+
+def build_run_metrics(summary):
+    """
+    Derives the metrics of one run from its summary.
+
+    Args:
+        summary (dict): Run summary as returned by sync_utils.run_sync, with the
+                        'elapsed_seconds', 'load_seconds', 'input_bytes',
+                        'workbook_opens' and 'workbook_saves' it records.
+
+    Returns:
+        dict: A JSON-friendly history record.
+    """
+    elapsed = summary.get("elapsed_seconds") or 0.0
+    load_seconds = summary.get("load_seconds") or 0.0
+    input_bytes = summary.get("input_bytes") or {}
+    total_bytes = sum(input_bytes.values())
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "status": summary["status"],
+        "mass_update_file": summary.get("mass_update_file"),
+        "load_plan_files": summary.get("load_plan_files") or [summary.get("load_plan_file")],
+        "orders": summary.get("orders", 0),
+        "matched": summary.get("matched", 0),
+        "missing": summary.get("missing", 0),
+        "cells_written": summary.get("cells_written", 0),
+        "elapsed_seconds": round(elapsed, 4),
+        "load_seconds": round(load_seconds, 4),
+        "orders_per_second": round(summary.get("orders", 0) / elapsed, 2) if elapsed else None,
+        "cells_per_second": round(summary.get("cells_written", 0) / elapsed, 2) if elapsed else None,
+        "parse_seconds_per_mb": round(load_seconds / (total_bytes / _MB), 4) if total_bytes and load_seconds else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "worker_peak_rss_bytes": worker_peak_rss_bytes(),
+        "workbook_opens": summary.get("workbook_opens", 0),
+        "workbook_saves": summary.get("workbook_saves", 0),
+        "input_bytes": input_bytes,
+        "total_input_bytes": total_bytes,
+    }
+
+# --------------------------
+# History
+# --------------------------
+
+def read_history(metrics_file, max_lines=HISTORY_LINES_READ):
+    """
+    Returns the last `max_lines` records of a run history, oldest first. Lines
+    that are not valid JSON (e.g. from an interrupted write) are skipped.
+    """
+    try:
+        with open(metrics_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()[-max_lines:]
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+def append_history(metrics_file, record):
+    """Appends one record to the run history under its lock."""
+    folder = os.path.dirname(metrics_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with file_lock(metrics_file + LOCK_SUFFIX):
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+def find_regressions(record, history):
+    """
+    Compares a run with the rolling baseline of earlier successful runs of a
+    similar input size.
+
+    Args:
+        record (dict): The run, as built by build_run_metrics.
+        history (list): Earlier records, oldest first.
+
+    Returns:
+        list: One message per metric that is REGRESSION_FACTOR times (or more)
+              the baseline median. Empty when the run is in line or there are
+              fewer than MIN_BASELINE_RUNS comparable runs.
+    """
+    size = record["total_input_bytes"]
+    if record["status"] != "Success" or not size:
+        return []
+    similar = [run for run in history
+               if run.get("status") == "Success"
+               and abs(run.get("total_input_bytes", 0) - size) <= size * SIMILAR_SIZE_RATIO][-BASELINE_RUNS:]
+    if len(similar) < MIN_BASELINE_RUNS:
+        return []
+
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        value = record.get(metric)
+        baseline = [run[metric] for run in similar if run.get(metric)]
+        if not value or len(baseline) < MIN_BASELINE_RUNS:
+            continue
+        median = statistics.median(baseline)
+        if metric == "elapsed_seconds" and value < MIN_REGRESSION_SECONDS:
+            continue
+        if value >= median * REGRESSION_FACTOR:
+            regressions.append(f"{metric} is {value:g}, {value / median:.1f}x the median of {median:g} "
+                               f"over the last {len(baseline)} runs with similar input sizes")
+    return regressions
+
+# --------------------------
+# Prometheus Textfile
+# --------------------------
+
+def _prometheus_lines(record, regressions):
+    """Returns the textfile lines (HELP, TYPE and sample) for a run's gauges."""
+    gauges = [
+        ("last_run_timestamp_seconds", "Unix time the last sync finished.", round(time.time(), 3)),
+        ("last_run_success", "1 if the last sync succeeded, else 0.", int(record["status"] == "Success")),
+        ("last_run_duration_seconds", "Wall time of the last sync.", record["elapsed_seconds"]),
+        ("last_run_load_seconds", "Time spent reading the workbooks in the last sync.", record["load_seconds"]),
+        ("last_run_orders", "Orders processed by the last sync.", record["orders"]),
+        ("last_run_cells_written", "Cells written by the last sync.", record["cells_written"]),
+        ("last_run_orders_per_second", "Orders processed per second.", record["orders_per_second"]),
+        ("last_run_cells_per_second", "Cells written per second.", record["cells_per_second"]),
+        ("last_run_parse_seconds_per_megabyte", "Workbook read time per MB of input.", record["parse_seconds_per_mb"]),
+        ("last_run_peak_rss_bytes", "Peak resident set size of the sync.", record["peak_rss_bytes"]),
+        ("last_run_worker_peak_rss_bytes", "Peak resident set size of the sync's worker processes.",
+         record.get("worker_peak_rss_bytes")),
+        ("last_run_workbook_opens", "Workbooks opened by the last sync.", record["workbook_opens"]),
+        ("last_run_workbook_saves", "Workbooks saved by the last sync.", record["workbook_saves"]),
+        ("last_run_regressions", "Timing metrics of the last sync that were slower than the baseline.", len(regressions)),
+    ]
+    lines = []
+    for name, help_text, value in gauges:
+        if value is None:
+            continue
+        metric = f"{PROMETHEUS_PREFIX}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+    metric = f"{PROMETHEUS_PREFIX}_last_run_input_bytes"
+    lines += [f"# HELP {metric} Size of each input workbook kind of the last sync.", f"# TYPE {metric} gauge"]
+    lines += [f'{metric}{{input="{kind}"}} {size}' for kind, size in record["input_bytes"].items()]
+    return lines
+
+def write_prometheus_textfile(prom_file, record, regressions=()):
+    """
+    Replaces a Prometheus textfile with the gauges of one run. The file is
+    written to a temporary name first, so the collector never reads a partial
+    file.
+    """
+    folder = os.path.dirname(prom_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temp_path = prom_file + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(_prometheus_lines(record, regressions)) + "\n")
+    os.replace(temp_path, prom_file)
+
+# --------------------------
+# Recording
+# --------------------------
+
+def record_run_metrics(config, summary, logger):
+    """
+    Records a finished sync: checks it against the rolling baseline, appends it
+    to the run history ('metrics_file') and writes the Prometheus textfile
+    ('metrics_prometheus_file'). A missing or empty setting turns that output off.
+
+    Returns:
+        dict: The recorded metrics, with a 'regressions' list.
+    """
+    metrics_file = config.get("metrics_file")
+    prom_file = config.get("metrics_prometheus_file")
+    record = build_run_metrics(summary)
+
+    record["regressions"] = find_regressions(record, read_history(metrics_file)) if metrics_file else []
+    for regression in record["regressions"]:
+        logger.warning(f"Performance regression: {regression}.")
+    logger.info(f"Run metrics: {record['orders_per_second']} orders/s, {record['cells_per_second']} cells/s, "
+                f"{record['parse_seconds_per_mb']} s/MB parse time, peak RSS "
+                f"{(record['peak_rss_bytes'] or 0) / _MB:.1f} MB (workers "
+                f"{(record['worker_peak_rss_bytes'] or 0) / _MB:.1f} MB), {record['workbook_opens']} opens, "
+                f"{record['workbook_saves']} saves.")
+
+    if metrics_file:
+        append_history(metrics_file, record)
+    if prom_file:
+        write_prometheus_textfile(prom_file, record, record["regressions"])
+    return record
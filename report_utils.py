@@ -0,0 +1,109 @@
+"""
+report_utils.py - Streaming, machine-readable report of a sync run
+
+A SyncReport records one row per processed order: its Mass Update row, outcome
+(updated / unchanged / missing), the Load Plan file and row it matched, the
+cells it changed (old -> new) and the reason for any miss. Rows are written as each
+order is processed:
+
+- CSV: written and flushed row by row.
+- XLSX (optional): written with openpyxl's write-only mode, which streams rows
+  to disk instead of holding the sheet in memory.
+
+Memory stays flat however many orders a run processes, and the report never
+needs a second pass over the workbooks.
+"""
+
+import csv
+import os
+from datetime import datetime
+
+REPORT_COLUMNS = [
+    "Order",
+    "Mass Update Row",
+    "Status",
+    "Load Plan File",
+    "Load Plan Row",
+    "Cells Changed",
+    "Changes",
+    "Reason",
+]
+
+STATUS_UPDATED = "updated"
+STATUS_UNCHANGED = "unchanged"
+STATUS_MISSING = "missing"
+STATUS_ERROR = "error"
+
+def format_changes(changes):
+    """Formats [(cell_ref, old, new), ...] as "J5: '' -> '06/17/2025'; Q5: ..."."""
+    return "; ".join(f"{cell_ref}: '{old}' -> '{new}'" for cell_ref, old, new in changes)
+
+class SyncReport:
+    """
+    Incrementally written run report. Use as a context manager so the files are
+    always closed (and the .xlsx saved), even if the run fails part-way.
+    """
+
+    def __init__(self, report_folder, write_xlsx=False, run_name=None):
+        """
+        Args:
+            report_folder (str): Folder the report files are written to (created if needed).
+            write_xlsx (bool): Also write an .xlsx copy of the report.
+            run_name (str): Base file name. Defaults to 'sync_report_YYYYMMDD_HHMMSS'.
+        """
+        os.makedirs(report_folder, exist_ok=True)
+        run_name = run_name or f"sync_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.csv_path = os.path.join(report_folder, f"{run_name}.csv")
+        self.xlsx_path = os.path.join(report_folder, f"{run_name}.xlsx") if write_xlsx else None
+        self.counts = {STATUS_UPDATED: 0, STATUS_UNCHANGED: 0, STATUS_MISSING: 0, STATUS_ERROR: 0}
+
+        self._csv_file = open(self.csv_path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(REPORT_COLUMNS)
+
+        self._workbook = None
+        if self.xlsx_path:
+            import openpyxl
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet("Sync Report")
+            self._sheet.append(REPORT_COLUMNS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def add_order(self, order, mass_update_row, status, load_plan_row=None, changes=(), reason="", load_plan_file=None):
+        """
+        Writes one order's outcome to the report.
+
+        Args:
+            order: The order number.
+            mass_update_row (int): Row of the order in the Mass Update sheet.
+            status (str): One of 'updated', 'unchanged', 'missing' or 'error'.
+            load_plan_row (int): Matching Load Plan row, if any.
+            changes (list): (cell_ref, old_value, new_value) tuples for changed cells.
+            reason (str): Why the order was missed or partially updated.
+            load_plan_file (str): Load Plan the matching row came from, if any.
+        """
+        row = [order, mass_update_row, status, load_plan_file, load_plan_row, len(changes), format_changes(changes), reason]
+        self._csv.writerow(row)
+        self._csv_file.flush()
+        if self._workbook is not None:
+            self._sheet.append(row)
+        self.counts[status] = self.counts.get(status, 0) + 1
+
+    def add_error(self, message):
+        """Records a run-level failure (e.g. the final save failed) as its own row."""
+        self.add_order("", None, STATUS_ERROR, reason=message)
+
+    def close(self):
+        """Flushes and closes the report files. Safe to call more than once."""
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        if self._workbook is not None:
+            self._workbook.save(self.xlsx_path)
+            self._workbook = None
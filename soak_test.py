@@ -0,0 +1,320 @@
+"""
+soak_test.py - Memory and leak soak test for the sync and the Excel utilities
+
+Generates a Mass Update .xls and a Load Plan .xlsx in a temporary folder, then
+runs each workload (the full sync and the individual readers/writers) many times
+in this process. After a warm-up, it compares the following against a baseline:
+
+- resident memory (RSS),
+- memory traced by tracemalloc (with the top growing allocation sites),
+- open file descriptors / handles.
+
+A workload fails if any of them grows beyond its budget, and the script exits
+with status 1, so it can gate a release or run in CI.
+
+Usage:
+    python soak_test.py
+    python soak_test.py --iterations 500 --rows 2000 --only sync find_rows
+"""
+
+import os
+import gc
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+MASS_UPDATE_SHEET = "Mass Update"
+LOAD_PLAN_SHEET = "Load Plan"
+ORDER_COLUMN = "Shipping Order Number *"
+SEARCH_COLUMN = "SO#"
+DATE_COLUMNS = ["LSP Requested HOD", "ETD Port Of Load Date", "ETA Port Of Discharge Date", "ETA IN DC Date"]
+COLUMN_MAPPING = {"J": DATE_COLUMNS[0], "Q": DATE_COLUMNS[1], "R": DATE_COLUMNS[2], "S": DATE_COLUMNS[3]}
+
+# Default growth budgets, measured after the warm-up iterations
+DEFAULT_RSS_BUDGET_MB = 16
+DEFAULT_TRACED_BUDGET_MB = 2
+DEFAULT_HANDLE_BUDGET = 0
+
+# Workloads that rescan the sheet per lookup (quadratic in the row count) run
+# this many times fewer iterations
+SLOW_WORKLOADS = {"find_row"}
+SLOW_WORKLOAD_DIVISOR = 10
+
+# --------------------------
+# Measurements
+# --------------------------
+
+def get_rss_bytes():
+    """Returns the current resident set size in bytes, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+def get_open_handles():
+    """Returns the number of open file descriptors (handles on Windows), or None."""
+    if os.path.isdir("/proc/self/fd"):
+        return len(os.listdir("/proc/self/fd"))
+    try:
+        import psutil
+        process = psutil.Process()
+        return process.num_handles() if os.name == "nt" else process.num_fds()
+    except ImportError:
+        return None
+
+def take_measurement():
+    """Collects garbage, then returns (rss_bytes, traced_bytes, open_handles, snapshot)."""
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return get_rss_bytes(), traced, get_open_handles(), snapshot
+
+# --------------------------
+# Test Data
+# --------------------------
+
+def generate_workbooks(folder, rows):
+    """
+    Writes a Mass Update .xls and a Load Plan .xlsx with `rows` matching orders.
+    Every tenth Mass Update order has no Load Plan row, so misses are exercised too.
+
+    Returns:
+        tuple: (mass_update_file, load_plan_file)
+    """
+    import xlwt
+    import openpyxl
+
+    mass_update_file = os.path.join(folder, "Mass_Update.xls")
+    load_plan_file = os.path.join(folder, "Load_Plan.xlsx")
+
+    book = xlwt.Workbook()
+    sheet = book.add_sheet(MASS_UPDATE_SHEET)
+    sheet.write(0, 0, "Mass Update generated by soak_test.py")
+    sheet.write(2, 1, ORDER_COLUMN)
+    for letter in COLUMN_MAPPING:
+        sheet.write(2, ord(letter) - ord("A"), f"Column {letter}")
+    for i in range(rows):
+        sheet.write(3 + i, 1, str(450000000000 + i))
+    book.save(mass_update_file)
+
+    # A normal (not write-only) workbook, so the sheet gets a <dimension> tag like
+    # files saved by Excel do
+    workbook = openpyxl.Workbook()
+    load_plan = workbook.active
+    load_plan.title = LOAD_PLAN_SHEET
+    load_plan.append(["Load Plan generated by soak_test.py"])
+    load_plan.append([SEARCH_COLUMN, "Vessel"] + DATE_COLUMNS)
+    start = datetime(2025, 6, 1)
+    for i in range(rows):
+        if i % 10 == 9:
+            continue
+        dates = [start + timedelta(days=i % 30 + offset) for offset in range(len(DATE_COLUMNS))]
+        load_plan.append([450000000000 + i, f"Vessel {i % 7}"] + dates)
+    workbook.save(load_plan_file)
+
+    return mass_update_file, load_plan_file
+
+# --------------------------
+# Workloads
+# --------------------------
+
+def build_workloads(folder, mass_update_file, load_plan_file, rows):
+    """Returns {name: zero-argument callable} for every workload of the soak test."""
+    import json
+    from excel_legacy_utils import get_xls_cell_value, get_xls_last_row, get_xls_cell_reference_by_value, update_xls_cells
+    from excel_new_utils import get_xlsx_cell_value, get_xlsx_last_row, get_xlsx_cell_reference_by_value, update_xlsx_cells
+    from func_utils import (
+        get_column_values_with_row_numbers, get_column_values_with_rows, find_row_and_get_values,
+        find_rows, find_rows_and_get_values, index_rows_by_key,
+    )
+    from index_utils import clear_index_cache
+    from sync_utils import run_sync
+
+    mapping_file = os.path.join(folder, "column_mappings.json")
+    with open(mapping_file, "w") as f:
+        json.dump(COLUMN_MAPPING, f)
+
+    config = {
+        "mass_update_file": mass_update_file,
+        "mass_update_sheet": MASS_UPDATE_SHEET,
+        "mass_update_order_column": ORDER_COLUMN,
+        "load_plan_file": load_plan_file,
+        "load_plan_sheet": LOAD_PLAN_SHEET,
+        "load_plan_search_column": SEARCH_COLUMN,
+        "column_mappings_file": mapping_file,
+        "report_folder": os.path.join(folder, "reports"),
+        "concurrent_load": False,
+    }
+    logger = logging.getLogger("SoakTest")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    orders = [450000000000 + i for i in range(0, rows, max(rows // 50, 1))]
+    last_order = 450000000000 + rows - 2
+    toggle = {"value": 0}
+
+    def xls_reads():
+        get_xls_cell_value(mass_update_file, MASS_UPDATE_SHEET, "B4")
+        get_xls_last_row(mass_update_file, MASS_UPDATE_SHEET)
+
+    def xlsx_reads():
+        get_xlsx_cell_value(load_plan_file, LOAD_PLAN_SHEET, "A3")
+        get_xlsx_last_row(load_plan_file, LOAD_PLAN_SHEET)
+
+    def cell_reference_lookups():
+        # Clearing the cache makes every iteration rebuild both indexes
+        clear_index_cache()
+        get_xls_cell_reference_by_value(mass_update_file, MASS_UPDATE_SHEET, ORDER_COLUMN)
+        get_xlsx_cell_reference_by_value(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN)
+
+    def xls_writes():
+        toggle["value"] ^= 1
+        update_xls_cells(mass_update_file, MASS_UPDATE_SHEET, {"Z4": toggle["value"]})
+
+    def xlsx_writes():
+        update_xlsx_cells(load_plan_file, LOAD_PLAN_SHEET, {"Z3": toggle["value"]})
+
+    def sync():
+        run_sync(config, logger)
+
+    return {
+        "xls_reads": xls_reads,
+        "xlsx_reads": xlsx_reads,
+        "cell_reference_lookups": cell_reference_lookups,
+        "column_values": lambda: get_column_values_with_rows(mass_update_file, MASS_UPDATE_SHEET, ORDER_COLUMN),
+        "column_values_with_row_numbers": lambda: get_column_values_with_row_numbers(mass_update_file, MASS_UPDATE_SHEET, ORDER_COLUMN),
+        "find_row": lambda: find_row_and_get_values(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN, last_order, DATE_COLUMNS),
+        "find_row_missing_column": lambda: find_row_and_get_values(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN, last_order, ["No Such Column"]),
+        "find_rows": lambda: find_rows(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN, orders),
+        "find_rows_and_get_values": lambda: find_rows_and_get_values(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN, orders, DATE_COLUMNS),
+        "index_rows_by_key": lambda: index_rows_by_key(load_plan_file, LOAD_PLAN_SHEET, SEARCH_COLUMN),
+        "xls_writes": xls_writes,
+        "xlsx_writes": xlsx_writes,
+        "sync": sync,
+    }
+
+# --------------------------
+# Soak Test
+# --------------------------
+
+def soak(name, workload, iterations, warmup, budgets):
+    """
+    Runs one workload `warmup` + `iterations` times and checks its growth.
+
+    Returns:
+        dict: The workload's measurements, any budget violations and the top
+              growing allocation sites.
+    """
+    # Output of the print-based helpers would drown the report
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        for _ in range(warmup):
+            workload()
+        rss_before, traced_before, handles_before, snapshot_before = take_measurement()
+        for _ in range(iterations):
+            workload()
+        rss_after, traced_after, handles_after, snapshot_after = take_measurement()
+    except Exception as e:
+        return {"name": name, "rss_growth": None, "traced_growth": 0, "handle_growth": None,
+                "violations": [f"raised {type(e).__name__}: {e}"], "top_growth": []}
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    result = {
+        "name": name,
+        "rss_growth": None if rss_before is None or rss_after is None else rss_after - rss_before,
+        "traced_growth": traced_after - traced_before,
+        "handle_growth": None if handles_before is None or handles_after is None else handles_after - handles_before,
+        "violations": [],
+        "top_growth": snapshot_after.compare_to(snapshot_before, "lineno")[:5],
+    }
+    if result["rss_growth"] is not None and result["rss_growth"] > budgets["rss"]:
+        result["violations"].append(f"RSS grew {result['rss_growth'] / 2**20:.1f} MB")
+    if result["traced_growth"] > budgets["traced"]:
+        result["violations"].append(f"traced memory grew {result['traced_growth'] / 2**20:.1f} MB")
+    if result["handle_growth"] is not None and result["handle_growth"] > budgets["handles"]:
+        result["violations"].append(f"{result['handle_growth']} file handles leaked")
+    return result
+
+def print_result(result, iterations):
+    """Prints one workload's line of the report, plus allocation sites when it fails."""
+    rss = "n/a" if result["rss_growth"] is None else f"{result['rss_growth'] / 2**20:+.2f} MB"
+    handles = "n/a" if result["handle_growth"] is None else f"{result['handle_growth']:+d}"
+    status = "FAIL" if result["violations"] else "ok"
+    print(f"{result['name']:<26} {iterations:>6} {rss:>12} {result['traced_growth'] / 2**20:>+10.2f} MB {handles:>8}  {status}", flush=True)
+    for violation in result["violations"]:
+        print(f"    - {violation}")
+    if result["top_growth"] and result["violations"]:
+        print("    Top growing allocation sites:")
+        for stat in result["top_growth"]:
+            print(f"      {stat}")
+
+def main(argv=None):
+    """Runs the soak test. Returns 0 if every workload stayed within its budgets, 1 otherwise."""
+    parser = argparse.ArgumentParser(description="Memory and leak soak test for the sync and the Excel utilities.")
+    parser.add_argument("--iterations", type=int, default=50, help="Measured iterations per workload (default: 50).")
+    parser.add_argument("--warmup", type=int, default=5, help="Iterations before the baseline is taken (default: 5).")
+    parser.add_argument("--rows", type=int, default=200, help="Orders in the generated workbooks (default: 200).")
+    parser.add_argument("--rss-budget-mb", type=float, default=DEFAULT_RSS_BUDGET_MB,
+                        help=f"Allowed RSS growth per workload (default: {DEFAULT_RSS_BUDGET_MB} MB).")
+    parser.add_argument("--traced-budget-mb", type=float, default=DEFAULT_TRACED_BUDGET_MB,
+                        help=f"Allowed tracemalloc growth per workload (default: {DEFAULT_TRACED_BUDGET_MB} MB).")
+    parser.add_argument("--handle-budget", type=int, default=DEFAULT_HANDLE_BUDGET,
+                        help=f"Allowed growth in open file handles per workload (default: {DEFAULT_HANDLE_BUDGET}).")
+    parser.add_argument("--only", nargs="+", metavar="WORKLOAD", help="Run only these workloads.")
+    args = parser.parse_args(argv)
+
+    budgets = {
+        "rss": args.rss_budget_mb * 2**20,
+        "traced": args.traced_budget_mb * 2**20,
+        "handles": args.handle_budget,
+    }
+
+    folder = tempfile.mkdtemp(prefix="soak_test_")
+    try:
+        mass_update_file, load_plan_file = generate_workbooks(folder, args.rows)
+        workloads = build_workloads(folder, mass_update_file, load_plan_file, args.rows)
+        unknown = set(args.only or ()) - set(workloads)
+        if unknown:
+            parser.error(f"Unknown workloads: {', '.join(sorted(unknown))}. Choose from: {', '.join(workloads)}")
+
+        print(f"Soak test: {args.iterations} iterations (+{args.warmup} warm-up) per workload, {args.rows} rows.")
+        print(f"{'Workload':<26} {'Iters':>6} {'RSS':>12} {'Traced':>13} {'Handles':>8}  Status")
+
+        tracemalloc.start()
+        failed = []
+        for name, workload in workloads.items():
+            if args.only and name not in args.only:
+                continue
+            iterations, warmup = args.iterations, args.warmup
+            if name in SLOW_WORKLOADS:
+                iterations = max(iterations // SLOW_WORKLOAD_DIVISOR, 2)
+                warmup = max(warmup // SLOW_WORKLOAD_DIVISOR, 1)
+            result = soak(name, workload, iterations, warmup, budgets)
+            print_result(result, iterations)
+            if result["violations"]:
+                failed.append(name)
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if failed:
+        print(f"\nFAILED: {', '.join(failed)} exceeded the memory/handle budgets.")
+        return 1
+    print("\nAll workloads stayed within budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+sync_client.py - Thin client for the sync server (sync_server.py)
+
+Uses only the standard library, so it starts in milliseconds. Sends one
+request, prints the result and exits with the same code as the script would:
+0 on success, 1 on failure.
+
+Usage:
+    python sync_client.py sync [--mass-update-file FILE ...]
+    python sync_client.py lookup 454773467353 454774312210 [--columns "ETD Port Of Load Date"]
+    python sync_client.py stats | ping | shutdown
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "excel_sync.sock")
+
+# Seconds to wait for a response; a sync of a large workbook can take a while
+DEFAULT_TIMEOUT = 600
+
+# Config settings that can be overridden per request
+OVERRIDE_FLAGS = ("mass_update_file", "load_plan_file", "mass_update_sheet", "load_plan_sheet")
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH, timeout=DEFAULT_TIMEOUT):
+    """
+    Sends one request to the sync server and returns its response.
+
+    Args:
+        request (dict): The request, e.g. {"command": "sync"}.
+        socket_path (str): Path of the server's Unix socket.
+        timeout (float): Seconds to wait for the response.
+
+    Returns:
+        dict: The server's response.
+
+    Raises:
+        OSError: If the server cannot be reached.
+        ValueError: If the response is not valid JSON.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with conn.makefile("rb") as response:
+            return json.loads(response.readline())
+
+def _print_response(command, response):
+    """Prints a response in a readable form."""
+    if command == "sync":
+        for key in ("mass_update_file", "load_plan_file", "orders", "matched", "missing",
+                    "cells_written", "report_file", "skipped"):
+            if response.get(key) is not None:
+                print(f"{key}: {response[key]}")
+    elif command == "lookup":
+        for key, match in response.get("found", {}).items():
+            print(f"{key}: row {match['row']} of {os.path.basename(match['file'])} {json.dumps(match['values'], default=str)}")
+        for key in response.get("missing", []):
+            print(f"{key}: not found")
+    elif command == "stats":
+        print(json.dumps({k: v for k, v in response.items() if k not in ("status", "elapsed_ms")}, indent=2))
+
+def main(argv=None):
+    """Parses the command line, sends the request and returns the exit code."""
+    parser = argparse.ArgumentParser(description="Client for the Excel sync server.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help=f"Server socket (default: {DEFAULT_SOCKET_PATH}).")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds to wait for the server.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Run the sync on the server.")
+    lookup_parser = subparsers.add_parser("lookup", help="Look orders up in the Load Plan(s).")
+    lookup_parser.add_argument("keys", nargs="+", help="Order numbers to look up.")
+    lookup_parser.add_argument("--columns", nargs="+", help="Columns to return (default: all).")
+    for sub in (sync_parser, lookup_parser):
+        for key in OVERRIDE_FLAGS:
+            sub.add_argument("--" + key.replace("_", "-"), dest=key)
+    sync_parser.add_argument("--reprocess", action="store_true", default=None,
+                             help="Sync even if the ledger shows these inputs were already synced.")
+    for command in ("stats", "ping", "shutdown"):
+        subparsers.add_parser(command)
+    args = parser.parse_args(argv)
+
+    request = {"command": args.command}
+    overrides = {key: getattr(args, key) for key in OVERRIDE_FLAGS + ("reprocess",) if getattr(args, key, None) is not None}
+    if overrides:
+        request["overrides"] = overrides
+    if args.command == "lookup":
+        request["keys"], request["columns"] = args.keys, args.columns
+
+    started = time.perf_counter()
+    try:
+        response = send_request(request, args.socket, args.timeout)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not reach the sync server on '{args.socket}': {e}")
+        return 1
+    round_trip_ms = (time.perf_counter() - started) * 1000
+
+    _print_response(args.command, response)
+    print(f"{response.get('status')} (server {response.get('elapsed_ms')} ms, round trip {round_trip_ms:.1f} ms)")
+    return 0 if response.get("status") == "Success" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+sync_server.py - Long-running sync server with warm workers and a workbook cache
+
+Tools that start a sync many times an hour pay for interpreter start-up, the
+Excel library imports and a fresh parse of the same Load Plan on every run.
+This server is started once (`python cli.py serve`) and listens on a Unix
+socket. A fixed pool of worker threads shares:
+
+- the imported libraries,
+- a KeyIndexCache of parsed Load Plans (key -> row indexes) that evicts the
+  least recently used entry and rebuilds an entry when its file changes.
+
+Protocol: the client sends one JSON object on one line and receives one JSON
+object on one line, then the connection is closed. Every request has a
+"command":
+
+- {"command": "sync", "overrides": {...}}
+      Runs the sync (run_sync) with the server's config file plus overrides.
+      Response: the run summary, as returned by run_sync.
+- {"command": "lookup", "keys": [...], "columns": [...], "overrides": {...}}
+      Looks keys up in the configured Load Plan(s).
+      Response: {"found": {key: {"file", "row", "values"}}, "missing": [...]},
+      with the raw cell values (dates as text).
+- {"command": "stats"}     Cache and request counters.
+- {"command": "ping"}      Liveness check.
+- {"command": "shutdown"}  Stops the server after replying.
+
+Every response has a "status" ("Success" or "Error: ...") and "elapsed_ms",
+the time the server spent on the request. sync_client.py is the matching thin
+client.
+"""
+
+import os
+import copy
+import json
+import time
+import socket
+import tempfile
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from func_utils import index_rows_by_key
+from index_utils import MergedKeyIndex
+from sync_utils import load_sync_config, run_sync, resolve_input_files, resolve_load_plan_files, DEFAULT_CONFIG_FILE
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "excel_sync.sock")
+
+# Worker threads serving requests, and parsed Load Plans kept in memory
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_SIZE = 8
+
+# Largest request line accepted, in bytes
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# --------------------------
+# Workbook Cache
+# --------------------------
+
+class KeyIndexCache:
+    """
+    Thread-safe LRU cache of Load Plan key indexes (func_utils.index_rows_by_key
+    results), keyed by (file, sheet, search column) and rebuilt when the file's
+    size or modification time changes. Failed reads are not cached.
+
+    The validation profile built with an index is cached with it. A request
+    whose profile watches other columns rebuilds the entry.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path, sheet_name, search_column_name, profile=None):
+        """
+        Returns (headers, rows_by_key) for a sheet, from the cache when it is
+        still valid. A validation_utils.SheetProfile passed as `profile` is
+        filled from the cached profile or while the sheet is indexed.
+        """
+        key = (os.path.abspath(file_path), sheet_name, search_column_name)
+        stat = os.stat(file_path)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == fingerprint and \
+                    (profile is None or (cached[2] is not None and cached[2].spec == profile.spec)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if profile is not None:
+                    profile.copy_from(cached[2])
+                return cached[1]
+            self.misses += 1
+
+        # Parsed outside the lock so other workers are not blocked meanwhile
+        index = index_rows_by_key(file_path, sheet_name, search_column_name, profile=profile)
+        if "error" in index[0]:
+            return index
+
+        with self._lock:
+            self._entries[key] = (fingerprint, index, copy.deepcopy(profile))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return index
+
+    def stats(self):
+        """Returns the cache counters and the cached sheets."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "cached": [f"{path} [{sheet}]" for path, sheet, _ in self._entries],
+            }
+
+# --------------------------
+# Request Handling
+# --------------------------
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line, runs it and writes one JSON response line."""
+
+    def handle(self):
+        started = time.perf_counter()
+        line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+        request = {}
+        try:
+            if len(line) > MAX_REQUEST_BYTES:
+                raise ValueError(f"Request is larger than {MAX_REQUEST_BYTES} bytes.")
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+        except (ValueError, TypeError) as e:
+            request, response = {}, {"status": f"Error: Invalid request: {e}"}
+        else:
+            try:
+                response = self.server.dispatch(request)
+            except Exception as e:
+                self.server.logger.exception(f"Request '{request.get('command')}' failed.")
+                response = {"status": f"Error: {e}"}
+
+        response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+        self.server.logger.info(f"Request '{request.get('command')}' -> {response['status']} "
+                                f"in {response['elapsed_ms']} ms")
+
+        if request.get("command") == "shutdown":
+            # shutdown() waits for serve_forever() to return, so it runs on its own thread
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+class SyncServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server that hands each connection to a fixed pool of worker
+    threads. The workers share the imported libraries and the KeyIndexCache.
+    """
+
+    def __init__(self, socket_path, config_file, logger, workers=DEFAULT_WORKERS, cache_size=DEFAULT_CACHE_SIZE):
+        self.config_file = config_file
+        self.logger = logger
+        self.cache = KeyIndexCache(cache_size)
+        self.requests_served = 0
+        self.started_at = time.time()
+        self._counter_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync-worker")
+        super().__init__(socket_path, _RequestHandler)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_in_worker, request, client_address)
+
+    def _process_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+    def dispatch(self, request):
+        """Runs one request and returns its response dict."""
+        with self._counter_lock:
+            self.requests_served += 1
+
+        command = request.get("command")
+        if command == "ping":
+            return {"status": "Success"}
+        if command == "stats":
+            return {"status": "Success", "requests_served": self.requests_served,
+                    "uptime_s": round(time.time() - self.started_at, 1), "cache": self.cache.stats()}
+        if command == "shutdown":
+            return {"status": "Success"}
+        if command not in ("sync", "lookup"):
+            return {"status": f"Error: Unknown command '{command}'."}
+
+        try:
+            config = load_sync_config(self.config_file, request.get("overrides"))
+        except (FileNotFoundError, ValueError) as e:
+            return {"status": f"Error: Could not load configuration: {e}"}
+
+        if command == "sync":
+            return run_sync(config, self.logger, key_index_provider=self.cache.get)
+        return self._lookup(config, request.get("keys") or [], request.get("columns"))
+
+    def _lookup(self, config, keys, columns):
+        """Looks keys up in the configured Load Plan(s) (newest wins), using the cache."""
+        _, load_plan_file = resolve_input_files(config)
+        if not load_plan_file and not config.get("load_plan_files"):
+            return {"status": "Error: Could not find a Load Plan file."}
+        load_plan_files = resolve_load_plan_files(config, load_plan_file)
+
+        merged_index = MergedKeyIndex.from_indexes([
+            (file_path, *self.cache.get(file_path, config["load_plan_sheet"], config["load_plan_search_column"]))
+            for file_path in load_plan_files
+        ])
+        if not merged_index.sources:
+            return {"status": f"Error: Could not read any Load Plan: {'; '.join(merged_index.errors.values())}"}
+
+        columns = columns or list(merged_index.headers)
+        unknown = [col for col in columns if col not in merged_index.headers]
+        if unknown:
+            return {"status": f"Error: Columns not found in the Load Plan header row: {', '.join(map(str, unknown))}"}
+
+        found, missing = {}, []
+        for key in keys:
+            match = merged_index.lookup(key)
+            if match is None:
+                missing.append(key)
+                continue
+            file_path, row_num, row_values = match
+            found[str(key)] = {
+                "file": file_path,
+                "row": row_num,
+                "values": {col: _cell(row_values, merged_index.headers[col]) for col in columns},
+            }
+        return {"status": "Success", "found": found, "missing": missing}
+
+def _cell(row_values, col_idx):
+    """Returns row_values[col_idx], or None if the row is shorter."""
+    return row_values[col_idx] if col_idx < len(row_values) else None
+
+# --------------------------
+# Entry Point
+# --------------------------
+
+def _remove_stale_socket(socket_path):
+    """
+    Removes a socket file left behind by a server that is no longer running.
+
+    Raises:
+        OSError: If another server is still listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"A sync server is already listening on '{socket_path}'.")
+
+def serve(config_file=DEFAULT_CONFIG_FILE, socket_path=DEFAULT_SOCKET_PATH, logger=None,
+          workers=DEFAULT_WORKERS, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Runs the sync server until it receives a 'shutdown' request or Ctrl+C.
+
+    Args:
+        config_file (str): Sync configuration, re-read for every request so edits
+                           take effect without a restart.
+        socket_path (str): Path of the Unix socket to listen on.
+        logger (logging.Logger): Logger for requests and sync progress.
+        workers (int): Number of worker threads serving requests.
+        cache_size (int): Number of parsed Load Plan sheets kept in memory.
+
+    Raises:
+        OSError: If Unix sockets are unavailable or another server is running.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("The sync server needs Unix domain sockets, which this platform does not support.")
+    _remove_stale_socket(socket_path)
+
+    server = SyncServer(socket_path, config_file, logger, workers, cache_size)
+    logger.info(f"Sync server listening on '{socket_path}' ({workers} workers, cache of {cache_size} sheets).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Sync server stopped.")
@@ -0,0 +1,1017 @@
+"""
+sync_utils.py - Load Plan -> Mass Update sync, driven by a configuration dict
+
+The sync that app_4.py used to hard-code lives here so that app_4.py, the CLI
+(cli.py) and any batch tooling share one implementation. Configuration comes
+from a JSON file (sync_config.json by default) plus optional overrides instead
+of module constants.
+
+Excel libraries are only imported by the utility functions that need them, so
+importing this module is cheap.
+
+With "concurrent_load" enabled the Mass Update and Load Plan workbooks are read
+at the same time in an executor (processes by default, so the two parses use
+separate cores), and the orders are matched as soon as both are loaded.
+
+With "load_plan_merge_count" above 1 the latest N Load Plans are indexed
+together and merged newest-first, so an order missing from the newest plan is
+still resolved from an older one in the same run.
+
+With "ledger_file" set, every run is recorded in a processed-file ledger
+(ledger_utils.py) and a run whose Mass Update, Load Plan(s) and settings are
+unchanged since a successful sync is skipped. Set "reprocess" to run anyway.
+
+Unless "validation" is "off", the loaders also profile the inputs in the same
+pass (validation_utils.py): key problems, mapped columns missing from the
+header row, non-date values in date columns and per-column statistics are
+logged before anything is written, and "strict" stops a run with issues.
+
+With "journal_folder" set, progress is checkpointed in a resume journal
+(journal_utils.py) once the workbooks are read and again right before the
+save, and a run that died after reading them is finished by the next run with
+the same inputs without reading the workbooks again.
+
+run_fanout_sync() updates several Mass Update layouts (each with its own sheet,
+order column and column mappings, listed in "fanout_targets") from one Load
+Plan pass: the orders of all targets are looked up together, only the union of
+their source columns is kept, and each target then costs just its own reads
+and writes.
+
+Row scans stop after "empty_row_run" (default 1000) consecutive empty rows
+below the data (extent_utils.py); a scan cut off before the sheet's declared
+end is logged as a warning.
+
+Every run that is not skipped is timed and recorded in a run history with a
+Prometheus textfile snapshot (metrics_utils.py), and a run much slower than
+earlier runs of a similar input size is logged as a regression.
+"""
+
+import os
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from file_utils import get_latest_file, get_latest_files
+from update_queue import submit_xls_updates
+from func_utils import (
+    find_rows, find_rows_projected, get_sheet_headers, clean_number, get_column_values_with_rows, index_rows_by_key,
+    build_merged_key_index,
+)
+from index_utils import MergedKeyIndex
+from mapping_utils import load_column_mapping, compile_mapping_plan
+from report_utils import SyncReport, STATUS_UPDATED, STATUS_UNCHANGED, STATUS_MISSING
+from ledger_utils import SyncLedger, hash_file
+from validation_utils import SheetProfile, call_with_profile, check_profiles, VALIDATION_MODES, DEFAULT_VALIDATION_MODE
+from metrics_utils import record_run_metrics, call_in_worker, record_worker_reports
+from date_utils import infer_date_format
+import extent_utils
+from extent_utils import set_empty_row_run
+from journal_utils import SyncJournal, STAGE_LOADED
+
+DEFAULT_CONFIG_FILE = "sync_config.json"
+
+# Executors available for "load_executor" when "concurrent_load" is enabled.
+# xlrd and openpyxl parse in pure Python, so only processes overlap the parsing
+# itself; threads only overlap the file I/O.
+LOAD_EXECUTORS = {
+    "process": ProcessPoolExecutor,
+    "thread": ThreadPoolExecutor,
+}
+
+REQUIRED_CONFIG_KEYS = (
+    "mass_update_sheet",
+    "mass_update_order_column",
+    "load_plan_sheet",
+    "load_plan_search_column",
+    "column_mappings_file",
+)
+
+# --------------------------
+# Configuration
+# --------------------------
+
+def load_sync_config(config_file=DEFAULT_CONFIG_FILE, overrides=None):
+    """
+    Loads the sync configuration from a JSON file and applies overrides.
+
+    Either an explicit file ('mass_update_file' / 'load_plan_file') or a folder
+    plus file format ('..._folder' / '..._file_format') must be configured for
+    each workbook.
+
+    Args:
+        config_file (str): Path to the JSON configuration file.
+        overrides (dict): Values that replace the file's settings. None values are ignored.
+
+    Returns:
+        dict: The merged configuration.
+
+    Raises:
+        FileNotFoundError: If the configuration file does not exist.
+        ValueError: If the file is not valid JSON or a required setting is missing.
+    """
+    with open(config_file, 'r') as f:
+        try:
+            config = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The config file '{config_file}' is not a valid JSON file: {e}") from e
+
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+
+    missing = [key for key in REQUIRED_CONFIG_KEYS if not config.get(key)]
+    for prefix in ("mass_update", "load_plan"):
+        if not config.get(f"{prefix}_file") and not (config.get(f"{prefix}_folder") and config.get(f"{prefix}_file_format")):
+            missing.append(f"{prefix}_file (or {prefix}_folder and {prefix}_file_format)")
+    if missing:
+        raise ValueError(f"Missing sync settings in '{config_file}': {', '.join(missing)}")
+    if config.get("validation", DEFAULT_VALIDATION_MODE) not in VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode '{config['validation']}' in '{config_file}'. "
+                         f"Use one of: {', '.join(VALIDATION_MODES)}.")
+    return config
+
+def resolve_input_files(config):
+    """
+    Returns (mass_update_file, load_plan_file) from explicit paths or the latest
+    file in each configured folder. Either value is None when nothing is found.
+    """
+    mass_update_file = config.get("mass_update_file") or get_latest_file(
+        config["mass_update_folder"], config["mass_update_file_format"])
+    load_plan_file = config.get("load_plan_file") or get_latest_file(
+        config["load_plan_folder"], config["load_plan_file_format"])
+    return mass_update_file, load_plan_file
+
+def resolve_load_plan_files(config, load_plan_file):
+    """
+    Returns the Load Plans to read, newest (highest precedence) first: the
+    explicit 'load_plan_files' list, else the latest 'load_plan_merge_count'
+    files in the Load Plan folder, else just `load_plan_file`.
+    """
+    if config.get("load_plan_files"):
+        return list(config["load_plan_files"])
+    merge_count = int(config.get("load_plan_merge_count") or 1)
+    if merge_count > 1 and not config.get("load_plan_file"):
+        files = get_latest_files(config["load_plan_folder"], config["load_plan_file_format"], merge_count)
+        if files:
+            return files
+    return [load_plan_file]
+
+# --------------------------
+# Sync
+# --------------------------
+
+# Settings that change what a sync writes; the ledger only skips a run when
+# these (and the column mappings) are the same as in the recorded run
+LEDGER_SETTING_KEYS = (
+    "mass_update_sheet", "mass_update_order_column", "load_plan_sheet", "load_plan_search_column", "validation",
+)
+
+# Summary counts kept in the resume journal and restored when it is saved
+JOURNAL_COUNTS = ("orders", "matched", "missing", "matched_by_file", "unparsed_dates")
+
+def run_sync(config, logger, key_index_provider=None):
+    """
+    Updates the Mass Update sheet with data from the Load Plan sheet.
+
+    Args:
+        config (dict): Settings as returned by load_sync_config.
+        logger (logging.Logger): Logger for progress and warnings.
+        key_index_provider (callable): Optional (file_path, sheet_name, search_column,
+            profile=None) -> (headers, rows_by_key) function, as
+            func_utils.index_rows_by_key. A long-running caller (see
+            sync_server.py) passes a cached one so unchanged Load Plans are not
+            parsed again.
+
+    Returns:
+        dict: Run summary with 'status' ('Success' or an error reason), the input
+              files, and counts of orders, matches, misses and cells written.
+              'skipped' is True when the ledger showed the inputs were already synced.
+              'validation' holds the input profiles and 'validation_issues' the
+              problems found, if any. 'resumed_orders' is the number of orders
+              taken from the resume journal of an interrupted run. Timings ('elapsed_seconds',
+              'load_seconds'), 'input_bytes', 'workbook_opens' and
+              'workbook_saves' feed the run metrics.
+    """
+    started = time.perf_counter()
+    # Row scans stop after this many empty rows (see extent_utils)
+    set_empty_row_run(config.get("empty_row_run"))
+    summary = {"status": "Success", "mass_update_file": None, "load_plan_file": None,
+               "orders": 0, "matched": 0, "missing": 0, "cells_written": 0,
+               "workbook_opens": 0, "workbook_saves": 0}
+
+    # --- 1. Load Column Mappings ---
+    mappings_file = config["column_mappings_file"]
+    try:
+        column_mapping = load_column_mapping(mappings_file)
+        logger.info("Successfully loaded column mappings.")
+    except FileNotFoundError:
+        return _fail(summary, logger, f"The mapping file '{mappings_file}' was not found.")
+    except ValueError as e:
+        return _fail(summary, logger, str(e))
+
+    # --- 2. Get Latest Files ---
+    logger.info("Locating latest files...")
+    mass_update_file, load_plan_file = resolve_input_files(config)
+    if not mass_update_file or not load_plan_file:
+        return _fail(summary, logger, "Could not find one or both of the required Excel files.")
+    summary["mass_update_file"], summary["load_plan_file"] = mass_update_file, load_plan_file
+
+    logger.info(f"Found Mass Update file: {mass_update_file}")
+    load_plan_files = resolve_load_plan_files(config, load_plan_file)
+    summary["load_plan_file"], summary["load_plan_files"] = load_plan_files[0], load_plan_files
+    for precedence, file_path in enumerate(load_plan_files, start=1):
+        logger.info(f"Found Load Plan file: {file_path}"
+                    + (f" (precedence {precedence} of {len(load_plan_files)})" if len(load_plan_files) > 1 else ""))
+
+    # --- Skip Inputs That Were Already Synced ---
+    ledger = SyncLedger(config["ledger_file"]) if config.get("ledger_file") else None
+    if ledger:
+        ledger_settings = _ledger_settings(config, mappings_file)
+        done = None if config.get("reprocess") else ledger.find_completed(mass_update_file, load_plan_files, ledger_settings)
+        if done:
+            summary["skipped"] = True
+            logger.info(f"'{mass_update_file}' was already synced with these Load Plan(s) and settings "
+                        f"on {done['processed_at']} and has not changed since. Skipping (use 'reprocess' to force).")
+            return summary
+
+    journal = None
+    if config.get("journal_folder"):
+        journal = SyncJournal(config["journal_folder"], mass_update_file, load_plan_files,
+                              _ledger_settings(config, mappings_file))
+
+    summary["input_bytes"] = _input_sizes([mass_update_file], load_plan_files)
+    summary = _sync_files(config, logger, summary, mass_update_file, load_plan_files, column_mapping, key_index_provider,
+                          journal)
+    summary["elapsed_seconds"] = time.perf_counter() - started
+
+    if ledger:
+        try:
+            ledger.record(mass_update_file, load_plan_files, ledger_settings, summary)
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Could not record the run in the ledger '{ledger.ledger_file}': {e}")
+    if config.get("metrics_file") or config.get("metrics_prometheus_file"):
+        try:
+            record_run_metrics(config, summary, logger)
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Could not record the run metrics: {e}")
+    return summary
+
+def _input_sizes(mass_update_files, load_plan_files):
+    """Returns the size in bytes of all Mass Updates together and of all Load Plans together."""
+    sizes = {"mass_update": 0, "load_plan": 0}
+    for kind, file_path in [("mass_update", path) for path in mass_update_files] + \
+            [("load_plan", path) for path in load_plan_files]:
+        try:
+            sizes[kind] += os.path.getsize(file_path)
+        except OSError:
+            continue
+    return sizes
+
+def _ledger_settings(config, mappings_file):
+    """Returns the settings that identify a sync's result for the ledger."""
+    settings = {key: config.get(key) for key in LEDGER_SETTING_KEYS}
+    settings["column_mappings"] = hash_file(mappings_file)
+    return settings
+
+def _sync_files(config, logger, summary, mass_update_file, load_plan_files, column_mapping, key_index_provider,
+                journal=None):
+    """
+    Reads, matches and updates the resolved input files (steps 3-7 of run_sync).
+    With a `journal` (a journal_utils.SyncJournal) progress is checkpointed
+    once the workbooks are read and right before the save, and a run left
+    interrupted continues from its last checkpoint without reading the
+    workbooks.
+
+    Returns:
+        dict: The updated run summary.
+    """
+    resume = _find_resume_point(journal, logger)
+    if resume is not None and resume.stage == STAGE_LOADED:
+        logger.info(f"Resuming the sync interrupted on {resume.started_at}: its workbooks were read, processing "
+                    f"the {resume.counts['orders']} orders without re-reading them.")
+        journal.start(resume)
+        summary.update(resume.counts)
+        summary["resumed_orders"] = resume.counts["orders"]
+        return _process_orders(config, logger, summary, mass_update_file, resume.orders, resume.steps, journal)
+    if resume is not None:
+        return _resume_save(config, logger, summary, mass_update_file, resume, journal)
+    if journal:
+        journal.start()
+
+    # --- 3-5. Read Both Workbooks and Match Orders (profiling them in the same pass) ---
+    profiles = _new_profiles(config, column_mapping, load_plan_files)
+    load_started = time.perf_counter()
+    try:
+        if key_index_provider is not None:
+            loaded = _load_inputs_with_provider(config, logger, mass_update_file, load_plan_files,
+                                                column_mapping, key_index_provider, profiles)
+        elif config.get("concurrent_load"):
+            loaded = asyncio.run(_load_inputs_concurrently(config, logger, mass_update_file, load_plan_files,
+                                                           column_mapping, profiles))
+        else:
+            loaded = _load_inputs(config, logger, mass_update_file, load_plan_files, column_mapping, profiles)
+    except _SyncInputError as e:
+        return _fail(summary, logger, str(e))
+    mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles = loaded
+    summary["load_seconds"] = time.perf_counter() - load_started
+    # Load Plan indexes from key_index_provider (usually a cache) are not counted as opens
+    summary["workbook_opens"] = 1 if key_index_provider is not None else \
+        _load_plan_reads(config, load_plan_files) + 1
+
+    # --- Validate the Inputs Before Anything Is Written ---
+    if profiles:
+        issues = check_profiles(profiles, logger)
+        summary["validation"] = [profile.to_dict() for profile in profiles if profile.file_path]
+        if issues:
+            summary["validation_issues"] = issues
+            if config.get("validation") == "strict":
+                return _fail(summary, logger, f"Input validation found {len(issues)} issue(s); nothing was written.")
+            logger.warning(f"Input validation found {len(issues)} issue(s); continuing ('validation' is 'warn').")
+
+    if not shipping_orders:
+        logger.warning("Could not find any shipping order numbers to process. Exiting.")
+        return summary
+
+    summary["orders"] = len(shipping_orders)
+    summary["matched"], summary["missing"] = len(lookup_results), len(missing_orders)
+    logger.info(f"Matched {len(lookup_results)} orders in the Load Plan, {len(missing_orders)} not found.")
+    if len(load_plan_files) > 1:
+        summary["matched_by_file"] = {file_path: 0 for file_path in load_plan_files}
+        for file_path in order_sources.values():
+            summary["matched_by_file"][file_path] += 1
+        for file_path, matched in summary["matched_by_file"].items():
+            logger.info(f"  -> {matched} orders resolved from '{os.path.basename(file_path)}'.")
+
+    # Transform every mapped column for all matched orders in one go
+    matched_orders = [(row_num, clean_number(order_number)) for row_num, order_number, _ in shipping_orders
+                      if clean_number(order_number) in lookup_results]
+    date_results = {}
+    mapped_columns = mapping_plan.transform_columns([lookup_results[order][1] for _, order in matched_orders],
+                                                    date_results)
+    mapped_index = {order: i for i, (_, order) in enumerate(matched_orders)}
+    _log_date_results(mapping_plan, date_results, matched_orders, summary, logger)
+
+    # Everything step 6 needs, so the read workbooks are not needed again
+    steps = [(step.target, step.source) for step in mapping_plan.steps]
+    orders = []
+    for row_num, order_number, current_row in shipping_orders:
+        cleaned_order = clean_number(order_number)
+        entry = {"row": row_num, "order": cleaned_order, "match": None}
+        if cleaned_order in lookup_results:
+            entry["current"] = {step.target: current_row[step.target_idx] if step.target_idx < len(current_row)
+                                else None for step in mapping_plan.steps}
+            entry["match"] = {"row": lookup_results[cleaned_order][0],
+                              "file": os.path.basename(order_sources[cleaned_order]),
+                              "values": {step.target: mapped_columns[step.target][mapped_index[cleaned_order]]
+                                         for step in mapping_plan.steps}}
+        orders.append(entry)
+    if journal:
+        _write_journal(journal, logger, lambda counts: journal.checkpoint_loaded(orders, steps, counts), summary)
+    return _process_orders(config, logger, summary, mass_update_file, orders, steps, journal)
+
+def _process_orders(config, logger, summary, mass_update_file, orders, steps, journal):
+    """
+    Computes and saves the cell updates of every order (steps 6-7 of run_sync).
+
+    Args:
+        orders (list): One dict per Mass Update order: its 'row', cleaned
+            'order' and, if it was found, 'current' ({target: current value})
+            and 'match' ({'row', 'file', 'values': {target: mapped value}}).
+        steps (list): The mapping steps as (target, source) pairs.
+
+    Returns:
+        dict: The updated run summary.
+    """
+    # --- 6. Process Each Order (report rows are written as each order is processed) ---
+    pending_updates = {}
+    # Kept for the journal, so a resumed run reports every order too
+    report_rows = []
+    report = _open_report(config, logger)
+    try:
+        for entry in orders:
+            row_num, cleaned_order, match = entry["row"], entry["order"], entry["match"]
+
+            logger.info(f"Processing Order: '{cleaned_order}' from row {row_num}...")
+
+            if match is None:
+                logger.warning(f"  -> Could not find a match for order '{cleaned_order}' in the Load Plan file(s).")
+                _add_report_row(report, report_rows if journal else None, order=cleaned_order,
+                                mass_update_row=row_num, status=STATUS_MISSING,
+                                reason=f"Order not found in Load Plan column '{config['load_plan_search_column']}'.")
+                continue
+
+            logger.info(f"  -> Found matching data in Load Plan '{match['file']}' at row {match['row']}.")
+
+            changes = []
+            empty_sources = []
+            for target, source in steps:
+                update_value = match["values"][target]
+
+                if update_value is None:
+                    logger.warning(f"  -> Source column '{source}' has no value for order '{cleaned_order}'.")
+                    empty_sources.append(source)
+                    continue
+
+                cell_ref = f"{target}{row_num}"
+                current_value = entry["current"][target]
+                if current_value == update_value:
+                    continue
+                logger.info(f"    - Updating cell {cell_ref} with value: '{update_value}'")
+                pending_updates[cell_ref] = update_value
+                changes.append((cell_ref, "" if current_value is None else current_value, update_value))
+
+            reason = f"No value in: {', '.join(empty_sources)}" if empty_sources else ""
+            _add_report_row(report, report_rows if journal else None, order=cleaned_order, mass_update_row=row_num,
+                            status=STATUS_UPDATED if changes else STATUS_UNCHANGED, load_plan_row=match["row"],
+                            changes=changes, reason=reason, load_plan_file=match["file"])
+
+        if journal:
+            _write_journal(journal, logger, lambda counts: journal.complete(pending_updates, counts, report_rows),
+                           summary)
+
+        # --- 7. Save All Updates (locked, coalesced with other runs' pending updates) ---
+        if not _save_updates(config, logger, summary, mass_update_file, pending_updates, report, journal):
+            return summary
+    finally:
+        _close_report(report, summary, logger)
+
+    logger.info("--- Update Process Finished ---")
+    return summary
+
+def _resume_save(config, logger, summary, mass_update_file, resume, journal):
+    """Saves the updates journaled by an interrupted run, replaying its report rows."""
+    logger.info(f"Resuming the sync interrupted on {resume.started_at}: all {resume.counts['orders']} orders "
+                f"were processed, saving their {len(resume.pending_updates)} update(s) without re-reading "
+                f"the workbooks.")
+    summary.update(resume.counts)
+    summary["resumed_orders"] = resume.counts["orders"]
+    report = _open_report(config, logger)
+    try:
+        for row in resume.report_rows:
+            _add_report_row(report, None, **row)
+        if _save_updates(config, logger, summary, mass_update_file, resume.pending_updates, report, journal):
+            logger.info("--- Update Process Finished ---")
+    finally:
+        _close_report(report, summary, logger)
+    return summary
+
+def _write_journal(journal, logger, write, summary):
+    """
+    Writes a checkpoint with `write(counts)`; a checkpoint that cannot be
+    written only costs the resume, so the journal is dropped and the run goes on.
+    """
+    counts = {key: summary[key] for key in JOURNAL_COUNTS if key in summary}
+    try:
+        write(counts)
+    except (OSError, TypeError) as e:
+        logger.warning(f"Could not write the resume journal '{journal.path}': {e}")
+        journal.discard()
+
+def _save_updates(config, logger, summary, mass_update_file, pending_updates, report, journal):
+    """
+    Saves the run's cell updates and deletes the resume journal. Returns False
+    (with the summary marked failed) when the save fails; the journal is then
+    kept, so the next run only has to retry the save.
+    """
+    status, applied = submit_xls_updates(mass_update_file, config["mass_update_sheet"], pending_updates)
+    if status != "Success":
+        if report:
+            report.add_error(f"Saving updates failed: {status}")
+        _fail(summary, logger, f"Failed to save updates to '{mass_update_file}': {status}")
+        return False
+    if journal:
+        journal.discard()
+    summary["cells_written"] = applied
+    summary["workbook_saves"] = 1 if applied else 0
+    logger.info(f"Saved {applied} cell updates to '{mass_update_file}'.")
+    return True
+
+def _add_report_row(report, report_rows, **row):
+    """Writes an order's outcome to the run report and keeps it in `report_rows` (when given) for the journal."""
+    if report:
+        report.add_order(**row)
+    if report_rows is not None:
+        report_rows.append(row)
+
+def _close_report(report, summary, logger):
+    """Closes the run report, if any, and records its path in the summary."""
+    if report:
+        report.close()
+        summary["report_file"] = report.csv_path
+        logger.info(f"Run report written to '{report.csv_path}'"
+                    + (f" and '{report.xlsx_path}'." if report.xlsx_path else "."))
+
+def _find_resume_point(journal, logger):
+    """Returns the journal's resume point, logging a stale journal that was discarded."""
+    if journal is None:
+        return None
+    resume, reason = journal.find_resume_point()
+    if reason:
+        logger.info(f"Discarding the resume journal of an interrupted sync: {reason}.")
+    return resume
+
+def _log_date_results(mapping_plan, date_results, matched_orders, summary, logger):
+    """Logs the inferred text format of each date column and the values that are not dates."""
+    sources = {step.target: step.source for step in mapping_plan.steps}
+    for target, result in date_results.items():
+        if result.text_format:
+            logger.info(f"Column {target} <- '{sources[target]}': text dates read as '{result.text_format}'.")
+        if result.unparsed:
+            examples = ", ".join(f"'{matched_orders[position][1]}'" for position in result.unparsed_positions[:5])
+            logger.warning(f"Column {target} <- '{sources[target]}': {result.unparsed} value(s) could not be read "
+                           f"as dates and are written as they are (orders {examples}"
+                           f"{', ...' if result.unparsed > 5 else ''}).")
+            summary.setdefault("unparsed_dates", {})[target] = result.unparsed
+
+# --------------------------
+# Fan-out
+# --------------------------
+
+# Settings a fan-out target may set; every other setting is shared from the config
+FANOUT_TARGET_KEYS = (
+    "name", "mass_update_file", "mass_update_folder", "mass_update_file_format",
+    "mass_update_sheet", "mass_update_order_column", "column_mappings_file",
+)
+
+@dataclass
+class _FanoutTarget:
+    """One Mass Update layout of a fan-out sync, with what was read for it."""
+    name: str
+    config: dict
+    summary: dict
+    column_mapping: dict = None
+    shipping_orders: list = field(default_factory=list)
+    profile: SheetProfile = None
+
+def run_fanout_sync(config, logger, targets=None, key_index_provider=None):
+    """
+    Updates several Mass Update layouts from a single pass over the Load Plan(s).
+
+    Each target names its own Mass Update file (or folder and file format),
+    sheet, order column header and column mappings file (see
+    FANOUT_TARGET_KEYS); settings a target leaves out come from `config`. The
+    orders of every target are looked up in one Load Plan scan that keeps only
+    the union of the targets' source columns, and each target's mapping is
+    compiled against those columns. A target that cannot be read or mapped
+    fails on its own; the others are still updated, each with its own save.
+
+    Args:
+        config (dict): Settings as returned by load_sync_config.
+        logger (logging.Logger): Logger for progress and warnings.
+        targets (list): Target setting dicts. Defaults to config['fanout_targets'].
+        key_index_provider (callable): Optional Load Plan key index provider, as
+            for run_sync.
+
+    Returns:
+        dict: Run summary with 'status' ('Success' only if every target was
+              updated), the Load Plan files, the orders, matches, misses and
+              cells written over all targets, and 'targets' with a summary per
+              target ('name', 'status', 'mass_update_file', counts).
+    """
+    started = time.perf_counter()
+    # Row scans stop after this many empty rows (see extent_utils)
+    set_empty_row_run(config.get("empty_row_run"))
+    summary = {"status": "Success", "load_plan_file": None, "orders": 0, "matched": 0, "missing": 0,
+               "cells_written": 0, "workbook_opens": 0, "workbook_saves": 0, "targets": []}
+    targets = config.get("fanout_targets") if targets is None else targets
+    if not targets:
+        return _fail(summary, logger, "No fan-out targets are configured ('fanout_targets').")
+
+    # --- 1. Locate the Load Plan(s), Shared by Every Target ---
+    load_plan_file = config.get("load_plan_file") or get_latest_file(
+        config["load_plan_folder"], config["load_plan_file_format"])
+    if not load_plan_file:
+        return _fail(summary, logger, "Could not find the Load Plan file.")
+    load_plan_files = resolve_load_plan_files(config, load_plan_file)
+    summary["load_plan_file"], summary["load_plan_files"] = load_plan_files[0], load_plan_files
+    for file_path in load_plan_files:
+        logger.info(f"Found Load Plan file: {file_path}")
+
+    # --- 2. Read Each Target's Mapping and Orders ---
+    validate = config.get("validation", DEFAULT_VALIDATION_MODE) != "off"
+    fanout = [_prepare_fanout_target(config, position, target, validate, logger)
+              for position, target in enumerate(targets, start=1)]
+    summary["targets"] = [target.summary for target in fanout]
+    ready = [target for target in fanout if target.summary["status"] == "Success" and target.shipping_orders]
+    summary["workbook_opens"] = sum(1 for target in fanout if target.summary["mass_update_file"])
+
+    if ready:
+        # --- 3. Scan the Load Plan(s) Once for the Orders of Every Target ---
+        sources = list(dict.fromkeys(entry["source"] for target in ready for entry in target.column_mapping.values()))
+        date_sources = list(dict.fromkeys(entry["source"] for target in ready for entry in target.column_mapping.values()
+                                          if entry["transform"] == "date"))
+        keys = {clean_number(order_number) for target in ready for _, order_number, _ in target.shipping_orders}
+        logger.info(f"Looking up {len(keys)} orders of {len(ready)} target(s) in one Load Plan pass "
+                    f"({len(sources)} source columns)...")
+        load_plan_profiles = [SheetProfile("Load Plan", config["load_plan_search_column"], sources, date_sources)
+                              for _ in load_plan_files] if validate else None
+        load_started = time.perf_counter()
+        try:
+            headers, lookup_results, order_sources, text_formats = _load_fanout_rows(
+                config, logger, load_plan_files, keys, sources, date_sources, key_index_provider, load_plan_profiles)
+        except _SyncInputError as e:
+            return _fail(summary, logger, str(e))
+        summary["load_seconds"] = time.perf_counter() - load_started
+        summary["workbook_opens"] += 0 if key_index_provider is not None else len(load_plan_files)
+
+        # --- Validate the Inputs Before Anything Is Written ---
+        if validate:
+            profiles = [target.profile for target in ready] + load_plan_profiles
+            issues = check_profiles(profiles, logger)
+            summary["validation"] = [profile.to_dict() for profile in profiles if profile.file_path]
+            if issues:
+                summary["validation_issues"] = issues
+                if config.get("validation") == "strict":
+                    return _fail(summary, logger, f"Input validation found {len(issues)} issue(s); nothing was written.")
+                logger.warning(f"Input validation found {len(issues)} issue(s); continuing ('validation' is 'warn').")
+
+        # --- 4. Route the Projected Rows to Each Target and Save Its Updates ---
+        for target in ready:
+            _sync_fanout_target(target, headers, lookup_results, order_sources, text_formats, logger)
+
+    for key in ("orders", "matched", "missing", "cells_written", "workbook_saves"):
+        summary[key] = sum(target.summary.get(key, 0) for target in fanout)
+    failed = [target.name for target in fanout if target.summary["status"] != "Success"]
+    if failed:
+        _fail(summary, logger, f"{len(failed)} of {len(fanout)} fan-out target(s) failed: {', '.join(failed)}.")
+    summary["input_bytes"] = _input_sizes([target.summary["mass_update_file"] for target in fanout
+                                           if target.summary["mass_update_file"]], load_plan_files)
+    summary["elapsed_seconds"] = time.perf_counter() - started
+    logger.info("--- Fan-out Sync Finished ---")
+
+    if config.get("metrics_file") or config.get("metrics_prometheus_file"):
+        try:
+            record_run_metrics(config, summary, logger)
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Could not record the run metrics: {e}")
+    return summary
+
+def _prepare_fanout_target(config, position, target, validate, logger):
+    """Loads a fan-out target's mapping and reads its Mass Update orders (and current rows)."""
+    unknown = [key for key in target if key not in FANOUT_TARGET_KEYS]
+    target_config = {**config, **target}
+    if target.get("mass_update_folder") and not target.get("mass_update_file"):
+        # The target's own folder wins over an explicit file in the shared config
+        target_config.pop("mass_update_file", None)
+    mass_update_file = target_config.get("mass_update_file") or (
+        target_config.get("mass_update_folder") and target_config.get("mass_update_file_format")
+        and get_latest_file(target_config["mass_update_folder"], target_config["mass_update_file_format"]))
+    name = target.get("name") or (os.path.basename(mass_update_file) if mass_update_file else f"target {position}")
+    summary = {"name": name, "status": "Success", "mass_update_file": None,
+               "orders": 0, "matched": 0, "missing": 0, "cells_written": 0, "workbook_saves": 0}
+    fanout_target = _FanoutTarget(name, target_config, summary)
+
+    if unknown:
+        _fail(summary, logger, f"Fan-out target '{name}': unknown setting(s) {', '.join(unknown)}.")
+        return fanout_target
+    if not mass_update_file:
+        _fail(summary, logger, f"Fan-out target '{name}': could not find its Mass Update file.")
+        return fanout_target
+    mappings_file = target_config["column_mappings_file"]
+    try:
+        fanout_target.column_mapping = load_column_mapping(mappings_file)
+    except FileNotFoundError:
+        _fail(summary, logger, f"Fan-out target '{name}': the mapping file '{mappings_file}' was not found.")
+        return fanout_target
+    except ValueError as e:
+        _fail(summary, logger, f"Fan-out target '{name}': {e}")
+        return fanout_target
+
+    summary["mass_update_file"] = mass_update_file
+    if validate:
+        fanout_target.profile = SheetProfile(f"Mass Update ({name})", target_config["mass_update_order_column"])
+    fanout_target.shipping_orders = get_column_values_with_rows(
+        mass_update_file, target_config["mass_update_sheet"], target_config["mass_update_order_column"],
+        profile=fanout_target.profile)
+    summary["orders"] = len(fanout_target.shipping_orders)
+    if not fanout_target.shipping_orders:
+        logger.warning(f"Fan-out target '{name}': could not find any shipping order numbers in '{mass_update_file}'.")
+    else:
+        logger.info(f"Fan-out target '{name}': found {len(fanout_target.shipping_orders)} shipping orders "
+                    f"in '{mass_update_file}'.")
+    return fanout_target
+
+def _load_fanout_rows(config, logger, load_plan_files, keys, sources, date_sources, key_index_provider, profiles=None):
+    """
+    Looks up the orders of every fan-out target in the Load Plan(s), keeping
+    only the `sources` columns of each matched row. A single Load Plan is
+    scanned once and the scan stops after the last order (unless it is being
+    profiled, or a date column's text format still needs samples); several
+    are indexed and merged as in run_sync.
+
+    Returns:
+        tuple: (headers, lookup_results, order_sources, text_formats) where
+               headers maps each source header found to its index in the
+               projected rows, lookup_results maps order -> (row_number,
+               projected_row_values), order_sources maps order -> the Load Plan
+               file of its row and text_formats maps each of `date_sources` to
+               the text date format inferred from its whole column.
+    """
+    sheet_name, search_column = config["load_plan_sheet"], config["load_plan_search_column"]
+    profiles = profiles or [None] * len(load_plan_files)
+    if len(load_plan_files) == 1 and key_index_provider is None:
+        text_formats = {}
+        headers, lookup_results, _ = find_rows_projected(load_plan_files[0], sheet_name, search_column, keys, sources,
+                                                         profile=profiles[0], date_columns=date_sources,
+                                                         text_formats=text_formats)
+        if "error" in headers:
+            raise _SyncInputError(f"Load Plan lookup failed: {headers['error']}")
+        return headers, lookup_results, dict.fromkeys(lookup_results, load_plan_files[0]), text_formats
+
+    if key_index_provider is not None:
+        merged_index = MergedKeyIndex.from_indexes([
+            (file_path, *key_index_provider(file_path, sheet_name, search_column, profile=profile))
+            for file_path, profile in zip(load_plan_files, profiles)
+        ])
+    else:
+        logger.info(f"Indexing {len(load_plan_files)} Load Plans (newest wins for duplicate orders)...")
+        merged_index = build_merged_key_index(load_plan_files, sheet_name, search_column, profiles=profiles)
+    _check_merged_index(merged_index, logger)
+
+    kept = [name for name in dict.fromkeys(sources) if name in merged_index.headers]
+    source_indexes = [merged_index.headers[name] for name in kept]
+    lookup_results, order_sources = {}, {}
+    for key in keys:
+        match = merged_index.lookup(key)
+        if match is None:
+            continue
+        order_sources[key], row_num, row_values = match
+        lookup_results[key] = (row_num, [row_values[idx] if idx < len(row_values) else None for idx in source_indexes])
+    return ({name: idx for idx, name in enumerate(kept)}, lookup_results, order_sources,
+            _index_text_formats(merged_index, date_sources))
+
+def _sync_fanout_target(target, headers, lookup_results, order_sources, text_formats, logger):
+    """Compiles a target's mapping against the projected headers, builds its cell updates and saves them."""
+    summary = target.summary
+    try:
+        mapping_plan = _compile_plan(target.column_mapping, headers, logger)
+    except _SyncInputError as e:
+        _fail(summary, logger, f"Fan-out target '{target.name}': {e}")
+        return
+    mapping_plan.use_text_formats(text_formats)
+
+    orders = [(row_num, clean_number(order_number), current_row)
+              for row_num, order_number, current_row in target.shipping_orders]
+    matched_orders = [order for order in orders if order[1] in lookup_results]
+    summary["matched"] = len({order for _, order, _ in matched_orders})
+    summary["missing"] = len({order for _, order, _ in orders if order not in lookup_results})
+    if len(set(order_sources.values())) > 1:
+        summary["matched_by_file"] = {}
+        for _, order, _ in matched_orders:
+            file_path = order_sources[order]
+            summary["matched_by_file"][file_path] = summary["matched_by_file"].get(file_path, 0) + 1
+
+    date_results = {}
+    mapped_columns = mapping_plan.transform_columns([lookup_results[order][1] for _, order, _ in matched_orders],
+                                                    date_results)
+    _log_date_results(mapping_plan, date_results, [(row_num, order) for row_num, order, _ in matched_orders],
+                      summary, logger)
+
+    pending_updates = {}
+    for position, (row_num, _, current_row) in enumerate(matched_orders):
+        for step in mapping_plan.steps:
+            update_value = mapped_columns[step.target][position]
+            current_value = current_row[step.target_idx] if step.target_idx < len(current_row) else None
+            if update_value is not None and current_value != update_value:
+                pending_updates[f"{step.target}{row_num}"] = update_value
+
+    mass_update_file = summary["mass_update_file"]
+    status, applied = submit_xls_updates(mass_update_file, target.config["mass_update_sheet"], pending_updates)
+    if status != "Success":
+        _fail(summary, logger, f"Fan-out target '{target.name}': failed to save updates to '{mass_update_file}': {status}")
+        return
+    summary["cells_written"] = applied
+    summary["workbook_saves"] = 1 if applied else 0
+    logger.info(f"Fan-out target '{target.name}': matched {summary['matched']} orders, {summary['missing']} not found; "
+                f"saved {applied} cell updates to '{mass_update_file}'.")
+
+# --------------------------
+# Loading
+# --------------------------
+
+class _SyncInputError(Exception):
+    """Raised by the loaders when a workbook cannot be read or matched."""
+
+def _new_profiles(config, column_mapping, load_plan_files):
+    """
+    Returns the empty SheetProfiles the loaders fill: the Mass Update's first,
+    then one per Load Plan watching the mapped source columns. Returns None
+    when validation is off.
+    """
+    if config.get("validation", DEFAULT_VALIDATION_MODE) == "off":
+        return None
+    sources = [entry["source"] for entry in column_mapping.values()]
+    date_sources = [entry["source"] for entry in column_mapping.values() if entry["transform"] == "date"]
+    return [SheetProfile("Mass Update", config["mass_update_order_column"])] + [
+        SheetProfile("Load Plan", config["load_plan_search_column"], sources, date_sources)
+        for _ in load_plan_files
+    ]
+
+def _load_plan_reads(config, load_plan_files):
+    """Returns how many times the loaders open the Load Plans: a single plan read sequentially is opened twice."""
+    if len(load_plan_files) == 1 and not config.get("concurrent_load"):
+        # Headers first (to fail fast on a bad mapping), then the lookup
+        return 2
+    return len(load_plan_files)
+
+def _compile_plan(column_mapping, load_plan_headers, logger):
+    """Compiles the column mapping against the Load Plan headers and logs each step."""
+    if "error" in load_plan_headers:
+        raise _SyncInputError(f"Could not read the Load Plan header row: {load_plan_headers['error']}")
+    try:
+        mapping_plan = compile_mapping_plan(column_mapping, load_plan_headers)
+    except ValueError as e:
+        raise _SyncInputError(str(e)) from e
+    for step in mapping_plan.steps:
+        logger.info(f"Mapping column {step.target} <- '{step.source}' (transform: {step.transform_name})")
+    return mapping_plan
+
+def _match_orders(shipping_orders, merged_index):
+    """
+    Looks up every order in a MergedKeyIndex.
+
+    Returns:
+        tuple: (lookup_results, missing_orders, order_sources) where lookup_results
+               maps order -> (row_number, row_values) and order_sources maps
+               order -> the Load Plan file the row came from.
+    """
+    lookup_results, missing_orders, order_sources = {}, set(), {}
+    for _, order_number, _ in shipping_orders:
+        order = clean_number(order_number)
+        match = merged_index.lookup(order)
+        if match is None:
+            missing_orders.add(order)
+            continue
+        order_sources[order], row_num, row_values = match
+        lookup_results[order] = (row_num, row_values)
+    return lookup_results, missing_orders, order_sources
+
+def _index_text_formats(merged_index, columns):
+    """Infers the text date format of each column from every row of a MergedKeyIndex."""
+    return {name: infer_date_format(merged_index.iter_column(name)) for name in columns}
+
+def _check_merged_index(merged_index, logger):
+    """Logs Load Plans that could not be read; fails if none could."""
+    for file_path, error in merged_index.errors.items():
+        logger.warning(f"Skipping Load Plan '{file_path}': {error}")
+    if not merged_index.sources:
+        raise _SyncInputError(f"Could not read any Load Plan: {'; '.join(merged_index.errors.values())}")
+
+def _load_inputs(config, logger, mass_update_file, load_plan_files, column_mapping, profiles=None):
+    """
+    Reads the workbooks one after the other. With a single Load Plan its headers
+    are checked before anything else is read, so a misconfigured mapping fails
+    fast; several Load Plans are indexed together and merged first.
+
+    Returns:
+        tuple: (mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles)
+    """
+    mass_update_profile, *load_plan_profiles = profiles or [None] * (1 + len(load_plan_files))
+    merged_index = None
+    if len(load_plan_files) > 1:
+        logger.info(f"Indexing {len(load_plan_files)} Load Plans (newest wins for duplicate orders)...")
+        merged_index = build_merged_key_index(load_plan_files, config["load_plan_sheet"], config["load_plan_search_column"],
+                                              profiles=load_plan_profiles)
+        _check_merged_index(merged_index, logger)
+        load_plan_headers = merged_index.headers
+    else:
+        # --- 3. Compile the Column Mapping Against the Load Plan Headers ---
+        _, load_plan_headers = get_sheet_headers(load_plan_files[0], config["load_plan_sheet"], config["load_plan_search_column"])
+    mapping_plan = _compile_plan(column_mapping, load_plan_headers, logger)
+
+    # --- 4. Extract Shipping Orders from Mass Update File ---
+    # The full rows are kept so current cell values can be compared without re-reading the file
+    order_column = config["mass_update_order_column"]
+    logger.info(f"Extracting shipping orders from '{order_column}' column...")
+    shipping_orders = get_column_values_with_rows(mass_update_file, config["mass_update_sheet"], order_column,
+                                                  profile=mass_update_profile)
+    profiles = profiles and [mass_update_profile] + load_plan_profiles
+    if not shipping_orders:
+        return mapping_plan, [], {}, set(), {}, profiles
+    logger.info(f"Found {len(shipping_orders)} shipping orders to process.")
+
+    # --- 5. Look Up All Orders in the Load Plan (single pass) ---
+    logger.info("--- Starting Update Process ---")
+    if merged_index is not None:
+        lookup_results, missing_orders, order_sources = _match_orders(shipping_orders, merged_index)
+        mapping_plan.use_text_formats(_index_text_formats(merged_index, mapping_plan.date_sources))
+        return mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles
+
+    text_formats = {}
+    lookup_results, missing_orders = find_rows(
+        load_plan_files[0],
+        config["load_plan_sheet"],
+        config["load_plan_search_column"],
+        [clean_number(order_number) for _, order_number, _ in shipping_orders],
+        profile=load_plan_profiles[0],
+        date_columns=mapping_plan.date_sources,
+        text_formats=text_formats,
+    )
+    if "error" in lookup_results:
+        raise _SyncInputError(f"Load Plan lookup failed: {lookup_results['error']}")
+    # Text dates are read with the format of the whole Load Plan column, not just of the matched rows
+    mapping_plan.use_text_formats(text_formats)
+    order_sources = dict.fromkeys(lookup_results, load_plan_files[0])
+    return mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles
+
+async def _load_inputs_concurrently(config, logger, mass_update_file, load_plan_files, column_mapping, profiles=None):
+    """
+    Reads the Mass Update orders and indexes every Load Plan by order number at
+    the same time, then merges the Load Plan indexes (newest wins) and matches
+    the orders against them. Wall time is roughly that of the slowest workbook
+    instead of the sum of all of them.
+
+    Returns:
+        tuple: (mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles)
+    """
+    executor_name = config.get("load_executor", "process")
+    if executor_name not in LOAD_EXECUTORS:
+        raise _SyncInputError(f"Unknown load_executor '{executor_name}'. Use one of: {', '.join(LOAD_EXECUTORS)}.")
+
+    loop = asyncio.get_running_loop()
+    logger.info(f"Reading the Mass Update and {len(load_plan_files)} Load Plan workbook(s) concurrently "
+                f"({executor_name} executor)...")
+    mass_update_profile, *load_plan_profiles = profiles or [None] * (1 + len(load_plan_files))
+    # Each loader returns its filled profile too, since it may run in another
+    # process, and a report of that process's memory and Excel backends
+    with LOAD_EXECUTORS[executor_name](max_workers=1 + len(load_plan_files), initializer=set_empty_row_run,
+                                       initargs=(extent_utils.EMPTY_ROW_RUN,)) as executor:
+        outcomes = await asyncio.gather(
+            loop.run_in_executor(executor, call_in_worker, call_with_profile, get_column_values_with_rows,
+                                 mass_update_profile, mass_update_file, config["mass_update_sheet"],
+                                 config["mass_update_order_column"]),
+            *(loop.run_in_executor(executor, call_in_worker, call_with_profile, index_rows_by_key, profile,
+                                   file_path, config["load_plan_sheet"], config["load_plan_search_column"])
+              for file_path, profile in zip(load_plan_files, load_plan_profiles)),
+        )
+    record_worker_reports([report for _, report in outcomes])
+    (shipping_orders, mass_update_profile), *indexed = [result for result, _ in outcomes]
+
+    load_plan_indexes = [index for index, _ in indexed]
+    profiles = profiles and [mass_update_profile] + [profile for _, profile in indexed]
+    return _match_against_indexes(config, logger, shipping_orders, load_plan_files, load_plan_indexes,
+                                  column_mapping) + (profiles,)
+
+def _load_inputs_with_provider(config, logger, mass_update_file, load_plan_files, column_mapping, key_index_provider,
+                               profiles=None):
+    """
+    Gets each Load Plan's key index from `key_index_provider` (typically a cache)
+    and reads the Mass Update orders, which change from run to run.
+
+    Returns:
+        tuple: (mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources, profiles)
+    """
+    mass_update_profile, *load_plan_profiles = profiles or [None] * (1 + len(load_plan_files))
+    load_plan_indexes = [
+        key_index_provider(file_path, config["load_plan_sheet"], config["load_plan_search_column"], profile=profile)
+        for file_path, profile in zip(load_plan_files, load_plan_profiles)
+    ]
+    shipping_orders = get_column_values_with_rows(
+        mass_update_file, config["mass_update_sheet"], config["mass_update_order_column"], profile=mass_update_profile)
+    return _match_against_indexes(config, logger, shipping_orders, load_plan_files, load_plan_indexes,
+                                  column_mapping) + (profiles,)
+
+def _match_against_indexes(config, logger, shipping_orders, load_plan_files, load_plan_indexes, column_mapping):
+    """
+    Merges per-file Load Plan key indexes (newest wins), compiles the mapping
+    against their headers and matches every order.
+
+    Returns:
+        tuple: (mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources)
+    """
+    merged_index = MergedKeyIndex.from_indexes(
+        [(file_path, headers, rows_by_key) for file_path, (headers, rows_by_key) in zip(load_plan_files, load_plan_indexes)]
+    )
+    if len(load_plan_files) > 1:
+        _check_merged_index(merged_index, logger)
+        load_plan_headers = merged_index.headers
+    else:
+        load_plan_headers = load_plan_indexes[0][0]
+    mapping_plan = _compile_plan(column_mapping, load_plan_headers, logger)
+    if not shipping_orders:
+        return mapping_plan, [], {}, set(), {}
+    logger.info(f"Found {len(shipping_orders)} shipping orders and {len(merged_index)} Load Plan keys.")
+
+    logger.info("--- Starting Update Process ---")
+    lookup_results, missing_orders, order_sources = _match_orders(shipping_orders, merged_index)
+    mapping_plan.use_text_formats(_index_text_formats(merged_index, mapping_plan.date_sources))
+    return mapping_plan, shipping_orders, lookup_results, missing_orders, order_sources
+
+# --------------------------
+# Reporting
+# --------------------------
+
+def _open_report(config, logger):
+    """Starts the run report configured by 'report_folder' / 'report_xlsx', or returns None."""
+    if not config.get("report_folder"):
+        return None
+    try:
+        return SyncReport(config["report_folder"], write_xlsx=bool(config.get("report_xlsx")))
+    except Exception as e:
+        logger.warning(f"Could not create the run report: {e}")
+        return None
+
+def _fail(summary, logger, message):
+    """Logs an error and marks the run summary as failed."""
+    logger.error(f"Error: {message}")
+    summary["status"] = f"Failed: {message}"
+    return summary
@@ -0,0 +1,68 @@
+"""
+test_date_utils.py - Date format inference and column normalization
+"""
+
+import unittest
+from datetime import date, datetime
+
+from date_utils import (
+    DateTextSample, format_date_value, infer_date_format, normalize_date_column, DATE_SAMPLE_SIZE,
+)
+
+class InferDateFormatTest(unittest.TestCase):
+
+    def test_month_first_wins_a_tie(self):
+        self.assertEqual(infer_date_format(["05/06/2025", "01/02/2025"]), "%m/%d/%Y")
+
+    def test_one_day_above_twelve_makes_the_column_day_first(self):
+        self.assertEqual(infer_date_format(["05/06/2025", "16/06/2025"]), "%d/%m/%Y")
+
+    def test_month_names(self):
+        self.assertEqual(infer_date_format(["16-Jun-25", "1-Sept-25"]), "%d-%b-%y")
+
+    def test_non_text_values_are_ignored(self):
+        self.assertEqual(infer_date_format([None, 45000, datetime(2025, 1, 1), " 2025-06-16 "]), "%Y-%m-%d")
+
+    def test_no_date_text(self):
+        self.assertIsNone(infer_date_format(["TBC", "n/a"]))
+
+    def test_sample_collects_distinct_texts_up_to_the_limit(self):
+        sample = DateTextSample()
+        for day in range(1, 29):
+            for month in range(1, 13):
+                sample.add(f"{month:02d}/{day:02d}/2025")
+        sample.add("16/06/2025")
+        self.assertTrue(sample.full)
+        self.assertEqual(len(sample.texts), DATE_SAMPLE_SIZE)
+        # Only the first DATE_SAMPLE_SIZE texts count, all month-first
+        self.assertEqual(sample.text_format, "%m/%d/%Y")
+
+class NormalizeDateColumnTest(unittest.TestCase):
+
+    def test_mixed_column(self):
+        result = normalize_date_column([datetime(2025, 6, 16, 8, 30), date(2025, 6, 17), 45826, "16/06/2025", None, " ", "TBC"])
+        self.assertEqual(result.values, ["06/16/2025", "06/17/2025", "06/18/2025", "06/16/2025", None, " ", "TBC"])
+        self.assertEqual(result.text_format, "%d/%m/%Y")
+        self.assertEqual((result.converted, result.unparsed, result.unparsed_positions), (4, 1, [6]))
+
+    def test_text_format_of_the_whole_column_is_used(self):
+        # Alone, "05/06/2025" would be read month-first
+        column = normalize_date_column(["05/06/2025", "16/06/2025"])
+        self.assertEqual(column.values[0], "06/05/2025")
+        self.assertEqual(normalize_date_column(["05/06/2025"], text_format="%d/%m/%Y").values, ["06/05/2025"])
+
+    def test_bools_are_not_serials(self):
+        result = normalize_date_column([True, 1])
+        self.assertEqual(result.values, [True, "12/31/1899"])
+        self.assertEqual(result.unparsed, 1)
+
+    def test_output_format(self):
+        self.assertEqual(normalize_date_column([datetime(2025, 6, 16)], output_format="%Y-%m-%d").values, ["2025-06-16"])
+
+    def test_format_date_value(self):
+        self.assertEqual(format_date_value("16-Jun-25"), "06/16/2025")
+        self.assertEqual(format_date_value("TBC"), "TBC")
+        self.assertEqual(format_date_value(12345678901234), 12345678901234)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+test_extent_utils.py - The empty-row cut-off and the extent cache
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import extent_utils
+from extent_utils import iter_bounded_rows, scan_extent, set_empty_row_run, clear_extent_cache, get_cached_extent
+from logger_utils import LOGGER_NAME
+
+def make_rows(data_rows, last_row):
+    """Returns (row_number, row_values) for rows 1..last_row; the rows in `data_rows` hold a value."""
+    return [(row_num, [f"r{row_num}"] if row_num in data_rows else [None, ""]) for row_num in range(1, last_row + 1)]
+
+class BoundedRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        clear_extent_cache()
+
+    def test_stops_after_the_empty_row_run(self):
+        rows = make_rows({1, 2, 3}, 100)
+        with self.assertNoLogs(LOGGER_NAME, logging.WARNING):
+            seen = [row_num for row_num, _ in iter_bounded_rows(iter(rows), empty_row_run=5)]
+        self.assertEqual(seen, list(range(1, 9)))
+
+    def test_data_below_the_gap_is_logged(self):
+        rows = make_rows({1, 2, 8}, 20)
+        with self.assertLogs(LOGGER_NAME, logging.WARNING) as logs:
+            seen = [row_num for row_num, _ in iter_bounded_rows(iter(rows), empty_row_run=5)]
+        self.assertEqual(seen[-1], 7)
+        self.assertIn("row 8 holds data", logs.output[0])
+
+    def test_cut_off_before_the_declared_end_is_logged(self):
+        rows = make_rows({1}, 50)
+        with self.assertLogs(LOGGER_NAME, logging.WARNING) as logs:
+            list(iter_bounded_rows(iter(rows), max_row=50, empty_row_run=5))
+        self.assertIn("declares rows up to 50", logs.output[0])
+
+    def test_declared_end_is_an_upper_bound(self):
+        rows = make_rows({1, 2, 3, 4}, 10)
+        self.assertEqual([row_num for row_num, _ in iter_bounded_rows(iter(rows), max_row=3)], [1, 2, 3])
+
+    def test_missing_rows_count_as_empty(self):
+        rows = [(1, ["a"]), (2, ["b"]), (500, ["far"])]
+        with self.assertLogs(LOGGER_NAME, logging.WARNING):
+            seen = [row_num for row_num, _ in iter_bounded_rows(iter(rows), empty_row_run=100)]
+        self.assertEqual(seen, [1, 2])
+
+    def test_set_empty_row_run(self):
+        run = extent_utils.EMPTY_ROW_RUN
+        try:
+            set_empty_row_run(3)
+            self.assertEqual(len(list(iter_bounded_rows(iter(make_rows({1}, 20))))), 4)
+            set_empty_row_run(None)
+            self.assertEqual(extent_utils.EMPTY_ROW_RUN, 3)
+        finally:
+            set_empty_row_run(run)
+
+class ExtentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        clear_extent_cache()
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xlsx")
+        with open(self.path, "wb") as f:
+            f.write(b"stand-in for a workbook")
+
+    def tearDown(self):
+        clear_extent_cache()
+        shutil.rmtree(self.folder)
+
+    def test_extent_of_a_finished_scan_is_cached(self):
+        extent = scan_extent(iter(make_rows({1, 2, 7}, 12)), self.path, "Sheet")
+        self.assertEqual((extent.last_row, extent.last_col), (7, 1))
+        # The next scan stops at the last data row
+        seen = [row_num for row_num, _ in iter_bounded_rows(iter(make_rows({1, 2, 7}, 12)), self.path, "Sheet")]
+        self.assertEqual(seen, list(range(1, 8)))
+
+    def test_cache_is_dropped_when_the_file_changes(self):
+        scan_extent(iter(make_rows({1}, 3)), self.path, "Sheet")
+        with open(self.path, "ab") as f:
+            f.write(b" grown")
+        self.assertIsNone(get_cached_extent(self.path, "Sheet"))
+
+    def test_cut_off_extent_is_not_used_for_a_longer_run(self):
+        with self.assertLogs(LOGGER_NAME, logging.WARNING):
+            scan_extent(iter(make_rows({1, 7}, 12)), self.path, "Sheet", empty_row_run=5)
+        self.assertIsNotNone(get_cached_extent(self.path, "Sheet", empty_row_run=5))
+        self.assertIsNone(get_cached_extent(self.path, "Sheet", empty_row_run=50))
+        self.assertEqual(scan_extent(iter(make_rows({1, 7}, 12)), self.path, "Sheet", empty_row_run=50).last_row, 7)
+
+if __name__ == "__main__":
+    unittest.main()
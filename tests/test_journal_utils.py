@@ -0,0 +1,224 @@
+"""
+test_journal_utils.py - The resume journal and resumed syncs
+
+SyncJournal is tested on its own, then run_sync is interrupted at each
+checkpoint on workbooks made by soak_test.generate_workbooks and resumed. A
+resumed run must not read either workbook and must leave the Mass Update as
+an uninterrupted run does.
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+import xlrd
+
+import sync_utils
+from journal_utils import SyncJournal, STAGE_LOADED, STAGE_COMPUTED
+from soak_test import generate_workbooks, COLUMN_MAPPING, MASS_UPDATE_SHEET, LOAD_PLAN_SHEET, ORDER_COLUMN, SEARCH_COLUMN
+
+ROWS = 20
+
+def sheet_values(path):
+    sheet = xlrd.open_workbook(path).sheet_by_name(MASS_UPDATE_SHEET)
+    return [sheet.row_values(row_idx) for row_idx in range(sheet.nrows)]
+
+class SyncJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.mass_update = os.path.join(self.folder, "mass_update.xls")
+        self.load_plan = os.path.join(self.folder, "load_plan.xlsx")
+        for path in (self.mass_update, self.load_plan):
+            with open(path, "wb") as f:
+                f.write(b"stand-in for a workbook")
+        self.journal_folder = os.path.join(self.folder, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def new_journal(self, settings=None):
+        return SyncJournal(self.journal_folder, self.mass_update, [self.load_plan], settings or {"sheet": "Mass Update"})
+
+    def test_nothing_to_resume(self):
+        self.assertEqual(self.new_journal().find_resume_point(), (None, None))
+
+    def test_loaded_checkpoint_round_trip(self):
+        journal = self.new_journal()
+        journal.start()
+        orders = [{"row": 4, "order": 450000000001, "match": None},
+                  {"row": 5, "order": "A-2", "current": {"J": None},
+                   "match": {"row": 3, "file": "load_plan.xlsx", "values": {"J": datetime(2025, 6, 16, 8, 30)}}}]
+        journal.checkpoint_loaded(orders, [("J", "ETD")], {"orders": 2, "matched": 1})
+        resume, reason = self.new_journal().find_resume_point()
+        self.assertIsNone(reason)
+        self.assertEqual(resume.stage, STAGE_LOADED)
+        self.assertEqual(resume.orders, orders)
+        self.assertEqual(resume.steps, [["J", "ETD"]])
+        self.assertEqual(resume.counts, {"orders": 2, "matched": 1})
+
+    def test_computed_checkpoint_keeps_value_types(self):
+        journal = self.new_journal()
+        journal.start()
+        updates = {"J4": datetime(2025, 1, 2, 3, 4), "Q4": date(2025, 1, 2), "R4": time(13, 30),
+                   "S4": timedelta(days=1.5), "U4": "06/16/2025", "V4": 3, "W4": 2.5}
+        journal.complete(updates, {"orders": 1}, [{"order": 1, "changes": [("J4", "", "x")]}])
+        resume, _ = self.new_journal().find_resume_point()
+        self.assertEqual(resume.stage, STAGE_COMPUTED)
+        self.assertEqual(resume.pending_updates, updates)
+        for cell_ref, value in updates.items():
+            self.assertIs(type(resume.pending_updates[cell_ref]), type(value))
+        self.assertEqual(resume.report_rows, [{"order": 1, "changes": [["J4", "", "x"]]}])
+
+    def test_changed_input_discards_the_journal(self):
+        journal = self.new_journal()
+        journal.start()
+        journal.complete({"J4": 1}, {"orders": 1})
+        with open(self.mass_update, "ab") as f:
+            f.write(b" edited")
+        self.assertEqual(self.new_journal().find_resume_point(), (None, "the Mass Update changed"))
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_changed_settings_discard_the_journal(self):
+        journal = self.new_journal()
+        journal.start()
+        journal.complete({"J4": 1}, {"orders": 1})
+        resume, reason = self.new_journal({"sheet": "Other"}).find_resume_point()
+        self.assertIsNone(resume)
+        self.assertEqual(reason, "the settings or column mappings changed")
+
+    def test_unreadable_journal_is_discarded(self):
+        journal = self.new_journal()
+        os.makedirs(self.journal_folder)
+        with open(journal.path, "w") as f:
+            f.write("{not json")
+        resume, reason = journal.find_resume_point()
+        self.assertIsNone(resume)
+        self.assertTrue(reason.startswith("the journal could not be read"))
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_value_without_json_form_writes_nothing(self):
+        journal = self.new_journal()
+        journal.start()
+        with self.assertRaises(TypeError):
+            journal.complete({"J4": object()}, {})
+        self.assertEqual(os.listdir(self.journal_folder) if os.path.isdir(self.journal_folder) else [], [])
+
+class ResumedSyncTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.template = tempfile.mkdtemp()
+        cls.mass_update, cls.load_plan = generate_workbooks(cls.template, ROWS)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.template)
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.logger = logging.getLogger("JournalTest")
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def make_config(self, name, column_mapping=COLUMN_MAPPING):
+        """Copies the workbooks into their own folder and returns a sync config for them."""
+        folder = os.path.join(self.folder, name)
+        os.makedirs(folder)
+        mapping_file = os.path.join(folder, "column_mappings.json")
+        with open(mapping_file, "w") as f:
+            json.dump(column_mapping, f)
+        return {
+            "mass_update_file": shutil.copy(self.mass_update, folder),
+            "mass_update_sheet": MASS_UPDATE_SHEET,
+            "mass_update_order_column": ORDER_COLUMN,
+            "load_plan_file": shutil.copy(self.load_plan, folder),
+            "load_plan_sheet": LOAD_PLAN_SHEET,
+            "load_plan_search_column": SEARCH_COLUMN,
+            "column_mappings_file": mapping_file,
+            "concurrent_load": False,
+            "journal_folder": os.path.join(folder, "journal"),
+        }
+
+    def journal_stage(self, config):
+        paths = [os.path.join(config["journal_folder"], name) for name in os.listdir(config["journal_folder"])]
+        self.assertEqual(len(paths), 1)
+        with open(paths[0]) as f:
+            return json.load(f)["stage"]
+
+    def resume_without_reading(self, config):
+        """Runs the sync with every workbook reader replaced by one that fails the test."""
+        unread = mock.Mock(side_effect=AssertionError("a resumed run read a workbook"))
+        with mock.patch.multiple(sync_utils, get_column_values_with_rows=unread, find_rows=unread,
+                                 get_sheet_headers=unread, index_rows_by_key=unread):
+            return sync_utils.run_sync(config, self.logger)
+
+    def test_crash_while_processing_orders_resumes_from_the_loaded_checkpoint(self):
+        expected = self.make_config("expected")
+        self.assertEqual(sync_utils.run_sync(expected, self.logger)["status"], "Success")
+
+        config = self.make_config("resumed")
+        add_report_row = sync_utils._add_report_row
+        calls = []
+
+        def crash_on_third_order(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError("injected crash")
+            return add_report_row(*args, **kwargs)
+
+        with mock.patch.object(sync_utils, "_add_report_row", crash_on_third_order):
+            with self.assertRaises(RuntimeError):
+                sync_utils.run_sync(config, self.logger)
+        self.assertEqual(self.journal_stage(config), STAGE_LOADED)
+
+        summary = self.resume_without_reading(config)
+        self.assertEqual(summary["status"], "Success")
+        self.assertEqual(summary["resumed_orders"], summary["orders"])
+        self.assertGreater(summary["cells_written"], 0)
+        self.assertEqual(sheet_values(config["mass_update_file"]), sheet_values(expected["mass_update_file"]))
+        self.assertEqual(os.listdir(config["journal_folder"]), [])
+
+    def test_failed_save_resumes_from_the_computed_checkpoint(self):
+        expected = self.make_config("expected")
+        sync_utils.run_sync(expected, self.logger)
+
+        config = self.make_config("resumed")
+        with mock.patch.object(sync_utils, "submit_xls_updates", return_value=("Failed: locked", 0)):
+            self.assertTrue(sync_utils.run_sync(config, self.logger)["status"].startswith("Failed: "))
+        self.assertEqual(self.journal_stage(config), STAGE_COMPUTED)
+
+        summary = self.resume_without_reading(config)
+        self.assertEqual(summary["status"], "Success")
+        self.assertEqual(sheet_values(config["mass_update_file"]), sheet_values(expected["mass_update_file"]))
+
+    def test_changed_mass_update_starts_over(self):
+        config = self.make_config("changed")
+        with mock.patch.object(sync_utils, "submit_xls_updates", return_value=("Failed: locked", 0)):
+            sync_utils.run_sync(config, self.logger)
+        with open(config["mass_update_file"], "ab") as f:
+            f.write(b"\0")
+        summary = sync_utils.run_sync(config, self.logger)
+        self.assertEqual(summary["status"], "Success")
+        self.assertIsNone(summary.get("resumed_orders"))
+
+    def test_raw_datetimes_are_saved(self):
+        mapping = {"J": {"source": COLUMN_MAPPING["J"], "transform": "raw"}}
+        config = self.make_config("raw", mapping)
+        summary = sync_utils.run_sync(config, self.logger)
+        self.assertEqual(summary["status"], "Success")
+        self.assertGreater(summary["cells_written"], 0)
+        sheet = xlrd.open_workbook(config["mass_update_file"]).sheet_by_name(MASS_UPDATE_SHEET)
+        # The first order's row (see generate_workbooks)
+        self.assertEqual(xlrd.xldate_as_datetime(sheet.cell_value(3, 9), 0), datetime(2025, 6, 1))
+
+if __name__ == "__main__":
+    unittest.main()
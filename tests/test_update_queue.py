@@ -0,0 +1,92 @@
+"""
+test_update_queue.py - The locked .xls update queue
+
+Updates are queued and flushed into a workbook made with xlwt and read back
+with xlrd. Failed saves are simulated by replacing the queue's writer.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+import xlrd
+import xlwt
+
+import update_queue
+from update_queue import (
+    enqueue_xls_updates, flush_xls_updates, submit_xls_updates, _read_queue_file,
+    QUEUE_SUFFIX, PROCESSING_SUFFIX, DEAD_LETTER_SUFFIX, MAX_FLUSH_ATTEMPTS,
+)
+
+SHEET = "Mass Update"
+
+def make_xls(path):
+    book = xlwt.Workbook()
+    book.add_sheet(SHEET).write(0, 0, "Order")
+    book.save(path)
+
+def read_value(path, row_idx, col_idx):
+    return xlrd.open_workbook(path).sheet_by_name(SHEET).cell_value(row_idx, col_idx)
+
+class UpdateQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xls")
+        make_xls(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_datetimes_are_saved_through_the_queue(self):
+        status, applied = submit_xls_updates(self.path, SHEET, {"B2": datetime(2025, 1, 2, 3, 4), "C2": date(2025, 6, 16)})
+        self.assertEqual((status, applied), ("Success", 2))
+        self.assertEqual(xlrd.xldate_as_datetime(read_value(self.path, 1, 1), 0), datetime(2025, 1, 2, 3, 4))
+        self.assertEqual(xlrd.xldate_as_datetime(read_value(self.path, 1, 2), 0), datetime(2025, 6, 16))
+
+    def test_queued_values_keep_their_type(self):
+        values = {"A2": datetime(2025, 1, 2, 3, 4), "B2": date(2025, 1, 2), "C2": time(13, 30),
+                  "D2": timedelta(hours=5), "E2": "text", "F2": 1.5, "G2": None}
+        self.assertEqual(enqueue_xls_updates(self.path, SHEET, values), "Success")
+        queued = {entry["cell"]: entry["value"] for entry in _read_queue_file(self.path + QUEUE_SUFFIX)}
+        self.assertEqual(queued, values)
+        for cell_ref, value in values.items():
+            self.assertIs(type(queued[cell_ref]), type(value))
+
+    def test_latest_update_to_a_cell_wins(self):
+        enqueue_xls_updates(self.path, SHEET, {"B2": "first", "C2": "kept"})
+        enqueue_xls_updates(self.path, SHEET, {"B2": "second"})
+        self.assertEqual(flush_xls_updates(self.path), ("Success", 2))
+        self.assertEqual(read_value(self.path, 1, 1), "second")
+        self.assertEqual(read_value(self.path, 1, 2), "kept")
+        self.assertFalse(os.path.exists(self.path + QUEUE_SUFFIX))
+        self.assertFalse(os.path.exists(self.path + PROCESSING_SUFFIX))
+
+    def test_empty_queue_flushes_nothing(self):
+        self.assertEqual(flush_xls_updates(self.path), ("Success", 0))
+
+    def test_failed_save_requeues_the_updates(self):
+        with mock.patch.object(update_queue, "update_xls_cells", return_value="Failed: locked"):
+            status, applied = submit_xls_updates(self.path, SHEET, {"B2": datetime(2025, 1, 2)})
+        self.assertEqual((status, applied), ("Failed: locked", 0))
+        queued = _read_queue_file(self.path + QUEUE_SUFFIX)
+        self.assertEqual([(entry["value"], entry["attempts"]) for entry in queued], [(datetime(2025, 1, 2), 1)])
+        self.assertEqual(flush_xls_updates(self.path), ("Success", 1))
+
+    def test_updates_go_to_the_dead_letter_file_after_the_last_attempt(self):
+        enqueue_xls_updates(self.path, SHEET, {"B2": datetime(2025, 1, 2)})
+        with mock.patch.object(update_queue, "update_xls_cells", return_value="Failed: locked"):
+            for _ in range(MAX_FLUSH_ATTEMPTS):
+                self.assertEqual(flush_xls_updates(self.path), ("Failed: locked", 0))
+        self.assertEqual(_read_queue_file(self.path + QUEUE_SUFFIX), [])
+        dead = _read_queue_file(self.path + DEAD_LETTER_SUFFIX)
+        self.assertEqual([(entry["cell"], entry["value"], entry["error"]) for entry in dead],
+                         [("B2", datetime(2025, 1, 2), "Failed: locked")])
+        # Nothing is left to flush, so later updates are not blocked
+        self.assertEqual(submit_xls_updates(self.path, SHEET, {"C2": "next"}), ("Success", 1))
+
+if __name__ == "__main__":
+    unittest.main()
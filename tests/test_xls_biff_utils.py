@@ -0,0 +1,130 @@
+"""
+test_xls_biff_utils.py - Round trips through the .xls record patcher
+
+Each test writes values with patch_xls_cells (or update_xls_cells, which
+picks the save engine) into a workbook made with xlwt and reads them back
+with xlrd.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+import xlrd
+import xlwt
+
+import excel_legacy_utils
+from excel_legacy_utils import update_xls_cells
+from xls_biff_utils import patch_xls_cells, XlsPatchUnsupported
+
+SHEET = "Mass Update"
+
+def make_xls(path):
+    """Writes a small workbook: a text header, a bold cell, a date-formatted cell and a number."""
+    book = xlwt.Workbook()
+    sheet = book.add_sheet(SHEET)
+    book.add_sheet("Other").write(0, 0, "untouched")
+    sheet.write(0, 0, "Order")
+    sheet.write(0, 1, "Header", xlwt.easyxf("font: bold on"))
+    sheet.write(1, 0, "450000000001")
+    sheet.write(1, 1, datetime(2025, 6, 1), xlwt.easyxf(num_format_str="DD/MM/YYYY"))
+    sheet.write(2, 0, 12.5)
+    book.save(path)
+
+def read_cell(path, cell_ref, sheet_name=SHEET):
+    """Returns (ctype, value, xf_index) of a cell, or None if it is outside the sheet."""
+    book = xlrd.open_workbook(path, formatting_info=True)
+    sheet = book.sheet_by_name(sheet_name)
+    row_idx, col_idx = int(cell_ref[1:]) - 1, ord(cell_ref[0]) - ord("A")
+    if row_idx >= sheet.nrows or col_idx >= sheet.row_len(row_idx):
+        return None
+    cell = sheet.cell(row_idx, col_idx)
+    return cell.ctype, cell.value, cell.xf_index
+
+class PatchXlsCellsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xls")
+        make_xls(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_values_read_back_with_their_type(self):
+        patch_xls_cells(self.path, SHEET, {"A2": "text", "B3": 42, "C3": 1.25, "D3": True, "A3": None})
+        self.assertEqual(read_cell(self.path, "A2")[:2], (xlrd.XL_CELL_TEXT, "text"))
+        self.assertEqual(read_cell(self.path, "B3")[:2], (xlrd.XL_CELL_NUMBER, 42.0))
+        self.assertEqual(read_cell(self.path, "C3")[:2], (xlrd.XL_CELL_NUMBER, 1.25))
+        self.assertEqual(read_cell(self.path, "D3")[:2], (xlrd.XL_CELL_BOOLEAN, 1))
+        self.assertEqual(read_cell(self.path, "A3")[0], xlrd.XL_CELL_BLANK)
+
+    def test_date_keeps_the_date_format_of_the_cell(self):
+        before = read_cell(self.path, "B2")
+        patch_xls_cells(self.path, SHEET, {"B2": date(2025, 12, 31)})
+        ctype, value, xf_index = read_cell(self.path, "B2")
+        self.assertEqual(ctype, xlrd.XL_CELL_DATE)
+        self.assertEqual(xlrd.xldate_as_datetime(value, 0), datetime(2025, 12, 31))
+        self.assertEqual(xf_index, before[2])
+
+    def test_overwritten_cell_keeps_its_formatting(self):
+        before = read_cell(self.path, "B1")
+        patch_xls_cells(self.path, SHEET, {"B1": "Renamed"})
+        self.assertEqual(read_cell(self.path, "B1"), (xlrd.XL_CELL_TEXT, "Renamed", before[2]))
+
+    def test_new_rows_and_columns_are_added(self):
+        patch_xls_cells(self.path, SHEET, {"E40": "far", "C2": 7})
+        self.assertEqual(read_cell(self.path, "E40")[:2], (xlrd.XL_CELL_TEXT, "far"))
+        self.assertEqual(read_cell(self.path, "C2")[:2], (xlrd.XL_CELL_NUMBER, 7.0))
+        # Existing cells of the edited rows are kept
+        self.assertEqual(read_cell(self.path, "A2")[:2], (xlrd.XL_CELL_TEXT, "450000000001"))
+
+    def test_other_sheets_are_untouched(self):
+        patch_xls_cells(self.path, SHEET, {"A1": "changed"})
+        self.assertEqual(read_cell(self.path, "A1", "Other")[:2], (xlrd.XL_CELL_TEXT, "untouched"))
+
+    def test_unknown_sheet_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            patch_xls_cells(self.path, "Missing", {"A1": 1})
+
+    def test_long_string_is_unsupported(self):
+        with self.assertRaises(XlsPatchUnsupported):
+            patch_xls_cells(self.path, SHEET, {"A1": "x" * 300})
+
+class UpdateXlsCellsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xls")
+        make_xls(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_falls_back_to_xlutils_when_the_patch_is_unsupported(self):
+        self.assertEqual(update_xls_cells(self.path, SHEET, {"A1": "x" * 300, "B3": datetime(2025, 1, 2)}), "Success")
+        self.assertEqual(read_cell(self.path, "A1")[:2], (xlrd.XL_CELL_TEXT, "x" * 300))
+        self.assertEqual(xlrd.xldate_as_datetime(read_cell(self.path, "B3")[1], 0), datetime(2025, 1, 2))
+
+    def test_both_engines_write_the_same_values(self):
+        updates = {"A2": "text", "B2": datetime(2025, 3, 4, 5, 6), "C4": 3}
+        other = os.path.join(self.folder, "other.xls")
+        shutil.copy(self.path, other)
+        self.assertEqual(update_xls_cells(self.path, SHEET, updates), "Success")
+        engine = excel_legacy_utils.XLS_SAVE_ENGINE
+        excel_legacy_utils.XLS_SAVE_ENGINE = "xlutils"
+        try:
+            self.assertEqual(update_xls_cells(other, SHEET, updates), "Success")
+        finally:
+            excel_legacy_utils.XLS_SAVE_ENGINE = engine
+        # Only the values: xlutils drops the cell formatting the patcher keeps
+        for cell_ref in updates:
+            self.assertEqual(read_cell(self.path, cell_ref)[1], read_cell(other, cell_ref)[1])
+
+    def test_missing_sheet_is_reported(self):
+        self.assertEqual(update_xls_cells(self.path, "Missing", {"A1": 1}), "Failed: Sheet 'Missing' not found.")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+test_xlsx_package_utils.py - Round trips through the .xlsx zip/XML patcher
+
+Each test writes values with patch_xlsx_cells (or update_xlsx_cells) into a
+workbook made with openpyxl and reads them back with openpyxl.
+"""
+
+import os
+import re
+import shutil
+import zipfile
+import tempfile
+import unittest
+from datetime import date, datetime, time
+
+import openpyxl
+from openpyxl.styles import Font
+
+from excel_new_utils import update_xlsx_cells
+from xlsx_package_utils import patch_xlsx_cells, CALC_CHAIN_PART, STYLES_PART
+
+SHEET = "Load Plan"
+
+def make_xlsx(path):
+    """Writes a small workbook: a bold header, a date-formatted cell, a formula and a second sheet."""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = SHEET
+    sheet.append(["SO#", "Vessel", "ETD"])
+    sheet["A1"].font = Font(bold=True)
+    sheet.append([450000000001, "Vessel 1", datetime(2025, 6, 1)])
+    sheet["D2"] = "=1+1"
+    workbook.create_sheet("Other")["A1"] = "untouched"
+    workbook.save(path)
+
+def add_calc_chain(path):
+    """Adds a calculation chain listing D2, as Excel saves it (openpyxl never writes one)."""
+    with zipfile.ZipFile(path) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    members[CALC_CHAIN_PART] = b'<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><c r="D2" i="1"/></calcChain>'
+    members["[Content_Types].xml"] = members["[Content_Types].xml"].replace(
+        b"</Types>", b'<Override PartName="/xl/calcChain.xml" ContentType="application/'
+                     b'vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml"/></Types>')
+    members["xl/_rels/workbook.xml.rels"] = members["xl/_rels/workbook.xml.rels"].replace(
+        b"</Relationships>", b'<Relationship Id="rIdCalc" Type="http://schemas.openxmlformats.org/officeDocument/'
+                             b'2006/relationships/calcChain" Target="calcChain.xml"/></Relationships>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+def read_sheet(path, sheet_name=SHEET):
+    return openpyxl.load_workbook(path)[sheet_name]
+
+def cell_xf_count(path):
+    """Returns the number of cellXfs entries in the styles part."""
+    with zipfile.ZipFile(path) as zf:
+        styles = zf.read(STYLES_PART).decode("utf-8")
+    return len(re.findall(r"<xf\b", re.search(r"<cellXfs.*?</cellXfs>", styles, re.S).group(0)))
+
+class PatchXlsxCellsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xlsx")
+        make_xlsx(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_values_read_back_with_their_type(self):
+        updates = {"B2": "text & <more>", "E2": 42, "F2": 1.25, "G2": True, "A2": None}
+        patch_xlsx_cells(self.path, SHEET, updates)
+        sheet = read_sheet(self.path)
+        for cell_ref, value in updates.items():
+            self.assertEqual(sheet[cell_ref].value, value)
+            self.assertIs(type(sheet[cell_ref].value), type(value))
+
+    def test_dates_read_back_as_dates(self):
+        patch_xlsx_cells(self.path, SHEET, {"E2": datetime(2025, 1, 2, 3, 4), "F2": date(2025, 1, 2),
+                                            "G2": time(13, 30), "H9": date(2024, 2, 29)})
+        sheet = read_sheet(self.path)
+        self.assertEqual(sheet["E2"].value, datetime(2025, 1, 2, 3, 4))
+        self.assertEqual(sheet["F2"].value, datetime(2025, 1, 2))
+        self.assertEqual(sheet["G2"].value, time(13, 30))
+        self.assertEqual(sheet["H9"].value, datetime(2024, 2, 29))
+
+    def test_date_over_a_styled_cell_keeps_the_rest_of_the_style(self):
+        patch_xlsx_cells(self.path, SHEET, {"A1": date(2025, 1, 2)})
+        cell = read_sheet(self.path)["A1"]
+        self.assertEqual(cell.value, datetime(2025, 1, 2))
+        self.assertTrue(cell.font.b)
+
+    def test_date_over_a_date_cell_keeps_its_format(self):
+        number_format = read_sheet(self.path)["C2"].number_format
+        patch_xlsx_cells(self.path, SHEET, {"C2": date(2025, 12, 31)})
+        cell = read_sheet(self.path)["C2"]
+        self.assertEqual(cell.value, datetime(2025, 12, 31))
+        self.assertEqual(cell.number_format, number_format)
+
+    def test_date_styles_are_added_once(self):
+        patch_xlsx_cells(self.path, SHEET, {"E2": date(2025, 1, 2), "E3": date(2025, 1, 3)})
+        count = cell_xf_count(self.path)
+        patch_xlsx_cells(self.path, SHEET, {"E4": date(2025, 1, 4)})
+        self.assertEqual(cell_xf_count(self.path), count)
+
+    def test_styles_part_is_unchanged_without_dates(self):
+        with zipfile.ZipFile(self.path) as zf:
+            styles = zf.read(STYLES_PART)
+        patch_xlsx_cells(self.path, SHEET, {"B2": "other vessel"})
+        with zipfile.ZipFile(self.path) as zf:
+            self.assertEqual(zf.read(STYLES_PART), styles)
+
+    def test_other_sheets_are_untouched(self):
+        patch_xlsx_cells(self.path, SHEET, {"A1": "changed"})
+        self.assertEqual(read_sheet(self.path, "Other")["A1"].value, "untouched")
+
+    def test_overwritten_formula_drops_the_calc_chain(self):
+        add_calc_chain(self.path)
+        patch_xlsx_cells(self.path, SHEET, {"D2": 5})
+        with zipfile.ZipFile(self.path) as zf:
+            self.assertNotIn(CALC_CHAIN_PART, zf.namelist())
+            self.assertNotIn(b"calcChain", zf.read("[Content_Types].xml"))
+            self.assertNotIn(b"calcChain", zf.read("xl/_rels/workbook.xml.rels"))
+        self.assertEqual(read_sheet(self.path)["D2"].value, 5)
+
+    def test_calc_chain_is_kept_when_no_formula_is_overwritten(self):
+        add_calc_chain(self.path)
+        patch_xlsx_cells(self.path, SHEET, {"B2": "other vessel"})
+        with zipfile.ZipFile(self.path) as zf:
+            self.assertIn(CALC_CHAIN_PART, zf.namelist())
+
+    def test_unknown_sheet_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            patch_xlsx_cells(self.path, "Missing", {"A1": 1})
+
+    def test_unsupported_value_raises_type_error(self):
+        with self.assertRaises(TypeError):
+            patch_xlsx_cells(self.path, SHEET, {"A1": object()})
+
+class UpdateXlsxCellsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "book.xlsx")
+        make_xlsx(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_keeps_the_file_mode(self):
+        os.chmod(self.path, 0o640)
+        self.assertEqual(update_xlsx_cells(self.path, SHEET, {"B2": "x"}), "Success")
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+
+    def test_failure_leaves_no_temp_file(self):
+        self.assertTrue(update_xlsx_cells(self.path, SHEET, {"A1": object()}).startswith("Failed: "))
+        self.assertEqual(os.listdir(self.folder), ["book.xlsx"])
+
+    def test_missing_sheet_is_reported(self):
+        self.assertEqual(update_xlsx_cells(self.path, "Missing", {"A1": 1}), "Failed: Sheet 'Missing' not found.")
+
+if __name__ == "__main__":
+    unittest.main()
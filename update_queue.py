@@ -0,0 +1,188 @@
+"""
+update_queue.py - Locked single-writer update queue for legacy Excel (.xls) files
+
+Several processes (e.g. two app_4 runs, or a batch job and a manual run) can
+submit cell updates for the same Mass Update file without overwriting each
+other's changes:
+
+- Producers append their updates to a queue file next to the workbook
+  ('<file>.queue.jsonl'). Appending only holds a short queue lock.
+- Whichever process holds the writer lock ('<file>.lock') drains the queue,
+  merges all pending updates (later updates to the same cell win) and applies
+  them with one save per sheet.
+
+Because every read-modify-write of the workbook happens under the writer lock,
+no save can silently wipe out another run's changes.
+
+Updates whose save fails are put back in the queue. After MAX_FLUSH_ATTEMPTS
+failed saves they are moved to a dead-letter file ('<file>.queue.failed.jsonl')
+with the last error, so one bad batch does not block every later flush.
+
+Queued values keep their type: datetimes, dates, times and timedeltas are
+tagged the same way as in the resume journal (see journal_utils).
+"""
+
+import os
+import json
+from collections import OrderedDict
+from file_utils import file_lock
+from excel_legacy_utils import update_xls_cells
+from journal_utils import _decode_value, _encode_value
+
+QUEUE_SUFFIX = ".queue.jsonl"
+PROCESSING_SUFFIX = ".queue.processing.jsonl"
+QUEUE_LOCK_SUFFIX = ".queue.lock"
+WRITER_LOCK_SUFFIX = ".lock"
+DEAD_LETTER_SUFFIX = ".queue.failed.jsonl"
+
+# Failed saves after which queued updates are moved to the dead-letter file
+MAX_FLUSH_ATTEMPTS = 5
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def _read_queue_file(path):
+    """Reads queued update entries from a JSON-lines file (missing file -> [])."""
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line, object_hook=_decode_value))
+    return entries
+
+def _write_queue_file(path, entries, mode='w'):
+    """Writes update entries to a JSON-lines file, replacing its contents (or appending with mode='a')."""
+    # Serialized up front, so a value that is not JSON-serializable writes nothing
+    lines = "".join(json.dumps(entry, default=_encode_value) + "\n" for entry in entries)
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(lines)
+
+def _merge_entries(entries):
+    """
+    Coalesces queued entries into {sheet_name: {cell_ref: value}}.
+    Entries are applied in queue order, so the latest update to a cell wins.
+    """
+    merged = OrderedDict()
+    for entry in entries:
+        sheet_updates = merged.setdefault(entry["sheet"], OrderedDict())
+        cell_ref = entry["cell"].upper()
+        # Re-insert so the cell keeps the position of its latest update
+        sheet_updates.pop(cell_ref, None)
+        sheet_updates[cell_ref] = entry["value"]
+    return merged
+
+# --------------------------
+# Core Functions
+# --------------------------
+
+def enqueue_xls_updates(file_path, sheet_name, cell_updates, timeout=60):
+    """
+    Appends cell updates to the workbook's update queue without saving the workbook.
+
+    Args:
+        file_path (str): Path to the .xls file the updates are for.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+        timeout (float): Seconds to wait for the queue lock.
+
+    Returns:
+        str: 'Success' or error reason.
+    """
+    if not cell_updates:
+        return "Success"
+    try:
+        with file_lock(file_path + QUEUE_LOCK_SUFFIX, timeout=timeout):
+            _write_queue_file(file_path + QUEUE_SUFFIX,
+                              [{"sheet": sheet_name, "cell": cell_ref, "value": value}
+                               for cell_ref, value in cell_updates.items()], mode='a')
+        return "Success"
+    except Exception as e:
+        return f"Failed: {str(e)}"
+
+def flush_xls_updates(file_path, timeout=300):
+    """
+    Drains the workbook's update queue and applies all pending updates.
+
+    Only one process can flush at a time. Updates from every producer are merged
+    and written with a single save per sheet. If the save fails, the drained
+    updates are put back at the front of the queue so they are not lost; after
+    MAX_FLUSH_ATTEMPTS failed saves they go to the dead-letter file instead.
+
+    Args:
+        file_path (str): Path to the .xls file.
+        timeout (float): Seconds to wait for the writer lock.
+
+    Returns:
+        tuple: (status, applied_count) where status is 'Success' or an error reason
+               and applied_count is the number of distinct cells written.
+    """
+    queue_path = file_path + QUEUE_SUFFIX
+    processing_path = file_path + PROCESSING_SUFFIX
+    try:
+        with file_lock(file_path + WRITER_LOCK_SUFFIX, timeout=timeout):
+            # Take everything queued so far. A leftover processing file means a
+            # previous flush died before finishing, so its entries go first.
+            with file_lock(file_path + QUEUE_LOCK_SUFFIX, timeout=timeout):
+                entries = _read_queue_file(processing_path) + _read_queue_file(queue_path)
+                if not entries:
+                    return "Success", 0
+                _write_queue_file(processing_path, entries)
+                if os.path.exists(queue_path):
+                    os.remove(queue_path)
+
+            merged = _merge_entries(entries)
+            applied = 0
+            for sheet_name, cell_updates in merged.items():
+                status = update_xls_cells(file_path, sheet_name, cell_updates)
+                if status != "Success":
+                    _requeue_failed(file_path, entries, status, timeout)
+                    return status, applied
+                applied += len(cell_updates)
+
+            os.remove(processing_path)
+            return "Success", applied
+    except Exception as e:
+        return f"Failed: {str(e)}", 0
+
+def _requeue_failed(file_path, entries, status, timeout):
+    """
+    Puts drained entries back in front of anything queued since, counting the
+    failed attempt; entries that reached MAX_FLUSH_ATTEMPTS go to the
+    dead-letter file with the error instead.
+    """
+    retry, dead = [], []
+    for entry in entries:
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        if entry["attempts"] >= MAX_FLUSH_ATTEMPTS:
+            dead.append(dict(entry, error=status))
+        else:
+            retry.append(entry)
+    queue_path = file_path + QUEUE_SUFFIX
+    with file_lock(file_path + QUEUE_LOCK_SUFFIX, timeout=timeout):
+        if dead:
+            _write_queue_file(file_path + DEAD_LETTER_SUFFIX, dead, mode='a')
+        _write_queue_file(queue_path, retry + _read_queue_file(queue_path))
+        os.remove(file_path + PROCESSING_SUFFIX)
+
+def submit_xls_updates(file_path, sheet_name, cell_updates, timeout=300):
+    """
+    Queues cell updates and then flushes the queue, so the updates (together with
+    any other producer's pending updates) are saved before this call returns.
+
+    Args:
+        file_path (str): Path to the .xls file.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+        timeout (float): Seconds to wait for the locks.
+
+    Returns:
+        tuple: (status, applied_count) as returned by flush_xls_updates.
+    """
+    status = enqueue_xls_updates(file_path, sheet_name, cell_updates, timeout=timeout)
+    if status != "Success":
+        return status, 0
+    return flush_xls_updates(file_path, timeout=timeout)
@@ -0,0 +1,304 @@
+"""
+validation_utils.py - Input validation and column statistics gathered while loading
+
+Bad inputs used to surface one order at a time, after the workbooks had been
+read and while the sync was already writing. The loaders now feed every row
+they read to a SheetProfile (func_utils.index_rows_by_key / find_rows for Load
+Plans, func_utils.get_column_values_with_rows for the Mass Update), so checking
+the inputs costs no extra pass over the sheet. A profile records:
+
+- statistics for the columns it watches: filled and empty cells, the mix of
+  value types and, for date columns, the date range and the values that are
+  not dates (text dates count as dates, read with the format date_utils
+  infers for the column);
+- key problems: rows with data but no key, and keys found on more than one row;
+- watched columns that are missing from the header row.
+
+check_profiles() logs the statistics and returns the issues found. The sync
+runs it after loading and before anything is written; with "validation":
+"strict" a run with issues stops there.
+
+Like index_utils, this module does not import any Excel library.
+"""
+
+import os
+import copy
+import numbers
+from collections import Counter
+from datetime import datetime, date, timedelta
+from date_utils import DATE_SAMPLE_SIZE, infer_date_format, get_date_parser
+
+VALIDATION_MODES = ("off", "warn", "strict")
+DEFAULT_VALIDATION_MODE = "warn"
+
+# Example rows (or keys) listed per issue
+MAX_EXAMPLES = 5
+
+# Excel serials outside this range are not dates (1900-01-01 .. 9999-12-31)
+_MIN_SERIAL, _MAX_SERIAL = 1, 2958465
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def _value_type(value):
+    """Returns a readable type name for a cell value: text, number, date, bool or other."""
+    if isinstance(value, str):
+        return "text"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (datetime, date)):
+        return "date"
+    if isinstance(value, numbers.Number):
+        return "number"
+    return "other"
+
+def _as_date(value):
+    """Returns a cell value as a datetime (dates and Excel serials), or None if it is not a date."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, numbers.Number) and not isinstance(value, bool) and _MIN_SERIAL <= value <= _MAX_SERIAL:
+        return datetime(1899, 12, 30) + timedelta(days=value)
+    return None
+
+def _examples(items):
+    """Formats the first MAX_EXAMPLES items of a list for a log message."""
+    shown = ", ".join(str(item) for item in items[:MAX_EXAMPLES])
+    return shown + (", ..." if len(items) > MAX_EXAMPLES else "")
+
+# --------------------------
+# Profiles
+# --------------------------
+
+class ColumnStats:
+    """
+    Running statistics of one column's values.
+
+    Text in a date column is held back until DATE_SAMPLE_SIZE distinct texts
+    (or the end of the scan) have been seen, then read with the text format
+    inferred from them, as date_utils.normalize_date_column does.
+    """
+
+    def __init__(self, is_date=False):
+        self.is_date = is_date
+        self.filled = 0
+        self.empty = 0
+        self.types = Counter()
+        self.dates = 0
+        self.min_date = None
+        self.max_date = None
+        self.non_date_rows = []
+        self.text_format = None
+        self._text_parser = None
+        self._pending_texts = []
+        self._sample = set()
+        self._inferred = False
+
+    def add(self, row_num, value):
+        """Counts one cell value."""
+        if value is None or value == "":
+            self.empty += 1
+            return
+        self.filled += 1
+        self.types[_value_type(value)] += 1
+        if not self.is_date:
+            return
+        as_date = _as_date(value)
+        if as_date is None and isinstance(value, str):
+            if not self._inferred:
+                self._pending_texts.append((row_num, value))
+                self._sample.add(value.strip())
+                if len(self._sample) >= DATE_SAMPLE_SIZE:
+                    self._infer_text_format()
+                return
+            as_date = self._text_parser.parse(value) if self._text_parser else None
+        self._add_date(row_num, as_date)
+
+    def _infer_text_format(self):
+        """Infers the column's text date format and counts the texts held back so far."""
+        self._inferred = True
+        self.text_format = infer_date_format(text for _, text in self._pending_texts)
+        self._text_parser = get_date_parser(self.text_format) if self.text_format else None
+        pending, self._pending_texts, self._sample = self._pending_texts, [], set()
+        for row_num, text in pending:
+            self._add_date(row_num, self._text_parser.parse(text) if self._text_parser else None)
+
+    def finish(self):
+        """Counts any texts still held back at the end of the scan."""
+        if self.is_date and not self._inferred:
+            self._infer_text_format()
+        self.non_date_rows.sort()
+
+    def _add_date(self, row_num, as_date):
+        if as_date is None:
+            self.non_date_rows.append(row_num)
+            return
+        self.dates += 1
+        if self.min_date is None or as_date < self.min_date:
+            self.min_date = as_date
+        if self.max_date is None or as_date > self.max_date:
+            self.max_date = as_date
+
+    def to_dict(self):
+        """Returns the statistics as a JSON-friendly dict."""
+        stats = {"filled": self.filled, "empty": self.empty, "types": dict(self.types)}
+        if self.is_date:
+            stats["non_dates"] = len(self.non_date_rows)
+            stats["text_format"] = self.text_format
+            stats["date_range"] = [self.min_date.strftime('%Y-%m-%d'), self.max_date.strftime('%Y-%m-%d')] \
+                if self.min_date else None
+        return stats
+
+    def describe(self):
+        """Returns a one-line summary for the log."""
+        types = ", ".join(f"{name} {count}" for name, count in self.types.most_common())
+        text = f"{self.filled} filled, {self.empty} empty" + (f" ({types})" if types else "")
+        if self.min_date:
+            text += f", dates {self.min_date:%Y-%m-%d} to {self.max_date:%Y-%m-%d}"
+        if self.text_format:
+            text += f", text dates as '{self.text_format}'"
+        return text
+
+class SheetProfile:
+    """
+    Validation results and column statistics for one sheet, filled by a loader
+    while it reads the rows. Profiles are plain picklable objects, so a loader
+    running in a worker process can return one.
+
+    The loader calls start() with the header row, add_row() for every data row
+    (including rows without a key) and finish() at the end of the scan.
+    """
+
+    def __init__(self, label, key_column, columns=(), date_columns=()):
+        self.label = label
+        self.key_column = key_column
+        self.date_columns = set(date_columns)
+        self.columns = list(dict.fromkeys([key_column, *columns, *date_columns]))
+        self.file_path = None
+        self.rows = 0
+        self.missing_columns = []
+        self.column_stats = {}
+        self.empty_key_rows = []
+        self.duplicate_keys = {}
+        self._watched = []
+        self._first_rows = {}
+
+    @property
+    def spec(self):
+        """What the profile watches; profiles with the same spec are interchangeable."""
+        return self.label, self.key_column, tuple(self.columns), tuple(sorted(self.date_columns))
+
+    def copy_from(self, other):
+        """Replaces this profile's results with a copy of another profile's (e.g. a cached one)."""
+        self.__dict__.update(copy.deepcopy(other.__dict__))
+
+    def start(self, file_path, headers):
+        """
+        Starts a scan.
+
+        Args:
+            file_path (str): The workbook being read.
+            headers (dict): Header name -> 0-based column index of the header row.
+        """
+        self.file_path = file_path
+        self.missing_columns = [name for name in self.columns if name not in headers]
+        self.column_stats = {name: ColumnStats(name in self.date_columns) for name in self.columns if name in headers}
+        self._watched = [(self.column_stats[name], headers[name]) for name in self.column_stats]
+
+    def add_row(self, row_num, row_values, key):
+        """Records one data row and its (already stripped) key; an empty key is '' or None."""
+        if key is None or key == "":
+            # Only rows that hold something are missing their key; blank rows are not counted
+            if any(value is not None and value != "" for value in row_values):
+                self.rows += 1
+                self.empty_key_rows.append(row_num)
+                self._count_cells(row_num, row_values)
+            return
+        self.rows += 1
+        self._count_cells(row_num, row_values)
+        first_row = self._first_rows.setdefault(key, row_num)
+        if first_row != row_num:
+            self.duplicate_keys.setdefault(key, [first_row]).append(row_num)
+
+    def _count_cells(self, row_num, row_values):
+        width = len(row_values)
+        for stats, col_idx in self._watched:
+            stats.add(row_num, row_values[col_idx] if col_idx < width else None)
+
+    def finish(self):
+        """Ends the scan and drops the per-key bookkeeping."""
+        for stats in self.column_stats.values():
+            stats.finish()
+        self._first_rows = {}
+
+    def issues(self):
+        """
+        Returns the problems found, as log-ready strings.
+
+        A date column is only reported for non-date values when most of its
+        values are dates; a column of plain text is not a date column.
+        """
+        name = f"{self.label} '{os.path.basename(self.file_path or '')}'"
+        found = [f"{name}: column '{column}' not found in the header row." for column in self.missing_columns]
+        if self.empty_key_rows:
+            found.append(f"{name}: {len(self.empty_key_rows)} row(s) have data but no '{self.key_column}' "
+                         f"(rows {_examples(self.empty_key_rows)}).")
+        if self.duplicate_keys:
+            examples = [f"'{key}' on rows {', '.join(map(str, rows))}" for key, rows in self.duplicate_keys.items()]
+            found.append(f"{name}: {len(self.duplicate_keys)} '{self.key_column}' value(s) appear on more than "
+                         f"one row ({'; '.join(examples[:MAX_EXAMPLES])}{'; ...' if len(examples) > MAX_EXAMPLES else ''}).")
+        for column, stats in self.column_stats.items():
+            if stats.is_date and stats.non_date_rows and stats.dates > len(stats.non_date_rows):
+                found.append(f"{name}: date column '{column}' has {len(stats.non_date_rows)} value(s) that are "
+                             f"not dates (rows {_examples(stats.non_date_rows)}).")
+        return found
+
+    def to_dict(self):
+        """Returns the profile as a JSON-friendly dict (e.g. for the run summary)."""
+        return {
+            "label": self.label,
+            "file": self.file_path,
+            "rows": self.rows,
+            "missing_columns": self.missing_columns,
+            "empty_keys": len(self.empty_key_rows),
+            "duplicate_keys": len(self.duplicate_keys),
+            "columns": {column: stats.to_dict() for column, stats in self.column_stats.items()},
+        }
+
+def call_with_profile(loader, profile, *args):
+    """
+    Calls loader(*args, profile=profile) and returns (result, profile), so the
+    filled profile also comes back when the loader runs in a worker process.
+    """
+    return loader(*args, profile=profile), profile
+
+# --------------------------
+# Checks
+# --------------------------
+
+def check_profiles(profiles, logger):
+    """
+    Logs the statistics of every profile and returns all issues found, each
+    logged as a warning.
+
+    Args:
+        profiles (list): Filled SheetProfiles. Profiles whose scan never started
+                         (e.g. the workbook could not be read) are skipped.
+        logger (logging.Logger): Logger for the statistics and issues.
+
+    Returns:
+        list: Issue messages, empty when the inputs look valid.
+    """
+    issues = []
+    for profile in profiles:
+        if profile.file_path is None:
+            continue
+        logger.info(f"{profile.label} '{os.path.basename(profile.file_path)}': {profile.rows} data rows.")
+        for column, stats in profile.column_stats.items():
+            logger.info(f"  -> '{column}': {stats.describe()}")
+        for issue in profile.issues():
+            logger.warning(f"Validation: {issue}")
+            issues.append(issue)
+    return issues
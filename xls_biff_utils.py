@@ -0,0 +1,783 @@
+"""
+xls_biff_utils.py - Low-level patching of legacy Excel (.xls, BIFF8) workbooks
+Requires: only the standard library
+
+Saving through xlutils.copy / xlwt rebuilds the whole workbook from an xlrd
+parse: every style, string and unchanged cell is re-created. patch_xls_cells
+edits the BIFF record stream directly instead:
+
+- The OLE2 compound file is read sector by sector. Only the 'Workbook' stream
+  is rewritten (in its own sectors where it still fits); the patched file is
+  written to a temporary copy that replaces the original, keeping its mode.
+- In the edited sheet, only the row segments holding changed cells are rebuilt:
+  one ROW record with its cells (xlwt layout), or one Excel row block with its
+  DBCELL. Every other record is copied byte for byte.
+- Stream offsets that move (BOUNDSHEET positions, INDEX pointers) and the
+  DIMENSIONS and ROW extents are updated.
+- Updated cells keep their cell format (XF index). Strings are written inline as
+  LABEL records, so the shared string table does not have to change.
+
+Workbooks the patcher cannot reproduce exactly raise XlsPatchUnsupported. These
+include encrypted or pre-BIFF8 files, overwriting shared or array formulas, and
+unknown records inside the cell table. Callers then fall back to xlutils.
+"""
+
+import os
+import re
+import math
+import bisect
+import struct
+import shutil
+import tempfile
+from datetime import datetime, date, time
+
+# Compound file layout, see [MS-CFB]
+_CFB_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_FREESECT = 0xFFFFFFFF
+_ENDOFCHAIN = 0xFFFFFFFE
+_FATSECT = 0xFFFFFFFD
+_DIFSECT = 0xFFFFFFFC
+_HEADER_DIFAT_SLOTS = 109
+_DIR_ENTRY_SIZE = 128
+_STREAM_ENTRY = 2
+
+# BIFF8 record types, see [MS-XLS]
+_BOF, _EOF, _FILEPASS, _DATEMODE, _BOUNDSHEET = 0x0809, 0x000A, 0x002F, 0x0022, 0x0085
+_INDEX, _DIMENSIONS, _DEFAULTROWHEIGHT, _COLINFO = 0x020B, 0x0200, 0x0225, 0x007D
+_ROW, _DBCELL = 0x0208, 0x00D7
+_FORMULA, _BLANK, _NUMBER, _LABEL, _BOOLERR = 0x0006, 0x0201, 0x0203, 0x0204, 0x0205
+_RK, _LABELSST, _RSTRING, _MULRK, _MULBLANK = 0x027E, 0x00FD, 0x00D6, 0x00BD, 0x00BE
+_STRING, _SHRFMLA, _ARRAY, _TABLE = 0x0207, 0x04BC, 0x0221, 0x0236
+
+_CELL_RECORDS = frozenset({_FORMULA, _BLANK, _NUMBER, _LABEL, _BOOLERR, _RK, _LABELSST, _RSTRING, _MULRK, _MULBLANK})
+_FORMULA_EXTRAS = frozenset({_STRING, _SHRFMLA, _ARRAY, _TABLE})
+_CELL_TABLE_RECORDS = _CELL_RECORDS | _FORMULA_EXTRAS | {_ROW, _DBCELL}
+
+_RECORD_HEADER = struct.Struct("<HH")
+_ROW_INDEX = struct.Struct("<H")
+_BIFF8_VERSION = 0x0600
+_ROWS_PER_BLOCK = 32
+_ROW_RECORD_SIZE = 20
+_DEFAULT_XF = 15
+_DEFAULT_ROW_HEIGHT = 0x00FF
+_ROW_OPTIONS = 0x0100
+_ROW_GHOST_DIRTY = 0x0080
+_FORMULA_SHARED = 0x0008
+_PTG_EXP, _PTG_TBL = 0x01, 0x02
+_MAX_ROWS, _MAX_COLS = 65536, 256
+_MAX_LABEL_CHARS = 255
+
+# Where a record scan is relative to the cell table
+_BEFORE_TABLE, _IN_TABLE, _AFTER_TABLE = 0, 1, 2
+
+_CELL_REF_RE = re.compile(r"([A-Za-z]+)([0-9]+)$")
+
+class XlsPatchUnsupported(Exception):
+    """The workbook uses a layout patch_xls_cells cannot edit safely; use xlutils instead."""
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def parse_cell_ref(cell_ref):
+    """
+    Split an Excel reference ('C5') into zero-based (row, column) indexes.
+
+    Raises:
+        ValueError: If the reference is malformed or outside the .xls grid.
+    """
+    match = _CELL_REF_RE.match(cell_ref.strip())
+    if not match:
+        raise ValueError(f"Invalid cell reference format - {cell_ref}")
+    col_idx = 0
+    for char in match.group(1).upper():
+        col_idx = col_idx * 26 + (ord(char) - 64)
+    row_idx, col_idx = int(match.group(2)) - 1, col_idx - 1
+    if not (0 <= row_idx < _MAX_ROWS and 0 <= col_idx < _MAX_COLS):
+        raise ValueError(f"Cell reference outside the .xls grid (65536 rows x 256 columns) - {cell_ref}")
+    return row_idx, col_idx
+
+def _record(record_type, payload):
+    """Returns a complete BIFF record (header + payload)."""
+    return _RECORD_HEADER.pack(record_type, len(payload)) + payload
+
+def _excel_serial(value, datemode):
+    """Converts a date, datetime or time to an Excel serial number for the workbook's date system."""
+    if isinstance(value, time):
+        return (value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6) / 86400
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    delta = value.replace(tzinfo=None) - (datetime(1904, 1, 1) if datemode else datetime(1899, 12, 30))
+    return delta.days + (delta.seconds + delta.microseconds / 1e6) / 86400
+
+def _cell_record(row_idx, col_idx, xf_index, value, datemode):
+    """
+    Builds the record for one cell value, the way xlwt would store it: None and
+    '' become BLANK, bools BOOLERR, numbers and dates NUMBER, strings LABEL.
+    """
+    head = struct.pack("<HHH", row_idx, col_idx, xf_index)
+    if value is None or (isinstance(value, str) and value == ""):
+        return _record(_BLANK, head)
+    if isinstance(value, bool):
+        return _record(_BOOLERR, head + struct.pack("<BB", int(value), 0))
+    if isinstance(value, (datetime, date, time)):
+        value = _excel_serial(value, datemode)
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise ValueError(f"Cannot write non-finite number to row {row_idx + 1}, column {col_idx + 1}")
+        return _record(_NUMBER, head + struct.pack("<d", float(value)))
+    if isinstance(value, str):
+        utf16 = value.encode("utf-16-le")
+        if len(utf16) // 2 > _MAX_LABEL_CHARS:
+            raise XlsPatchUnsupported("Strings longer than 255 characters need the shared string table.")
+        try:
+            chars, high_byte = value.encode("latin-1"), 0
+        except UnicodeEncodeError:
+            chars, high_byte = utf16, 1
+        return _record(_LABEL, head + struct.pack("<HB", len(utf16) // 2, high_byte) + chars)
+    raise TypeError(f"Unsupported value type for row {row_idx + 1}, column {col_idx + 1}: {type(value).__name__}")
+
+def _split_multi(raw, record_type, col_idx):
+    """
+    Splits a MULRK / MULBLANK record around one column.
+
+    Returns:
+        tuple: (cells left of col_idx, XF index of col_idx, cells right of col_idx)
+    """
+    row_idx, first_col = struct.unpack_from("<HH", raw, 4)
+    item_size = 6 if record_type == _MULRK else 2
+    items = [raw[pos:pos + item_size] for pos in range(8, len(raw) - 2, item_size)]
+    k = col_idx - first_col
+    xf_index = struct.unpack_from("<H", items[k])[0]
+    return (_multi_cells(record_type, row_idx, first_col, items[:k]), xf_index,
+            _multi_cells(record_type, row_idx, col_idx + 1, items[k + 1:]))
+
+def _multi_cells(record_type, row_idx, first_col, items):
+    """Rebuilds a run of MULRK / MULBLANK items as cell entries (a single item becomes RK / BLANK)."""
+    if not items:
+        return []
+    head = struct.pack("<HH", row_idx, first_col)
+    if len(items) == 1:
+        single_type = _RK if record_type == _MULRK else _BLANK
+        return [[first_col, first_col, _record(single_type, head + items[0]), set()]]
+    last_col = first_col + len(items) - 1
+    return [[first_col, last_col, _record(record_type, head + b"".join(items) + struct.pack("<H", last_col)), set()]]
+
+def _is_shared_formula(raw, extras):
+    """True for formulas that other cells depend on or that belong to a shared/array formula."""
+    if extras & {_SHRFMLA, _ARRAY, _TABLE}:
+        return True
+    options = struct.unpack_from("<H", raw, 4 + 14)[0]
+    first_token = raw[4 + 22] if len(raw) > 4 + 22 else None
+    return bool(options & _FORMULA_SHARED) or first_token in (_PTG_EXP, _PTG_TBL)
+
+# --------------------------
+# Compound File Container
+# --------------------------
+
+class _CompoundFile:
+    """
+    Minimal OLE2 compound file reader/writer: enough to read one stream and to
+    write it back in place, reusing its sectors and appending new ones at the
+    end of the file when it grows.
+    """
+
+    def __init__(self, data):
+        if bytes(data[:8]) != _CFB_SIGNATURE:
+            raise XlsPatchUnsupported("Not an OLE2 compound file.")
+        self.data = data
+        self.major_version = struct.unpack_from("<H", data, 0x1A)[0]
+        self.sector_size = 1 << struct.unpack_from("<H", data, 0x1E)[0]
+        if self.sector_size not in (512, 4096):
+            raise XlsPatchUnsupported(f"Unsupported sector size {self.sector_size}.")
+        fat_count, self.dir_start, _, self.mini_cutoff, _, _, difat_sector, _ = struct.unpack_from("<8I", data, 0x2C)
+
+        self.fat_sectors = list(struct.unpack_from(f"<{_HEADER_DIFAT_SLOTS}I", data, 0x4C))[:fat_count]
+        self.difat_sectors = []
+        per_difat = self.sector_size // 4 - 1
+        while len(self.fat_sectors) < fat_count:
+            if difat_sector >= _DIFSECT or self._offset(difat_sector) >= len(data):
+                raise XlsPatchUnsupported("Broken DIFAT chain.")
+            entries = struct.unpack_from(f"<{per_difat + 1}I", data, self._offset(difat_sector))
+            self.fat_sectors.extend(entries[:per_difat])
+            self.difat_sectors.append(difat_sector)
+            difat_sector = entries[per_difat]
+        self.fat_sectors = self.fat_sectors[:fat_count]
+
+        per_fat = self.sector_size // 4
+        self.fat = []
+        for sector in self.fat_sectors:
+            self.fat.extend(struct.unpack_from(f"<{per_fat}I", data, self._offset(sector)))
+
+        # Some writers leave a partial last sector; whole sectors keep appends aligned
+        if len(data) % self.sector_size:
+            data.extend(bytes(self.sector_size - len(data) % self.sector_size))
+        self._free = [sector for sector in range(min(len(self.fat), self._sector_count()))
+                      if self.fat[sector] == _FREESECT]
+        self._free.reverse()
+
+    def _offset(self, sector):
+        return (sector + 1) * self.sector_size
+
+    def _sector_count(self):
+        return len(self.data) // self.sector_size - 1
+
+    def _chain(self, sector):
+        chain = []
+        while sector != _ENDOFCHAIN:
+            if sector >= len(self.fat) or len(chain) > len(self.fat):
+                raise XlsPatchUnsupported("Broken sector chain.")
+            chain.append(sector)
+            sector = self.fat[sector]
+        return chain
+
+    def find_stream(self, name):
+        """Returns (directory entry offset, start sector, size) of a top-level stream."""
+        per_sector = self.sector_size // _DIR_ENTRY_SIZE
+        for i, sector in enumerate(self._chain(self.dir_start)):
+            for k in range(per_sector):
+                entry = self._offset(sector) + k * _DIR_ENTRY_SIZE
+                name_size = struct.unpack_from("<H", self.data, entry + 0x40)[0]
+                if self.data[entry + 0x42] != _STREAM_ENTRY or not 2 <= name_size <= 64:
+                    continue
+                entry_name = bytes(self.data[entry:entry + name_size - 2]).decode("utf-16-le", "replace")
+                if entry_name.lower() == name.lower():
+                    start, size_low, size_high = struct.unpack_from("<3I", self.data, entry + 0x74)
+                    size = size_low if self.major_version == 3 else size_low | (size_high << 32)
+                    return entry, start, size
+        raise XlsPatchUnsupported(f"No '{name}' stream (only BIFF8 workbooks can be patched).")
+
+    def read_stream(self, start, size):
+        if size < self.mini_cutoff:
+            raise XlsPatchUnsupported("Workbook stream is stored in the mini stream.")
+        ss = self.sector_size
+        stream = b"".join(self.data[self._offset(s):self._offset(s) + ss] for s in self._chain(start))
+        if len(stream) < size:
+            raise XlsPatchUnsupported("Workbook stream is shorter than its directory entry says.")
+        return stream[:size]
+
+    def write_stream(self, entry, start, stream):
+        """Writes `stream` over the stream starting at `start` and updates its directory entry."""
+        if len(stream) < self.mini_cutoff:
+            raise XlsPatchUnsupported("Workbook stream would have to move to the mini stream.")
+        ss = self.sector_size
+        chain = self._chain(start)
+        needed = -(-len(stream) // ss)
+        for sector in chain[needed:]:
+            self.fat[sector] = _FREESECT
+            self.data[self._offset(sector):self._offset(sector) + ss] = bytes(ss)
+        chain = chain[:needed]
+        while len(chain) < needed:
+            chain.append(self._free.pop() if self._free else self._append_sector())
+
+        for current, following in zip(chain, chain[1:]):
+            self.fat[current] = following
+        self.fat[chain[-1]] = _ENDOFCHAIN
+        for i, sector in enumerate(chain):
+            piece = stream[i * ss:(i + 1) * ss]
+            self.data[self._offset(sector):self._offset(sector) + ss] = piece + bytes(ss - len(piece))
+
+        struct.pack_into("<I", self.data, entry + 0x74, chain[0])
+        struct.pack_into("<Q", self.data, entry + 0x78, len(stream))
+        self._write_fat()
+
+    def _append_sector(self):
+        """Adds a sector at the end of the file, growing the FAT (and DIFAT) first when they are full."""
+        per_difat = self.sector_size // 4 - 1
+        while self._sector_count() >= len(self.fat):
+            fat_sector = self._sector_count()
+            self.data.extend(bytes(self.sector_size))
+            self.fat.extend([_FREESECT] * (self.sector_size // 4))
+            self.fat[fat_sector] = _FATSECT
+            self.fat_sectors.append(fat_sector)
+            # FAT sectors past the header's 109 slots are listed in DIFAT sectors
+            if len(self.fat_sectors) > _HEADER_DIFAT_SLOTS + per_difat * len(self.difat_sectors):
+                difat_sector = self._sector_count()
+                self.data.extend(bytes(self.sector_size))
+                self.fat[difat_sector] = _DIFSECT
+                self.difat_sectors.append(difat_sector)
+        index = self._sector_count()
+        self.data.extend(bytes(self.sector_size))
+        return index
+
+    def _write_fat(self):
+        per_fat = self.sector_size // 4
+        for i, sector in enumerate(self.fat_sectors):
+            struct.pack_into(f"<{per_fat}I", self.data, self._offset(sector), *self.fat[i * per_fat:(i + 1) * per_fat])
+            if i < _HEADER_DIFAT_SLOTS:
+                struct.pack_into("<I", self.data, 0x4C + 4 * i, sector)
+        per_difat = self.sector_size // 4 - 1
+        for k, sector in enumerate(self.difat_sectors):
+            listed = self.fat_sectors[_HEADER_DIFAT_SLOTS + k * per_difat:_HEADER_DIFAT_SLOTS + (k + 1) * per_difat]
+            following = self.difat_sectors[k + 1] if k + 1 < len(self.difat_sectors) else _ENDOFCHAIN
+            struct.pack_into(f"<{per_difat + 1}I", self.data, self._offset(sector),
+                             *listed, *[_FREESECT] * (per_difat - len(listed)), following)
+        struct.pack_into("<2I", self.data, 0x44, self.difat_sectors[0] if self.difat_sectors else _ENDOFCHAIN,
+                         len(self.difat_sectors))
+        struct.pack_into("<I", self.data, 0x2C, len(self.fat_sectors))
+
+# --------------------------
+# BIFF Records
+# --------------------------
+
+def _iter_records(stream, offset):
+    """Yields (offset, record_type, length) for the records from `offset` to the end of the stream."""
+    end = len(stream)
+    while offset + 4 <= end:
+        record_type, length = _RECORD_HEADER.unpack_from(stream, offset)
+        yield offset, record_type, length
+        offset += 4 + length
+
+def _substream_records(stream, start):
+    """
+    Returns the records of the substream starting at `start`, through its EOF,
+    as (offset, record_type, length, depth) tuples. Depth is 1 for the
+    substream's own records and higher inside embedded ones (e.g. charts).
+    """
+    records, depth = [], 0
+    for offset, record_type, length in _iter_records(stream, start):
+        if record_type == _BOF:
+            depth += 1
+        elif depth == 0:
+            raise XlsPatchUnsupported(f"No BOF record at stream offset {start}.")
+        records.append((offset, record_type, length, depth))
+        if record_type == _EOF:
+            depth -= 1
+            if depth == 0:
+                return records
+    raise XlsPatchUnsupported(f"Substream at stream offset {start} has no EOF record.")
+
+def _boundsheet_name(stream, offset):
+    """Decodes the sheet name of a BOUNDSHEET record."""
+    char_count, high_byte = struct.unpack_from("<BB", stream, offset + 10)
+    if high_byte & 1:
+        return bytes(stream[offset + 12:offset + 12 + 2 * char_count]).decode("utf-16-le")
+    return bytes(stream[offset + 12:offset + 12 + char_count]).decode("latin-1")
+
+# --------------------------
+# Cell Table
+# --------------------------
+
+class _RowSegment:
+    """
+    One contiguous piece of a sheet's cell table: an Excel row block (up to 32
+    ROW records, their cells and a DBCELL) or, in files written without DBCELLs
+    (xlwt), one ROW record with its cells. A segment is only a byte range of the
+    original stream until it is loaded for editing.
+    """
+
+    def __init__(self, with_dbcell, start=None, first_row=None):
+        self.with_dbcell = with_dbcell
+        self.start = self.end = self.dbcell = start
+        self.first_row = self.last_row = first_row
+        self.original_row_count = 0
+        self.row_records = None
+        self.cells = None
+
+    @property
+    def row_count(self):
+        """Number of ROW records in the segment."""
+        return len(self.row_records) if self.row_records is not None else self.original_row_count
+
+    def add_row(self, row_idx):
+        """Extends the segment's row range to cover row_idx."""
+        self.first_row = row_idx if self.first_row is None else min(self.first_row, row_idx)
+        self.last_row = row_idx if self.last_row is None else max(self.last_row, row_idx)
+
+    def load(self, stream):
+        """Parses the segment's records into rows and cells and checks that they rebuild exactly."""
+        self.row_records, self.cells = {}, {}
+        if self.start is None:
+            return
+        cell = None
+        for offset, record_type, length in _iter_records(stream, self.start):
+            if offset >= self.end:
+                break
+            raw = bytes(stream[offset:offset + 4 + length])
+            if record_type == _ROW:
+                self.row_records[struct.unpack_from("<H", raw, 4)[0]] = raw
+            elif record_type in _FORMULA_EXTRAS:
+                if cell is None:
+                    raise XlsPatchUnsupported("Formula record without its cell.")
+                cell[2] += raw
+                cell[3].add(record_type)
+            elif record_type in _CELL_RECORDS:
+                row_idx, first_col = struct.unpack_from("<HH", raw, 4)
+                last_col = struct.unpack_from("<H", raw, len(raw) - 2)[0] if record_type in (_MULRK, _MULBLANK) else first_col
+                cell = [first_col, last_col, raw, set()]
+                self.cells.setdefault(row_idx, []).append(cell)
+        if self.to_bytes() != stream[self.start:self.end]:
+            raise XlsPatchUnsupported("Row layout not recognized; it would not be rewritten byte for byte.")
+
+    def set_cell(self, row_idx, col_idx, value, datemode, column_xf, row_height):
+        """Replaces or inserts one cell, keeping the cell's XF index (or the row/column default for new cells)."""
+        cells = self.cells.setdefault(row_idx, [])
+        row_record = self.row_records.get(row_idx)
+        for i, (first_col, last_col, raw, extras) in enumerate(cells):
+            if first_col <= col_idx <= last_col:
+                record_type = struct.unpack_from("<H", raw)[0]
+                if record_type in (_MULRK, _MULBLANK):
+                    left, xf_index, right = _split_multi(raw, record_type, col_idx)
+                else:
+                    if record_type == _FORMULA and _is_shared_formula(raw, extras):
+                        raise XlsPatchUnsupported("Overwriting a shared or array formula cell.")
+                    left, xf_index, right = [], struct.unpack_from("<H", raw, 8)[0], []
+                new_cell = [col_idx, col_idx, _cell_record(row_idx, col_idx, xf_index, value, datemode), set()]
+                cells[i:i + 1] = left + [new_cell] + right
+                break
+        else:
+            xf_index = column_xf(col_idx)
+            if row_record is not None and struct.unpack_from("<H", row_record, 16)[0] & _ROW_GHOST_DIRTY:
+                xf_index = struct.unpack_from("<H", row_record, 18)[0] & 0x0FFF
+            position = sum(1 for cell in cells if cell[0] < col_idx)
+            cells.insert(position, [col_idx, col_idx, _cell_record(row_idx, col_idx, xf_index, value, datemode), set()])
+
+        # Widen (or create) the ROW record's column range
+        if row_record is None:
+            self.row_records[row_idx] = _record(_ROW, struct.pack(
+                "<8H", row_idx, col_idx, col_idx + 1, row_height, 0, 0, _ROW_OPTIONS, _DEFAULT_XF))
+        else:
+            first_col, col_after = struct.unpack_from("<HH", row_record, 6)
+            if first_col >= col_after:
+                first_col, col_after = col_idx, col_idx + 1
+            self.row_records[row_idx] = (row_record[:6] + struct.pack("<HH", min(first_col, col_idx), max(col_after, col_idx + 1))
+                                         + row_record[10:])
+        self.add_row(row_idx)
+
+    def to_bytes(self):
+        """Serializes the segment: ROW records, cells and DBCELL, or ROW + cells per row."""
+        row_indexes = sorted(set(self.row_records) | set(self.cells))
+        if not self.with_dbcell:
+            return b"".join(self.row_records.get(row_idx, b"") + b"".join(cell[2] for cell in self.cells.get(row_idx, ()))
+                            for row_idx in row_indexes)
+
+        parts = [self.row_records[row_idx] for row_idx in row_indexes if row_idx in self.row_records]
+        position = sum(len(part) for part in parts)
+        first_cell_offsets = []
+        for row_idx in row_indexes:
+            if row_idx in self.row_records:
+                first_cell_offsets.append(position)
+            for cell in self.cells.get(row_idx, ()):
+                parts.append(cell[2])
+                position += len(cell[2])
+        # The first offset counts from the second ROW record, the rest from the previous row's first cell
+        pointers = [offset - previous for offset, previous in
+                    zip(first_cell_offsets, [_ROW_RECORD_SIZE] + first_cell_offsets[:-1])]
+        if any(pointer > 0xFFFF for pointer in pointers):
+            raise XlsPatchUnsupported("Row block too large for its DBCELL offsets.")
+        parts.append(_record(_DBCELL, struct.pack(f"<I{len(pointers)}H", position, *pointers)))
+        return b"".join(parts)
+
+def _scan_sheet(stream, start):
+    """
+    Walks the worksheet substream at `start` once, without copying records.
+
+    Returns:
+        dict: 'end' (offset after its EOF), the settings records before the cell
+              table ('dimensions', 'index', 'column_xfs', 'row_height'), the cell
+              table range ('table_start', 'table_end'), 'with_dbcell', the table's
+              'segments' in row order and 'row_owner' (row -> segment).
+    """
+    unpack_header, unpack_row = _RECORD_HEADER.unpack_from, _ROW_INDEX.unpack_from
+    sheet = {"dimensions": None, "index": None, "column_xfs": [], "row_height": _DEFAULT_ROW_HEIGHT,
+             "table_start": None, "table_end": None, "with_dbcell": False}
+    segments, row_owner = [], {}
+    segment, table_state, depth = None, _BEFORE_TABLE, 0
+    offset, stream_end = start, len(stream)
+
+    while offset + 4 <= stream_end:
+        record_type, length = unpack_header(stream, offset)
+        if depth == 1 and record_type in _CELL_TABLE_RECORDS:
+            if table_state != _IN_TABLE:
+                if table_state == _AFTER_TABLE:
+                    raise XlsPatchUnsupported("Unexpected records inside the cell table.")
+                table_state, sheet["table_start"] = _IN_TABLE, offset
+                sheet["with_dbcell"] = sheet["index"] is not None
+            with_dbcell = sheet["with_dbcell"]
+
+            if record_type == _DBCELL:
+                if not with_dbcell:
+                    raise XlsPatchUnsupported("DBCELL records in a sheet without an INDEX record.")
+                if segment is None:
+                    raise XlsPatchUnsupported("Row segment without rows.")
+                segment.dbcell, segment.end, segment = offset, offset + 4 + length, None
+            elif record_type in _FORMULA_EXTRAS:
+                if segment is None:
+                    raise XlsPatchUnsupported("Formula record without its cell.")
+            else:
+                row_idx = unpack_row(stream, offset + 4)[0]
+                # xlwt layout: every ROW record, or a cell of another row, starts a segment
+                if segment is None or (not with_dbcell and (record_type == _ROW or row_idx != segment.first_row)):
+                    if segments and row_idx <= segments[-1].last_row:
+                        raise XlsPatchUnsupported("Rows are not stored in ascending order.")
+                    if segment is not None:
+                        segment.end = offset
+                    segment = _RowSegment(with_dbcell, offset, row_idx)
+                    segments.append(segment)
+                owner = row_owner.get(row_idx)
+                if owner is None:
+                    row_owner[row_idx] = segment
+                    segment.add_row(row_idx)
+                elif owner is not segment:
+                    raise XlsPatchUnsupported(f"Row {row_idx + 1} is spread over several row segments.")
+                if record_type == _ROW:
+                    segment.original_row_count += 1
+        else:
+            if table_state == _IN_TABLE:
+                table_state, sheet["table_end"] = _AFTER_TABLE, offset
+                if segment is not None:
+                    if sheet["with_dbcell"]:
+                        raise XlsPatchUnsupported("Cell records after the last DBCELL.")
+                    segment.end, segment = offset, None
+
+            if record_type == _BOF:
+                depth += 1
+            elif depth == 0:
+                raise XlsPatchUnsupported(f"No BOF record at stream offset {start}.")
+            elif record_type == _EOF:
+                depth -= 1
+                if depth == 0:
+                    sheet["end"] = offset + 4 + length
+                    break
+            elif depth == 1 and table_state == _BEFORE_TABLE:
+                if record_type == _DIMENSIONS:
+                    sheet["dimensions"] = offset
+                    # An empty sheet gets its cell table right after DIMENSIONS
+                    sheet["table_start"] = sheet["table_end"] = offset + 4 + length
+                elif record_type == _INDEX:
+                    sheet["index"] = (offset, length)
+                elif record_type == _COLINFO:
+                    sheet["column_xfs"].append(struct.unpack_from("<HHHH", stream, offset + 4))
+                elif record_type == _DEFAULTROWHEIGHT:
+                    sheet["row_height"] = struct.unpack_from("<H", stream, offset + 6)[0] or _DEFAULT_ROW_HEIGHT
+        offset += 4 + length
+    else:
+        raise XlsPatchUnsupported(f"Substream at stream offset {start} has no EOF record.")
+
+    if sheet["dimensions"] is None or sheet["dimensions"] > sheet["table_start"]:
+        raise XlsPatchUnsupported("Sheet has no DIMENSIONS record before its cells.")
+    sheet["segments"], sheet["row_owner"] = segments, row_owner
+    return sheet
+
+def _place_new_row(segments, first_rows, row_idx, with_dbcell):
+    """
+    Returns the segment a new row goes into, inserting a new one into `segments`
+    if needed. `first_rows` holds each segment's first row, for the search.
+    """
+    following = bisect.bisect_right(first_rows, row_idx)
+    if with_dbcell and following > 0:
+        previous = segments[following - 1]
+        if previous.row_count < _ROWS_PER_BLOCK:
+            return previous
+        if previous.last_row > row_idx:
+            raise XlsPatchUnsupported("Row block is full.")
+    if with_dbcell and following < len(segments) and segments[following].row_count < _ROWS_PER_BLOCK:
+        first_rows[following] = row_idx
+        return segments[following]
+    segment = _RowSegment(with_dbcell)
+    segment.row_records, segment.cells = {}, {}
+    segments.insert(following, segment)
+    first_rows.insert(following, row_idx)
+    return segment
+
+def _assemble_table(stream, segments):
+    """
+    Joins the cell table back together: runs of untouched segments are copied
+    as single slices, edited ones are rebuilt.
+
+    Returns:
+        tuple: (table bytes, DBCELL offsets relative to the table start)
+    """
+    chunks, dbcells, position, run = [], [], 0, None
+    for segment in segments:
+        if segment.cells is None:
+            if run is not None and run[1] == segment.start:
+                run[1] = segment.end
+            else:
+                if run is not None:
+                    chunks.append(stream[run[0]:run[1]])
+                run = [segment.start, segment.end]
+            size, dbcell = segment.end - segment.start, segment.dbcell - segment.start
+        else:
+            if run is not None:
+                chunks.append(stream[run[0]:run[1]])
+                run = None
+            piece = segment.to_bytes()
+            chunks.append(piece)
+            size = len(piece)
+            dbcell = size - (8 + 2 * segment.row_count)
+        dbcells.append(position + dbcell)
+        position += size
+    if run is not None:
+        chunks.append(stream[run[0]:run[1]])
+    return b"".join(chunks), dbcells
+
+def _patch_sheet(stream, start, updates_by_row, datemode):
+    """
+    Applies {row: {col: value}} updates to the worksheet substream at `start`.
+
+    Returns:
+        tuple: (new substream bytes, end offset of the old substream)
+    """
+    sheet = _scan_sheet(stream, start)
+    segments, row_owner, with_dbcell = sheet["segments"], sheet["row_owner"], sheet["with_dbcell"]
+    original_dbcells = [segment.dbcell for segment in segments] if with_dbcell else []
+
+    def column_xf(col_idx):
+        for first_col, last_col, _, xf_index in sheet["column_xfs"]:
+            if first_col <= col_idx <= last_col:
+                return xf_index
+        return _DEFAULT_XF
+
+    # Load only the segments that hold edited rows
+    first_rows = [segment.first_row for segment in segments]
+    for row_idx in sorted(updates_by_row):
+        segment = row_owner.get(row_idx)
+        if segment is None:
+            segment = _place_new_row(segments, first_rows, row_idx, with_dbcell)
+            row_owner[row_idx] = segment
+        if segment.cells is None:
+            segment.load(stream)
+        for col_idx, value in sorted(updates_by_row[row_idx].items()):
+            segment.set_cell(row_idx, col_idx, value, datemode, column_xf, sheet["row_height"])
+
+    # Settings records before the cell table: DIMENSIONS grows to cover the new cells
+    pre = bytearray(stream[start:sheet["table_start"]])
+    dimensions = sheet["dimensions"] - start + 4
+    row_mic, row_mac, col_mic, col_mac = struct.unpack_from("<IIHH", pre, dimensions)
+    edit_rows = list(updates_by_row)
+    edit_cols = [col_idx for row_updates in updates_by_row.values() for col_idx in row_updates]
+    if row_mac <= row_mic or col_mac <= col_mic:
+        row_mic, row_mac, col_mic, col_mac = min(edit_rows), max(edit_rows) + 1, min(edit_cols), max(edit_cols) + 1
+    struct.pack_into("<IIHH", pre, dimensions, min(row_mic, min(edit_rows)), max(row_mac, max(edit_rows) + 1),
+                     min(col_mic, min(edit_cols)), max(col_mac, max(edit_cols) + 1))
+
+    table, dbcells = _assemble_table(stream, segments)
+    if sheet["index"] is not None:
+        pre = _rebuild_index(stream, pre, start, sheet["index"], original_dbcells, dbcells, edit_rows)
+    return bytes(pre) + table + bytes(stream[sheet["table_end"]:sheet["end"]]), sheet["end"]
+
+def _rebuild_index(stream, pre, start, index, original_dbcells, dbcells, edit_rows):
+    """
+    Returns the pre-table bytes with the INDEX record pointing at the new DBCELL
+    positions (`dbcells`, relative to the start of the cell table).
+    """
+    offset, length = index
+    _, row_mic, row_mac, default_width_pos = struct.unpack_from("<4I", stream, offset + 4)
+    old_pointers = list(struct.unpack_from(f"<{(length - 16) // 4}I", stream, offset + 20))
+    if old_pointers != original_dbcells:
+        raise XlsPatchUnsupported("INDEX record does not match the sheet's row blocks.")
+
+    growth = 4 * (len(dbcells) - len(old_pointers))
+    if default_width_pos > offset:
+        default_width_pos += growth
+    if row_mac <= row_mic:
+        row_mic, row_mac = min(edit_rows), max(edit_rows) + 1
+    row_mic, row_mac = min(row_mic, min(edit_rows)), max(row_mac, max(edit_rows) + 1)
+
+    table_start = start + len(pre) + growth
+    pointers = [table_start + dbcell for dbcell in dbcells]
+    record = _record(_INDEX, struct.pack(f"<4I{len(pointers)}I", 0, row_mic, row_mac, default_width_pos, *pointers))
+    local = offset - start
+    return pre[:local] + record + pre[local + 4 + length:]
+
+def _shift_index(stream, tail, tail_start, sheet_start, delta):
+    """Moves the absolute pointers in the INDEX record of a later sheet by `delta` bytes."""
+    for offset, record_type, length in _iter_records(stream, sheet_start):
+        if record_type == _INDEX:
+            values = list(struct.unpack_from(f"<{length // 4}I", stream, offset + 4))
+            for i in range(3, len(values)):
+                if values[i]:
+                    values[i] += delta
+            struct.pack_into(f"<{len(values)}I", tail, offset - tail_start + 4, *values)
+            return
+        if record_type in (_DIMENSIONS, _ROW, _EOF) or record_type in _CELL_RECORDS:
+            return
+
+def _patch_workbook_stream(stream, sheet_name, updates_by_row):
+    """Returns the Workbook stream with the updates applied to one sheet."""
+    globals_records = _substream_records(stream, 0)
+    if struct.unpack_from("<H", stream, 4)[0] != _BIFF8_VERSION:
+        raise XlsPatchUnsupported("Only BIFF8 workbooks can be patched.")
+    globals_end = globals_records[-1][0] + 4 + globals_records[-1][2]
+
+    datemode, sheets = 0, []
+    for offset, record_type, _, _ in globals_records:
+        if record_type == _FILEPASS:
+            raise XlsPatchUnsupported("Workbook is encrypted.")
+        if record_type == _DATEMODE:
+            datemode = struct.unpack_from("<H", stream, offset + 4)[0]
+        elif record_type == _BOUNDSHEET:
+            sheets.append((offset, struct.unpack_from("<I", stream, offset + 4)[0], _boundsheet_name(stream, offset)))
+
+    target = next((position for _, position, name in sheets if name == sheet_name), None)
+    if target is None:
+        raise KeyError(sheet_name)
+    if target < globals_end:
+        raise XlsPatchUnsupported("Sheet position points into the workbook globals.")
+
+    sheet_bytes, sheet_end = _patch_sheet(stream, target, updates_by_row, datemode)
+    delta = len(sheet_bytes) - (sheet_end - target)
+    head, tail = bytearray(stream[:target]), bytearray(stream[sheet_end:])
+    if delta:
+        for offset, position, _ in sheets:
+            if position > target:
+                if position < sheet_end:
+                    raise XlsPatchUnsupported("Sheets overlap in the Workbook stream.")
+                struct.pack_into("<I", head, offset + 4, position + delta)
+                _shift_index(stream, tail, sheet_end, position, delta)
+    return bytes(head) + sheet_bytes + bytes(tail)
+
+# --------------------------
+# Core Functions
+# --------------------------
+
+def patch_xls_cells(file_path, sheet_name, cell_updates, output_path=None, file_contents=None):
+    """
+    Applies cell updates to one sheet of an .xls file by rewriting only the
+    changed cell records. Everything else in the file stays byte-identical,
+    apart from the offsets and extents that have to follow the edit.
+
+    Args:
+        file_path (str): Path to the .xls file.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+                             Supported values: str, int, float, bool, date/datetime/time and None.
+        output_path (str): Where to write the result. Defaults to overwriting file_path.
+        file_contents: Optional bytes / mmap of the file already read by the caller.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+        ValueError / TypeError: If a cell reference or value is invalid.
+        XlsPatchUnsupported: If the workbook cannot be patched safely.
+    """
+    output_path = output_path or file_path
+    updates_by_row = {}
+    for cell_ref, value in cell_updates.items():
+        row_idx, col_idx = parse_cell_ref(cell_ref)
+        updates_by_row.setdefault(row_idx, {})[col_idx] = value
+    if not updates_by_row:
+        return
+
+    if file_contents is None:
+        with open(file_path, 'rb') as f:
+            data = bytearray(f.read())
+    else:
+        data = bytearray(file_contents)
+    container = _CompoundFile(data)
+    entry, start, size = container.find_stream("Workbook")
+    stream = container.read_stream(start, size)
+    container.write_stream(entry, start, _patch_workbook_stream(stream, sheet_name, updates_by_row))
+
+    # Write next to the destination and swap in atomically
+    fd, temp_path = tempfile.mkstemp(suffix=".xls", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(container.data)
+        # mkstemp creates the file as 0600; keep the permissions of the file being replaced
+        shutil.copymode(output_path if os.path.exists(output_path) else file_path, temp_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,581 @@
+"""
+xlsx_package_utils.py - Low-level access to the parts inside an .xlsx package
+Requires: only the standard library
+
+An .xlsx file is a zip archive of XML parts. These helpers work on the parts
+directly instead of loading the whole workbook through openpyxl:
+
+- Resolve a sheet name to its worksheet XML part.
+- Read the shared-strings table.
+- Patch cells inside one worksheet part and rebuild the archive, copying every
+  other member's compressed bytes through unchanged. When a formula cell is
+  overwritten, the calculation chain (xl/calcChain.xml) is dropped so Excel
+  rebuilds it instead of asking to repair the file. Dates are written as serial
+  numbers with a date number format, adding the cell style to xl/styles.xml if
+  the workbook has none that fits.
+"""
+
+import os
+import re
+import zlib
+import struct
+import shutil
+import zipfile
+import tempfile
+import posixpath
+from datetime import datetime, date, time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# Zip record layouts (see APPNOTE.TXT sections 4.3.7, 4.3.12 and 4.3.16)
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+_END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+_ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP_FLAG_UTF8 = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+_ROW_RE = re.compile(r'<(?P<p>(?:[A-Za-z_][\w.-]*:)?)row\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)row>)', re.S)
+_CELL_RE = re.compile(r'<(?P<p>(?:[A-Za-z_][\w.-]*:)?)c\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)c>)', re.S)
+_SHEET_DATA_RE = re.compile(r'<(?P<p>(?:[A-Za-z_][\w.-]*:)?)sheetData\b[^>]*?(?:/>|>(?P<body>.*?)</(?P=p)sheetData>)', re.S)
+_DIMENSION_RE = re.compile(r'(<(?:[A-Za-z_][\w.-]*:)?dimension\b[^>]*?\sref=")([^"]*)(")')
+_CELL_REF_RE = re.compile(r"([A-Za-z]+)([0-9]+)$")
+_FORMULA_RE = re.compile(r'<(?:[A-Za-z_][\w.-]*:)?f\b')
+_CELL_XFS_RE = re.compile(r'<(?P<p>(?:[A-Za-z_][\w.-]*:)?)cellXfs\b(?P<attrs>[^>]*?)>(?P<body>.*?)</(?P=p)cellXfs>', re.S)
+_XF_RE = re.compile(r'<(?P<p>(?:[A-Za-z_][\w.-]*:)?)xf\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)xf>)', re.S)
+
+CALC_CHAIN_PART = "xl/calcChain.xml"
+STYLES_PART = "xl/styles.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def col_letters_to_idx(letters):
+    """Convert Excel-style letters to a one-based column index ('A' -> 1)"""
+    idx = 0
+    for char in letters.upper():
+        idx = idx * 26 + (ord(char) - 64)
+    return idx
+
+def col_idx_to_letters(col_idx):
+    """Convert a one-based column index to Excel-style letters (1 -> 'A')"""
+    letters = ''
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(remainder + 65) + letters
+    return letters
+
+def parse_cell_ref(cell_ref):
+    """Split a cell reference into one-based (row, column) numbers ('C5' -> (5, 3))."""
+    match = _CELL_REF_RE.match(cell_ref.strip())
+    if not match:
+        raise ValueError(f"Invalid cell reference format - {cell_ref}")
+    col_letters, row_num = match.groups()
+    return int(row_num), col_letters_to_idx(col_letters)
+
+def _get_attr(attrs, name):
+    """Returns the value of an XML attribute from a raw attribute string, or None."""
+    match = re.search(r'(?:^|\s)' + re.escape(name) + r'="([^"]*)"', attrs)
+    return match.group(1) if match else None
+
+def _set_attr(attrs, name, value):
+    """Sets (or adds) an XML attribute in a raw attribute string."""
+    pattern = re.compile(r'((?:^|\s)' + re.escape(name) + r'=")[^"]*(")')
+    if pattern.search(attrs):
+        return pattern.sub(lambda m: m.group(1) + value + m.group(2), attrs, count=1)
+    return f' {name}="{value}"' + attrs
+
+def get_xlsx_sheet_part(zf, sheet_name):
+    """
+    Returns the archive path of a worksheet's XML part (e.g. 'xl/worksheets/sheet1.xml').
+
+    Args:
+        zf (zipfile.ZipFile): The open .xlsx package.
+        sheet_name (str): Name of the worksheet.
+
+    Raises:
+        KeyError: If the workbook has no sheet with that name.
+    """
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{{{NS_PKG_REL}}}Relationship")}
+
+    for sheet in workbook.iter(f"{{{NS_MAIN}}}sheet"):
+        if sheet.get("name") == sheet_name:
+            target = targets[sheet.get(f"{{{NS_REL}}}id")]
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise KeyError(f"Sheet '{sheet_name}' not found.")
+
+def read_xlsx_shared_strings(zf):
+    """
+    Returns the workbook's shared-strings table as a list (empty if the part is missing).
+    Rich-text entries are flattened to their plain text; phonetic runs are skipped.
+    """
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    t_tag, r_tag = f"{{{NS_MAIN}}}t", f"{{{NS_MAIN}}}r"
+    strings = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == f"{{{NS_MAIN}}}si":
+                parts = [child.text or "" for child in element if child.tag == t_tag]
+                for run in element.iter(r_tag):
+                    parts.extend(t.text or "" for t in run if t.tag == t_tag)
+                strings.append("".join(parts))
+                element.clear()
+    return strings
+
+# Built-in number formats that display dates or times (ECMA-376 18.8.30)
+BUILTIN_DATE_FORMAT_IDS = frozenset(range(14, 23)) | {45, 46, 47}
+
+# Built-in number formats given to written dates ('mm-dd-yy', 'h:mm:ss', 'm/d/yy h:mm')
+DATE_FORMAT_ID = 14
+TIME_FORMAT_ID = 21
+DATETIME_FORMAT_ID = 22
+
+def is_date_format(format_code):
+    """Returns True if an Excel number format code displays a date or time."""
+    # Ignore quoted text, [colour]/[locale] sections and escaped or padding characters
+    stripped = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.|_.|\*.', "", format_code)
+    return re.search(r"[dmyhs]", stripped, re.I) is not None
+
+def read_xlsx_date_styles(zf):
+    """
+    Returns the set of cell style indices (the s="..." attribute of a cell) whose
+    number format is a date or time, so numeric cells with those styles can be
+    returned as datetimes.
+    """
+    if STYLES_PART not in zf.namelist():
+        return set()
+    return _parse_date_styles(zf.read(STYLES_PART))
+
+def _parse_date_styles(styles_xml):
+    """Returns the indices of the cellXfs entries of a styles part that display dates or times."""
+    styles = ET.fromstring(styles_xml)
+    custom_formats = {
+        int(fmt.get("numFmtId")): fmt.get("formatCode", "")
+        for fmt in styles.iter(f"{{{NS_MAIN}}}numFmt")
+    }
+    date_styles = set()
+    cell_xfs = styles.find(f"{{{NS_MAIN}}}cellXfs")
+    for style_idx, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+        fmt_id = int(xf.get("numFmtId", 0))
+        if fmt_id in custom_formats:
+            if is_date_format(custom_formats[fmt_id]):
+                date_styles.add(style_idx)
+        elif fmt_id in BUILTIN_DATE_FORMAT_IDS:
+            date_styles.add(style_idx)
+    return date_styles
+
+def read_xlsx_date1904(zf):
+    """Returns True if the workbook uses the 1904 date system."""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    props = workbook.find(f"{{{NS_MAIN}}}workbookPr")
+    return props is not None and props.get("date1904") in ("1", "true")
+
+def to_excel_serial(value, date1904=False):
+    """
+    Converts a date, datetime or time to an Excel serial number the way openpyxl
+    does, including the 1900 leap-year bug for dates before 1900-03-01.
+    """
+    if isinstance(value, time):
+        return (value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6) / 86400
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    delta = value.replace(tzinfo=None) - (datetime(1904, 1, 1) if date1904 else datetime(1899, 12, 30))
+    days = delta.days
+    if not date1904 and 0 < days <= 60:
+        days -= 1
+    return days + (delta.seconds + delta.microseconds / 1e6) / 86400
+
+def read_xlsx_dimension(file_path, sheet_name):
+    """
+    Returns the (last_row, last_col) declared by a sheet's <dimension> tag,
+    reading only the start of the worksheet XML.
+
+    Only full ranges ("A1:Z500") are returned. A single-cell ref ("A1") is what
+    many writers put there without meaning it, so it yields None, as does a
+    missing tag.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    with zipfile.ZipFile(file_path) as zf, zf.open(get_xlsx_sheet_part(zf, sheet_name)) as part:
+        # <dimension> comes before <sheetData>, so the first few KB always hold it
+        head = part.read(64 * 1024).decode("utf-8", errors="ignore")
+    match = _DIMENSION_RE.search(head)
+    if not match or ":" not in match.group(2):
+        return None
+    try:
+        return parse_cell_ref(match.group(2).split(":")[-1])
+    except ValueError:
+        return None
+
+class DateStyles:
+    """
+    Turns date values into (serial number, cell style) pairs for patching.
+
+    A cell whose style already displays a date keeps it. Any other cell gets a
+    copy of its style (font, fill, border, ...) with a built-in date number
+    format, added to the cellXfs list of xl/styles.xml once per base style and
+    format. `styles_xml` holds the patched styles part, or None while nothing
+    was added.
+
+    Args:
+        styles_xml (bytes): The workbook's xl/styles.xml.
+        date1904 (bool): True if the workbook uses the 1904 date system.
+    """
+
+    def __init__(self, styles_xml, date1904=False):
+        self._original = styles_xml.decode("utf-8")
+        match = _CELL_XFS_RE.search(self._original)
+        if not match:
+            raise ValueError("Workbook styles have no <cellXfs> list to add a date style to.")
+        self._prefix = match.group("p")
+        self._xfs = [xf.group(0) for xf in _XF_RE.finditer(match.group("body"))]
+        self._date_styles = _parse_date_styles(styles_xml)
+        self._added = {}
+        self.date1904 = date1904
+        self.styles_xml = None
+
+    def convert(self, value, style):
+        """Returns (serial, style index) for a date, datetime or time written over a cell with `style`."""
+        base = int(style) if style is not None else 0
+        if base in self._date_styles:
+            return to_excel_serial(value, self.date1904), str(base)
+        if isinstance(value, datetime):
+            fmt_id = DATETIME_FORMAT_ID
+        elif isinstance(value, date):
+            fmt_id = DATE_FORMAT_ID
+        else:
+            fmt_id = TIME_FORMAT_ID
+        if (base, fmt_id) not in self._added:
+            self._added[(base, fmt_id)] = self._add_xf(base, fmt_id)
+        return to_excel_serial(value, self.date1904), str(self._added[(base, fmt_id)])
+
+    def _add_xf(self, base, fmt_id):
+        """Returns the index of a copy of cellXfs entry `base` with number format `fmt_id`, adding it if needed."""
+        if base < len(self._xfs):
+            template = self._xfs[base]
+        else:
+            template = f'<{self._prefix}xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        xf = _XF_RE.match(template)
+        attrs = _set_attr(_set_attr(xf.group("attrs"), "numFmtId", str(fmt_id)), "applyNumberFormat", "1")
+        new_xf = template[:xf.start("attrs")] + attrs + template[xf.end("attrs"):]
+        # An earlier save may already have added the same style
+        if new_xf in self._xfs:
+            return self._xfs.index(new_xf)
+        self._xfs.append(new_xf)
+        self._date_styles.add(len(self._xfs) - 1)
+
+        match = _CELL_XFS_RE.search(self._original)
+        attrs = match.group("attrs")
+        if _get_attr(attrs, "count") is not None:
+            attrs = _set_attr(attrs, "count", str(len(self._xfs)))
+        self.styles_xml = (self._original[:match.start()]
+                           + f'<{self._prefix}cellXfs{attrs}>{"".join(self._xfs)}</{self._prefix}cellXfs>'
+                           + self._original[match.end():]).encode("utf-8")
+        return len(self._xfs) - 1
+
+# --------------------------
+# Worksheet XML Patching
+# --------------------------
+
+def _build_cell_xml(prefix, cell_ref, value, style):
+    """Builds the XML for a single cell. Strings are written inline so that the
+    shared-strings part does not have to change."""
+    style_attr = f' s="{style}"' if style is not None else ""
+    if value is None:
+        return f'<{prefix}c r="{cell_ref}"{style_attr}/>'
+    if isinstance(value, bool):
+        return f'<{prefix}c r="{cell_ref}"{style_attr} t="b"><{prefix}v>{int(value)}</{prefix}v></{prefix}c>'
+    if isinstance(value, (int, float)):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise ValueError(f"Cannot write non-finite number to {cell_ref}")
+        return f'<{prefix}c r="{cell_ref}"{style_attr}><{prefix}v>{value!r}</{prefix}v></{prefix}c>'
+    if isinstance(value, str):
+        return (f'<{prefix}c r="{cell_ref}"{style_attr} t="inlineStr"><{prefix}is>'
+                f'<{prefix}t xml:space="preserve">{escape(value)}</{prefix}t></{prefix}is></{prefix}c>')
+    raise TypeError(f"Unsupported value type for {cell_ref}: {type(value).__name__}")
+
+def _patch_row_body(prefix, row_num, body, row_updates, replaced_formulas=None, date_styles=None):
+    """
+    Returns the new inner XML of a row with the given {column: value} updates
+    applied. References of overwritten formula cells are appended to
+    `replaced_formulas`; dates are converted through `date_styles` (a DateStyles).
+    """
+    cells = []
+    col = 0
+    for match in _CELL_RE.finditer(body or ""):
+        ref = _get_attr(match.group("attrs"), "r")
+        col = parse_cell_ref(ref)[1] if ref else col + 1
+        cells.append([col, match.group(0), match.group("attrs")])
+
+    existing = {cell[0]: cell for cell in cells}
+    for col, value in row_updates.items():
+        cell_ref = f"{col_idx_to_letters(col)}{row_num}"
+        style = _get_attr(existing[col][2], "s") if col in existing else None
+        if date_styles is not None and isinstance(value, (datetime, date, time)):
+            value, style = date_styles.convert(value, style)
+        if col in existing:
+            if replaced_formulas is not None and _FORMULA_RE.search(existing[col][1]):
+                replaced_formulas.append(cell_ref)
+            existing[col][1] = _build_cell_xml(prefix, cell_ref, value, style)
+        else:
+            cells.append([col, _build_cell_xml(prefix, cell_ref, value, style), ""])
+
+    cells.sort(key=lambda cell: cell[0])
+    # Cells without an explicit r attribute rely on their position, so give every
+    # cell an explicit reference once the row has been rebuilt
+    parts = []
+    for col, xml, attrs in cells:
+        if not _get_attr(attrs, "r") and col not in row_updates:
+            xml = xml.replace(f"<{prefix}c", f'<{prefix}c r="{col_idx_to_letters(col)}{row_num}"', 1)
+        parts.append(xml)
+    return "".join(parts)
+
+def patch_sheet_xml(sheet_xml, cell_updates, replaced_formulas=None, date_styles=None):
+    """
+    Applies cell updates to the text of a worksheet XML part.
+
+    Only the <row> elements that contain updated cells are rewritten; every other
+    byte of the part is kept as it was. Updated cells keep their style index and
+    lose any formula. Rows and cells that do not exist yet are inserted in order.
+
+    Args:
+        sheet_xml (str): The worksheet XML.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+        replaced_formulas (list): Optional list that receives the references of
+                                  the formula cells that were overwritten.
+        date_styles (DateStyles): Converts date values and picks their date style.
+                                  Without it, date values are rejected.
+
+    Returns:
+        str: The patched worksheet XML.
+    """
+    updates_by_row = {}
+    for cell_ref, value in cell_updates.items():
+        row_num, col = parse_cell_ref(cell_ref)
+        updates_by_row.setdefault(row_num, {})[col] = value
+
+    sheet_data = _SHEET_DATA_RE.search(sheet_xml)
+    if not sheet_data:
+        raise ValueError("Worksheet has no <sheetData> element.")
+    prefix = sheet_data.group("p")
+    body = sheet_data.group("body") or ""
+    body_start = sheet_data.start("body") if sheet_data.group("body") is not None else None
+
+    pieces = []
+    last_end = 0
+    row_num = 0
+    pending_rows = sorted(updates_by_row)
+
+    def new_row(num):
+        return (f'<{prefix}row r="{num}">'
+                f'{_patch_row_body(prefix, num, "", updates_by_row[num], date_styles=date_styles)}</{prefix}row>')
+
+    for match in _ROW_RE.finditer(body):
+        ref = _get_attr(match.group("attrs"), "r")
+        row_num = int(ref) if ref else row_num + 1
+
+        # Insert brand-new rows that belong before this one
+        while pending_rows and pending_rows[0] < row_num:
+            pieces.append(body[last_end:match.start()])
+            last_end = match.start()
+            pieces.append(new_row(pending_rows.pop(0)))
+
+        if pending_rows and pending_rows[0] == row_num:
+            pending_rows.pop(0)
+            attrs = match.group("attrs") if ref else _set_attr(match.group("attrs"), "r", str(row_num))
+            # spans is only a hint and may no longer be accurate once cells are added
+            attrs = re.sub(r'\sspans="[^"]*"', '', attrs)
+            new_body = _patch_row_body(prefix, row_num, match.group("body"), updates_by_row[row_num],
+                                       replaced_formulas, date_styles)
+            pieces.append(body[last_end:match.start()])
+            pieces.append(f"<{prefix}row{attrs}>{new_body}</{prefix}row>")
+            last_end = match.end()
+        elif not ref:
+            # Rows without an r attribute are numbered by position, which inserted
+            # rows would shift, so give them an explicit number
+            attrs = _set_attr(match.group("attrs"), "r", str(row_num))
+            pieces.append(body[last_end:match.start()])
+            pieces.append(f"<{prefix}row{attrs}" + body[match.end("attrs"):match.end()])
+            last_end = match.end()
+
+    pieces.append(body[last_end:])
+    for num in pending_rows:
+        pieces.append(new_row(num))
+    new_body = "".join(pieces)
+
+    if body_start is None:
+        new_sheet_data = f"<{prefix}sheetData>{new_body}</{prefix}sheetData>"
+        sheet_xml = sheet_xml[:sheet_data.start()] + new_sheet_data + sheet_xml[sheet_data.end():]
+    else:
+        sheet_xml = sheet_xml[:body_start] + new_body + sheet_xml[sheet_data.end("body"):]
+
+    return _expand_dimension(sheet_xml, updates_by_row)
+
+def _expand_dimension(sheet_xml, updates_by_row):
+    """Grows the <dimension ref="..."> range so it covers every updated cell."""
+    match = _DIMENSION_RE.search(sheet_xml)
+    if not match or not updates_by_row:
+        return sheet_xml
+    bounds = match.group(2).split(":")
+    try:
+        (min_row, min_col), (max_row, max_col) = parse_cell_ref(bounds[0]), parse_cell_ref(bounds[-1])
+    except ValueError:
+        return sheet_xml
+    for row_num, row_updates in updates_by_row.items():
+        min_row, max_row = min(min_row, row_num), max(max_row, row_num)
+        min_col, max_col = min(min_col, *row_updates), max(max_col, *row_updates)
+    new_ref = f"{col_idx_to_letters(min_col)}{min_row}:{col_idx_to_letters(max_col)}{max_row}"
+    return sheet_xml[:match.start(2)] + new_ref + sheet_xml[match.end(2):]
+
+# --------------------------
+# Archive Rewriting
+# --------------------------
+
+def _dos_datetime(date_time):
+    """Converts a ZipInfo.date_time tuple to (dos_time, dos_date)."""
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+def _encode_filename(info):
+    """Encodes a member name the way the zip format expects, returning (bytes, flag_bits)."""
+    flags = info.flag_bits & ~_ZIP_FLAG_DATA_DESCRIPTOR
+    try:
+        return info.filename.encode("ascii"), flags & ~_ZIP_FLAG_UTF8
+    except UnicodeEncodeError:
+        return info.filename.encode("utf-8"), flags | _ZIP_FLAG_UTF8
+
+def rewrite_zip_members(src_path, dst_path, replacements, removals=()):
+    """
+    Writes a copy of a zip archive with some members replaced.
+
+    Unchanged members are copied as raw compressed bytes (no decompression or
+    recompression), so their data is byte-identical and the cost of the rewrite is
+    dominated by the replaced members.
+
+    Args:
+        src_path (str): Path of the source archive.
+        dst_path (str): Path of the archive to write.
+        replacements (dict): Mapping of member name to its new uncompressed bytes.
+        removals (iterable): Member names to leave out of the copy.
+    """
+    central_entries = []
+    with zipfile.ZipFile(src_path) as zf, open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        for info in zf.infolist():
+            if info.filename in removals:
+                continue
+            name_bytes, flags = _encode_filename(info)
+            dos_time, dos_date = _dos_datetime(info.date_time)
+
+            if info.filename in replacements:
+                data = replacements[info.filename]
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                payload = compressor.compress(data) + compressor.flush()
+                method, crc, file_size = zipfile.ZIP_DEFLATED, zlib.crc32(data), len(data)
+            else:
+                src.seek(info.header_offset)
+                header = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+                src.seek(header[10] + header[11], os.SEEK_CUR)
+                payload = src.read(info.compress_size)
+                method, crc, file_size = info.compress_type, info.CRC, info.file_size
+
+            offset = dst.tell()
+            if max(len(payload), file_size, offset) >= _ZIP32_LIMIT:
+                raise ValueError("Archives that need ZIP64 records are not supported.")
+
+            dst.write(_LOCAL_HEADER.pack(b"PK\x03\x04", 20, 0, flags, method, dos_time, dos_date,
+                                         crc, len(payload), file_size, len(name_bytes), 0))
+            dst.write(name_bytes)
+            dst.write(payload)
+            central_entries.append(_CENTRAL_DIR.pack(b"PK\x01\x02", 20, info.create_system, 20, 0, flags,
+                                                     method, dos_time, dos_date, crc, len(payload), file_size,
+                                                     len(name_bytes), 0, 0, 0, info.internal_attr,
+                                                     info.external_attr, offset) + name_bytes)
+
+        central_offset = dst.tell()
+        for entry in central_entries:
+            dst.write(entry)
+        central_size = dst.tell() - central_offset
+        dst.write(_END_OF_CENTRAL_DIR.pack(b"PK\x05\x06", 0, 0, len(central_entries), len(central_entries),
+                                           central_size, central_offset, 0))
+
+def patch_xlsx_cells(file_path, sheet_name, cell_updates, output_path=None):
+    """
+    Applies many cell updates to one sheet of an .xlsx file by rewriting only that
+    sheet's XML part. All other parts (styles, shared strings, drawings, other
+    sheets, ...) are carried over byte for byte.
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        cell_updates (dict): Mapping of cell reference (e.g., 'C5') to the value to set.
+                             Supported values: str, int, float, bool, date/datetime/time
+                             (written as serial numbers with a date format) and None.
+        output_path (str): Where to write the result. Defaults to overwriting file_path.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+        ValueError / TypeError: If a cell reference or value is invalid.
+    """
+    output_path = output_path or file_path
+    with zipfile.ZipFile(file_path) as zf:
+        part_name = get_xlsx_sheet_part(zf, sheet_name)
+        sheet_xml = zf.read(part_name).decode("utf-8")
+        date_styles = None
+        if any(isinstance(value, (datetime, date, time)) for value in cell_updates.values()):
+            if STYLES_PART not in zf.namelist():
+                raise ValueError("Workbook has no styles part to give date cells a date format.")
+            date_styles = DateStyles(zf.read(STYLES_PART), read_xlsx_date1904(zf))
+
+        replaced_formulas = []
+        replacements = {part_name: patch_sheet_xml(sheet_xml, cell_updates, replaced_formulas,
+                                                   date_styles).encode("utf-8")}
+        if date_styles is not None and date_styles.styles_xml is not None:
+            replacements[STYLES_PART] = date_styles.styles_xml
+        removals = ()
+        if replaced_formulas and CALC_CHAIN_PART in zf.namelist():
+            removals = (CALC_CHAIN_PART,)
+            replacements.update(_drop_calc_chain_references(zf))
+
+    # Write next to the destination and swap in atomically
+    fd, temp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    try:
+        rewrite_zip_members(file_path, temp_path, replacements, removals)
+        # mkstemp creates the file as 0600; keep the permissions of the file being replaced
+        shutil.copymode(output_path if os.path.exists(output_path) else file_path, temp_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def _drop_calc_chain_references(zf):
+    """
+    Returns the [Content_Types].xml and workbook relationships parts without
+    their calcChain entries. Excel rebuilds a missing calculation chain on load,
+    while a chain listing cells that no longer hold formulas makes it repair
+    the file.
+    """
+    replacements = {}
+    content_types = zf.read(CONTENT_TYPES_PART).decode("utf-8")
+    replacements[CONTENT_TYPES_PART] = re.sub(
+        r'<(?:[A-Za-z_][\w.-]*:)?Override\b[^>]*PartName="/' + re.escape(CALC_CHAIN_PART) + r'"[^>]*/>',
+        "", content_types).encode("utf-8")
+
+    rels_part = "xl/_rels/workbook.xml.rels"
+    if rels_part in zf.namelist():
+        rels = zf.read(rels_part).decode("utf-8")
+        replacements[rels_part] = re.sub(
+            r'<(?:[A-Za-z_][\w.-]*:)?Relationship\b[^>]*Type="[^"]*/calcChain"[^>]*/>', "", rels).encode("utf-8")
+    return replacements
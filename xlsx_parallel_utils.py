@@ -0,0 +1,308 @@
+"""
+xlsx_parallel_utils.py - Parallel reader for a single very large .xlsx worksheet
+Requires: only the standard library
+
+openpyxl parses a worksheet on one core. For Load Plan sheets with hundreds of
+thousands of rows this reader instead:
+
+1. Decompresses the worksheet XML once into a temporary file.
+2. Splits it into byte ranges that each start at a <row> element.
+3. Parses the ranges in a process pool. Every worker memory-maps the same
+   temporary file and receives the shared-strings table and date styles once,
+   when it starts.
+4. Merges the parsed rows back in row order. iter_xlsx_sheet_rows_parallel
+   yields them as the ranges finish, with only a few ranges parsed ahead.
+
+Values match openpyxl's read-only, data_only mode: shared and inline strings
+become str, numbers become int or float, date-styled numbers become datetime,
+ISO date cells (t="d") become date/datetime as in openpyxl and booleans become
+bool. Formulas yield their cached values.
+"""
+
+import os
+import re
+import mmap
+import shutil
+import zipfile
+import tempfile
+from collections import deque
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from xlsx_package_utils import (
+    NS_MAIN, get_xlsx_sheet_part, read_xlsx_shared_strings, read_xlsx_date_styles,
+    read_xlsx_date1904, col_letters_to_idx,
+)
+
+# Worksheet XML smaller than this is parsed with openpyxl in-process; starting a
+# process pool costs more than it saves on small sheets.
+PARALLEL_PARSE_MIN_BYTES = 16 * 1024 * 1024
+
+# Number of byte ranges per worker, so uneven ranges still balance out
+CHUNKS_PER_WORKER = 4
+
+# Largest byte range of worksheet XML parsed in one piece, and ranges per worker
+# parsed ahead of a streaming consumer; together they bound the rows in memory
+STREAM_CHUNK_BYTES = 8 * 1024 * 1024
+CHUNKS_AHEAD_PER_WORKER = 2
+
+_ROW_START_RE = re.compile(rb"<(?:[A-Za-z_][\w.-]*:)?row[\s>/]")
+_ROW_HAS_REF_RE = re.compile(rb"<(?:[A-Za-z_][\w.-]*:)?row\b[^>]*?\sr=\"")
+_WORKSHEET_START_RE = re.compile(rb"<(?P<p>(?:[A-Za-z_][\w.-]*:)?)worksheet\b[^>]*>")
+_SHEET_DATA_END_RE = re.compile(rb"</(?:[A-Za-z_][\w.-]*:)?sheetData>")
+_CELL_COL_RE = re.compile(r"[A-Za-z]+")
+
+_ROW_TAG = f"{{{NS_MAIN}}}row"
+_CELL_TAG = f"{{{NS_MAIN}}}c"
+_VALUE_TAG = f"{{{NS_MAIN}}}v"
+_INLINE_TAG = f"{{{NS_MAIN}}}is"
+_TEXT_TAG = f"{{{NS_MAIN}}}t"
+
+# Per-process parsing context, set up once by _init_worker
+_worker = {}
+
+# --------------------------
+# Helper Functions
+# --------------------------
+
+def _to_number(text):
+    """Casts a cell's <v> text the same way openpyxl does (int unless it has a '.' or exponent)."""
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+def _serial_to_datetime(serial, date1904):
+    """Converts an Excel serial number to a datetime (1900 or 1904 date system)."""
+    if date1904:
+        return datetime(1904, 1, 1) + timedelta(days=serial)
+    if 0 < serial < 60:
+        # Excel treats 1900 as a leap year, so serials before 1 March 1900 are off by one
+        serial += 1
+    return datetime(1899, 12, 30) + timedelta(days=serial)
+
+def _init_worker(xml_path, head, tail, shared_strings, date_styles, date1904):
+    """Process-pool initializer: maps the worksheet XML and stores the shared tables."""
+    f = open(xml_path, "rb")
+    _worker.update(
+        file=f,
+        data=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ),
+        head=head,
+        tail=tail,
+        shared_strings=shared_strings,
+        date_styles=date_styles,
+        date1904=date1904,
+    )
+
+def _parse_cell(cell, context):
+    """Returns the Python value of a <c> element, using the workbook tables in `context`."""
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        inline = cell.find(_INLINE_TAG)
+        return "".join(t.text or "" for t in inline.iter(_TEXT_TAG)) if inline is not None else None
+
+    value = cell.find(_VALUE_TAG)
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if cell_type == "s":
+        return context["shared_strings"][int(text)]
+    if cell_type == "b":
+        return text == "1"
+    if cell_type in ("str", "e"):
+        return text
+    if cell_type == "d":
+        # ISO 8601 date cells, read the way openpyxl reads them (date, datetime,
+        # time or timedelta)
+        from openpyxl.utils.datetime import from_ISO8601
+        return from_ISO8601(text)
+
+    number = _to_number(text)
+    style = cell.get("s")
+    if style is not None and int(style) in context["date_styles"]:
+        return _serial_to_datetime(number, context["date1904"])
+    return number
+
+def _parse_range(bounds):
+    """
+    Worker task: parses the rows in one byte range of the worksheet XML.
+
+    Returns:
+        list: (row_number, row_values) tuples, where row_values is a list of cell
+              values from column A up to the row's last cell.
+    """
+    start, end = bounds
+    return parse_sheet_rows_xml(_worker["head"] + _worker["data"][start:end] + _worker["tail"], _worker)
+
+def parse_sheet_rows_xml(xml, context):
+    """
+    Parses the <row> elements of a worksheet XML document (or of a fragment
+    wrapped in the worksheet's start and end tags).
+
+    Args:
+        xml (bytes): The XML to parse.
+        context (dict): The workbook's 'shared_strings' list, 'date_styles' set
+                        and 'date1904' flag.
+
+    Returns:
+        list: (row_number, row_values) tuples, where row_values is a list of cell
+              values from column A up to the row's last cell. Rows without an r
+              attribute are numbered from 1 within `xml`.
+    """
+    root = ET.fromstring(xml)
+    rows = []
+    row_num = 0
+    for row in root.iter(_ROW_TAG):
+        ref = row.get("r")
+        row_num = int(ref) if ref else row_num + 1
+        values = []
+        col = 0
+        for cell in row.iter(_CELL_TAG):
+            cell_ref = cell.get("r")
+            col = col_letters_to_idx(_CELL_COL_RE.match(cell_ref).group()) if cell_ref else col + 1
+            if col > len(values):
+                values.extend([None] * (col - len(values)))
+            values[col - 1] = _parse_cell(cell, context)
+        rows.append((row_num, values))
+    return rows
+
+def _split_ranges(data, start, end, count):
+    """
+    Splits data[start:end] into up to `count` byte ranges that each begin at a
+    <row> start tag.
+    """
+    boundaries = [start]
+    step = max((end - start) // count, 1)
+    for i in range(1, count):
+        match = _ROW_START_RE.search(data, max(start + i * step, boundaries[-1] + 1), end)
+        if not match:
+            break
+        if match.start() > boundaries[-1]:
+            boundaries.append(match.start())
+    boundaries.append(end)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# --------------------------
+# Core Functions
+# --------------------------
+
+def get_xlsx_sheet_xml_size(file_path, sheet_name):
+    """Returns the uncompressed size in bytes of a sheet's worksheet XML part."""
+    with zipfile.ZipFile(file_path) as zf:
+        return zf.getinfo(get_xlsx_sheet_part(zf, sheet_name)).file_size
+
+def read_xlsx_sheet_rows_parallel(file_path, sheet_name, workers=None):
+    """
+    Parses one worksheet of an .xlsx file across several processes.
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        workers (int): Number of worker processes (default: os.cpu_count()).
+                       With 1 worker the sheet is parsed in this process.
+
+    Returns:
+        list: (row_number, row_values) tuples in row order. Row numbers are 1-based
+              and only rows present in the sheet XML are returned.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    return list(iter_xlsx_sheet_rows_parallel(file_path, sheet_name, workers))
+
+def iter_xlsx_sheet_rows_parallel(file_path, sheet_name, workers=None):
+    """
+    Generator version of read_xlsx_sheet_rows_parallel. The sheet is split into
+    ranges of at most STREAM_CHUNK_BYTES of XML and only a few ranges per worker
+    are parsed ahead of the consumer, so memory stays bounded however large the
+    sheet is. Closing the generator early cancels the remaining ranges.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    # The worksheet XML is streamed to this file so workers can map it instead of
+    # being sent copies of it; it is removed however the read ends, including a
+    # failed copy
+    fd, xml_path = tempfile.mkstemp(suffix=".xml")
+    try:
+        with os.fdopen(fd, "wb") as out, zipfile.ZipFile(file_path) as zf:
+            part_name = get_xlsx_sheet_part(zf, sheet_name)
+            shared_strings = read_xlsx_shared_strings(zf)
+            date_styles = read_xlsx_date_styles(zf)
+            date1904 = read_xlsx_date1904(zf)
+            with zf.open(part_name) as part:
+                shutil.copyfileobj(part, out, 1024 * 1024)
+
+        with open(xml_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                worksheet = _WORKSHEET_START_RE.search(data)
+                first_row = _ROW_START_RE.search(data)
+                if not worksheet or not first_row:
+                    return
+                data_end = _SHEET_DATA_END_RE.search(data, first_row.start())
+                data_end = data_end.start() if data_end else len(data)
+                head = data[worksheet.start():worksheet.end()]
+                tail = b"</" + worksheet.group("p") + b"worksheet>"
+
+                count = max(workers * CHUNKS_PER_WORKER, -(-(data_end - first_row.start()) // STREAM_CHUNK_BYTES))
+                ranges = _split_ranges(data, first_row.start(), data_end, count)
+                # Rows without an r attribute are numbered by position, which only
+                # works when the rows are parsed as one range
+                if any(not _ROW_HAS_REF_RE.match(data, start) for start, _ in ranges):
+                    ranges = [(first_row.start(), data_end)]
+            finally:
+                data.close()
+
+        init_args = (xml_path, head, tail, shared_strings, date_styles, date1904)
+        if workers == 1 or len(ranges) == 1:
+            _init_worker(*init_args)
+            try:
+                for bounds in ranges:
+                    yield from _parse_range(bounds)
+            finally:
+                _worker["data"].close()
+                _worker["file"].close()
+                _worker.clear()
+            return
+
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+        try:
+            # Results are taken in submission order, so rows come out in sheet order
+            in_flight = deque()
+            for bounds in ranges:
+                in_flight.append(pool.submit(_parse_range, bounds))
+                if len(in_flight) >= workers * CHUNKS_AHEAD_PER_WORKER:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        os.remove(xml_path)
+
+def iter_xlsx_sheet_rows(file_path, sheet_name, workers=None, min_parallel_bytes=PARALLEL_PARSE_MIN_BYTES):
+    """
+    Yields (row_number, row_values) for every row of an .xlsx sheet, picking the
+    fastest reader for the sheet's size: openpyxl's streaming reader for normal
+    sheets, or the parallel reader once the worksheet XML reaches
+    `min_parallel_bytes`.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    if get_xlsx_sheet_xml_size(file_path, sheet_name) >= min_parallel_bytes:
+        yield from iter_xlsx_sheet_rows_parallel(file_path, sheet_name, workers)
+        return
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        for row_num, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            yield row_num, list(row)
+    finally:
+        workbook.close()
@@ -0,0 +1,333 @@
+"""
+xlsx_row_index_utils.py - Persistent <row> offset index for random-access .xlsx cell reads
+Requires: only the standard library
+
+Reading one cell with openpyxl loads and parses the whole workbook. A row index
+records, for one worksheet, where each <row> element starts in the
+decompressed worksheet XML, together with the tables needed to decode its
+cells (shared strings, date styles and the date system). Reading a cell, or a
+few cells, then seeks to the rows involved and parses only those.
+
+The index is built with one streaming pass over the worksheet XML and kept in
+memory for repeated reads, tagged with the file's fingerprint (size,
+modification time) and rebuilt when the workbook changes. Setting
+ROW_INDEX_FOLDER (e.g. to a state folder of the caller's) also saves it as a
+sidecar file there, keyed by the workbook's path and sheet, so new processes
+reuse it. Sidecars hold a copy of the shared strings, so this is opt-in.
+
+Worksheet parts are usually deflate-compressed, and a deflate stream can only
+be decoded from its start. A seek therefore still decompresses the bytes
+before the row (in C, at hundreds of MB/s), but nothing before it is parsed.
+Rows are read in file order, so a set of cells costs at most one pass.
+
+Values match xlsx_parallel_utils (openpyxl's data_only mode).
+"""
+
+import os
+import re
+import sys
+import json
+import bisect
+import hashlib
+import zipfile
+import tempfile
+from array import array
+from collections import OrderedDict
+from xlsx_package_utils import (
+    get_xlsx_sheet_part, read_xlsx_shared_strings, read_xlsx_date_styles, read_xlsx_date1904, parse_cell_ref,
+)
+from xlsx_parallel_utils import parse_sheet_rows_xml
+
+# Folder the sidecar indexes are saved in (an absolute path is best, since a
+# relative one follows the current directory); None keeps them in memory only
+ROW_INDEX_FOLDER = None
+ROW_INDEX_SUFFIX = ".rowidx"
+ROW_INDEX_VERSION = 1
+
+# Sidecar files kept at most; the least recently written are removed first
+MAX_ROW_INDEX_FILES = 64
+
+# Row indexes kept in memory at once
+MAX_CACHED_ROW_INDEXES = 8
+
+# Bytes of worksheet XML decompressed per read while building an index
+SCAN_CHUNK_BYTES = 1024 * 1024
+
+_ROW_TAG_RE = re.compile(rb"<(?:[A-Za-z_][\w.-]*:)?row\b([^>]*)>")
+_ROW_REF_RE = re.compile(rb"\sr=\"(\d+)\"")
+_WORKSHEET_START_RE = re.compile(rb"<(?P<p>(?:[A-Za-z_][\w.-]*:)?)worksheet\b[^>]*>")
+_SHEET_DATA_END_RE = re.compile(rb"</(?:[A-Za-z_][\w.-]*:)?sheetData>")
+
+_row_index_cache = OrderedDict()
+
+# --------------------------
+# Index
+# --------------------------
+
+class XlsxRowIndex:
+    """
+    Byte offsets of the <row> elements of one worksheet, plus the tables that
+    decode its cells.
+
+    `rows` holds the row numbers in sheet order and `starts` the offset of each
+    row's start tag in the decompressed worksheet XML; a row ends where the
+    next one starts (the last one at `data_end`, the end of <sheetData>).
+    """
+
+    def __init__(self, fingerprint, part_name, head, tail, data_end, rows, starts,
+                 shared_strings, date_styles, date1904):
+        self.fingerprint = fingerprint
+        self.part_name = part_name
+        self.head = head
+        self.tail = tail
+        self.data_end = data_end
+        self.rows = rows
+        self.starts = starts
+        self.context = {"shared_strings": shared_strings, "date_styles": date_styles, "date1904": date1904}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_span(self, row_num):
+        """Returns the (start, end) byte range of a row's XML, or None if the sheet has no such row."""
+        i = bisect.bisect_left(self.rows, row_num)
+        if i == len(self.rows) or self.rows[i] != row_num:
+            return None
+        end = self.starts[i + 1] if i + 1 < len(self.rows) else self.data_end
+        return self.starts[i], end
+
+    def read_rows(self, zf, row_numbers):
+        """
+        Reads rows from the open .xlsx package, seeking straight to each one.
+
+        Returns:
+            dict: row_number -> list of cell values from column A. Rows the
+                  sheet does not have map to an empty list.
+        """
+        spans = {row_num: self.row_span(row_num) for row_num in set(row_numbers)}
+        found = {row_num: [] for row_num, span in spans.items() if span is None}
+        with zf.open(self.part_name) as part:
+            # In file order, so the part is only decompressed once
+            for row_num, (start, end) in sorted(((r, s) for r, s in spans.items() if s), key=lambda item: item[1]):
+                part.seek(start)
+                parsed = parse_sheet_rows_xml(self.head + part.read(end - start) + self.tail, self.context)
+                found[row_num] = parsed[0][1] if parsed else []
+        return found
+
+def build_row_index(zf, sheet_name, fingerprint):
+    """
+    Builds the row index of a sheet with one streaming pass over its XML.
+
+    Args:
+        zf (zipfile.ZipFile): The open .xlsx package.
+        sheet_name (str): Name of the worksheet.
+        fingerprint (tuple): The workbook's (size, mtime_ns).
+
+    Raises:
+        KeyError: If the sheet does not exist.
+        ValueError: If the part is not a worksheet.
+    """
+    part_name = get_xlsx_sheet_part(zf, sheet_name)
+    rows, starts = array("I"), array("Q")
+    head = tail = data_end = None
+    row_num = 0
+
+    with zf.open(part_name) as part:
+        buffer, base = b"", 0
+        while data_end is None:
+            chunk = part.read(SCAN_CHUNK_BYTES)
+            buffer += chunk
+            # Tags never contain '<', so every tag starting before the last '<' is complete
+            cut = buffer.rfind(b"<") if chunk else len(buffer)
+            pos = 0
+            if head is None:
+                worksheet = _WORKSHEET_START_RE.search(buffer, 0, max(cut, 0))
+                if worksheet is None:
+                    if not chunk:
+                        raise ValueError(f"'{part_name}' is not a worksheet.")
+                    continue
+                head = bytes(buffer[worksheet.start():worksheet.end()])
+                tail = b"</" + worksheet.group("p") + b"worksheet>"
+                pos = worksheet.end()
+
+            end_match = _SHEET_DATA_END_RE.search(buffer, pos, cut)
+            limit = end_match.start() if end_match else cut
+            for match in _ROW_TAG_RE.finditer(buffer, pos, limit):
+                ref = _ROW_REF_RE.search(match.group(1))
+                row_num = int(ref.group(1)) if ref else row_num + 1
+                rows.append(row_num)
+                starts.append(base + match.start())
+
+            if end_match:
+                data_end = base + end_match.start()
+            elif not chunk:
+                data_end = base + len(buffer)
+            buffer, base = buffer[cut:], base + cut
+
+    return XlsxRowIndex(fingerprint, part_name, head, tail, data_end, rows, starts,
+                        read_xlsx_shared_strings(zf), read_xlsx_date_styles(zf), read_xlsx_date1904(zf))
+
+# --------------------------
+# Sidecar Files
+# --------------------------
+
+def _sidecar_path(file_path, sheet_name):
+    """Returns the sidecar file of a sheet's row index."""
+    digest = hashlib.sha1(f"{os.path.abspath(file_path)}\0{sheet_name}".encode("utf-8")).hexdigest()
+    return os.path.join(ROW_INDEX_FOLDER, digest[:24] + ROW_INDEX_SUFFIX)
+
+def save_row_index(index, sidecar_path):
+    """
+    Saves a row index: a JSON header line, the shared strings as a JSON line,
+    then the row numbers and offsets as raw arrays. The file is replaced
+    atomically.
+    """
+    header = {
+        "version": ROW_INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "fingerprint": list(index.fingerprint),
+        "part": index.part_name,
+        "head": index.head.decode("utf-8"),
+        "tail": index.tail.decode("utf-8"),
+        "data_end": index.data_end,
+        "rows": len(index.rows),
+        "date_styles": sorted(index.context["date_styles"]),
+        "date1904": index.context["date1904"],
+    }
+    folder = os.path.dirname(sidecar_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder or None, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(json.dumps(index.context["shared_strings"]).encode("utf-8") + b"\n")
+            index.rows.tofile(f)
+            index.starts.tofile(f)
+        os.replace(temp_path, sidecar_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def load_row_index(sidecar_path, fingerprint):
+    """
+    Loads a saved row index, or returns None when the file is missing, was
+    written for another version of the workbook (or of this format), or is damaged.
+    """
+    try:
+        with open(sidecar_path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != ROW_INDEX_VERSION or header.get("byteorder") != sys.byteorder \
+                    or tuple(header.get("fingerprint", ())) != tuple(fingerprint):
+                return None
+            shared_strings = json.loads(f.readline())
+            rows, starts = array("I"), array("Q")
+            rows.fromfile(f, header["rows"])
+            starts.fromfile(f, header["rows"])
+    except (OSError, EOFError, ValueError, KeyError):
+        return None
+    return XlsxRowIndex(tuple(fingerprint), header["part"], header["head"].encode("utf-8"),
+                        header["tail"].encode("utf-8"), header["data_end"], rows, starts,
+                        shared_strings, set(header["date_styles"]), header["date1904"])
+
+def _prune_sidecars(folder):
+    """Removes the oldest sidecar files beyond MAX_ROW_INDEX_FILES."""
+    try:
+        paths = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(ROW_INDEX_SUFFIX)]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[MAX_ROW_INDEX_FILES:]:
+            os.remove(path)
+    except OSError:
+        pass
+
+# --------------------------
+# Core Functions
+# --------------------------
+
+def get_xlsx_row_index(file_path, sheet_name, zf=None):
+    """
+    Returns the row index of a sheet: from memory, else from its sidecar file
+    (with ROW_INDEX_FOLDER set), else built (and saved) now. A saved index is only used while the workbook's
+    size and modification time are unchanged.
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        zf (zipfile.ZipFile): The package, if the caller already has it open.
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    key = (os.path.abspath(file_path), sheet_name)
+    stat = os.stat(file_path)
+    fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+    cached = _row_index_cache.get(key)
+    if cached is not None and cached.fingerprint == fingerprint:
+        _row_index_cache.move_to_end(key)
+        return cached
+
+    sidecar_path = _sidecar_path(file_path, sheet_name) if ROW_INDEX_FOLDER else None
+    index = load_row_index(sidecar_path, fingerprint) if sidecar_path else None
+    if index is None:
+        if zf is None:
+            with zipfile.ZipFile(file_path) as package:
+                index = build_row_index(package, sheet_name, fingerprint)
+        else:
+            index = build_row_index(zf, sheet_name, fingerprint)
+        if sidecar_path:
+            try:
+                save_row_index(index, sidecar_path)
+                _prune_sidecars(ROW_INDEX_FOLDER)
+            except OSError:
+                # A read-only folder only costs the rebuild next time
+                pass
+
+    _row_index_cache[key] = index
+    _row_index_cache.move_to_end(key)
+    while len(_row_index_cache) > MAX_CACHED_ROW_INDEXES:
+        _row_index_cache.popitem(last=False)
+    return index
+
+def read_xlsx_rows(file_path, sheet_name, row_numbers):
+    """
+    Reads only the given rows of an .xlsx sheet.
+
+    Returns:
+        dict: row_number -> list of cell values from column A (empty for rows
+              the sheet does not have).
+
+    Raises:
+        KeyError: If the sheet does not exist.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        index = get_xlsx_row_index(file_path, sheet_name, zf)
+        return index.read_rows(zf, row_numbers)
+
+def read_xlsx_cells(file_path, sheet_name, cell_refs):
+    """
+    Reads a few cells of an .xlsx sheet, parsing only the rows they are in.
+
+    Args:
+        file_path (str): Path to the .xlsx file.
+        sheet_name (str): Name of the worksheet.
+        cell_refs (iterable): Cell references (e.g. ['C6', 'J12']).
+
+    Returns:
+        dict: cell_ref -> value (None for empty cells).
+
+    Raises:
+        KeyError: If the sheet does not exist.
+        ValueError: If a cell reference is not valid.
+    """
+    positions = {cell_ref: parse_cell_ref(cell_ref) for cell_ref in cell_refs}
+    rows = read_xlsx_rows(file_path, sheet_name, [row_num for row_num, _ in positions.values()])
+    values = {}
+    for cell_ref, (row_num, col_num) in positions.items():
+        row_values = rows[row_num]
+        values[cell_ref] = row_values[col_num - 1] if col_num <= len(row_values) else None
+    return values
+
+def clear_row_index_cache():
+    """Drops every row index kept in memory (sidecar files are kept)."""
+    _row_index_cache.clear()